@@ -1,22 +1,16 @@
 import streamlit as st
-import pandas as pd
-import geopandas as gpd
-from shapely.geometry import Point
-import zipfile
-import os
 import folium
 from streamlit_folium import folium_static
 from folium.plugins import MarkerCluster
 from st_aggrid import AgGrid, GridOptionsBuilder, JsCode
-import fiona
-import tempfile
-import io
 import altair as alt
 import streamlit.components.v1 as components
 import pydeck as pdk
 import plotly.express as px
 import leafmap.foliumap as leafmap
 
+from banjir import accumulation, cube, engine, export, hazard_grid, instrument, map_layers, parsing, rates, stages, whatif
+
 # Konfigurasi halaman Streamlit
 st.set_page_config(page_title="Asuransi Banjir Askrindo", page_icon="🏞️", layout="wide")
 st.title("🌊 Web Application Flood Insurance Askrindo")
@@ -25,23 +19,29 @@ st.title("🌊 Web Application Flood Insurance Askrindo")
 st.subheader("⬆️ Upload Data yang Diperlukan")
 csv_file = st.file_uploader("📄 Upload CSV", type=["csv"])
 
+# Setiap tahap dihitung ulang hanya jika input atau parameternya berubah.
+# Waktu, CPU dan memori per tahap rerun ini dicatat oleh profiler untuk panel Performance.
+profiler = instrument.Profiler()
+pipeline = stages.get_default_pipeline().with_profiler(profiler)
+
 if csv_file:
     # Membaca file CSV
-    df = pd.read_csv(csv_file)
-    df.columns = df.columns.str.strip()  # Bersihkan spasi pada nama kolom
+    ingested = pipeline.ingest(csv_file)
+    df, has_expiry = ingested.value
 
     # Step 2: Pilih Full Data atau Inforce Only
-    if 'EXPIRY DATE' in df.columns:
-        if not pd.api.types.is_datetime64_any_dtype(df['EXPIRY DATE']):
-            df['EXPIRY DATE'] = pd.to_datetime(df['EXPIRY DATE'], format='%d/%m/%Y', errors='coerce')
-        df['EXPIRY DATE'] = df['EXPIRY DATE'].dt.date
-
+    inforce_only = False
+    cutoff = engine.INFORCE_CUTOFF
+    if has_expiry:
         st.markdown("### 🔍 Pilih Tipe Data yang Ingin Dipakai")
-        data_option = st.radio("Ingin menggunakan data yang mana?", ["Full Data", "Inforce Only (EXPIRY DATE > 31 Des 2024)"])
-
-        if data_option == "Inforce Only (EXPIRY DATE > 31 Des 2024)":
-            df = df[df['EXPIRY DATE'] > pd.to_datetime("2024-12-31").date()]
-            st.success(f"✅ Menggunakan **data inforce** dengan **{len(df):,} baris** (EXPIRY DATE > 31 Des 2024)")
+        data_option = st.radio("Ingin menggunakan data yang mana?", ["Full Data", "Inforce Only (EXPIRY DATE > tanggal valuasi)"])
+
+        if data_option == "Inforce Only (EXPIRY DATE > tanggal valuasi)":
+            inforce_only = True
+            cutoff = st.date_input("Tanggal valuasi", value=engine.INFORCE_CUTOFF)
+            df = engine.filter_inforce(df, cutoff)
+            st.success(f"✅ Menggunakan **data inforce** dengan **{len(df):,} baris** "
+                       f"(EXPIRY DATE > {cutoff:%d-%m-%Y})")
         else:
             st.success(f"✅ Menggunakan **data full** dengan **{len(df):,} baris**")
     else:
@@ -58,95 +58,69 @@ if csv_file:
         accept_multiple_files=True
     )
 
-    # Fungsi untuk membersihkan kolom koordinat
-    def clean_coordinate_column(series):
-        return (
-            series.astype(str)
-            .str.strip()
-            .str.replace("–", "-", regex=False)
-            .str.replace(",", ".", regex=False)
-            .str.replace(r"[^0-9\.-]", "", regex=True)
-        )
-
     # Step 4: Proses koordinat dan shapefiles
     st.subheader("🪐 Intersection Data dengan Shapefile")
-    lon_col = "Longitude"
-    lat_col = "Latitude"
+    lon_col = engine.LON_COL
+    lat_col = engine.LAT_COL
 
     # Validasi kolom koordinat
-    if lat_col in df.columns and lon_col in df.columns:
-        df['Latitude'] = pd.to_numeric(clean_coordinate_column(df['Latitude']), errors='coerce')
-        df['Longitude'] = pd.to_numeric(clean_coordinate_column(df['Longitude']), errors='coerce')
-
-        lat_na = df['Latitude'].isna().sum()
-        lon_na = df['Longitude'].isna().sum()
-
-        if lat_na > 0 or lon_na > 0:
-            st.warning(f"⚠️ Terdapat {lat_na} Latitude dan {lon_na} Longitude yang tidak valid setelah parsing & koreksi.")
-            invalid_rows = df[df['Latitude'].isna() | df['Longitude'].isna()]
-            st.dataframe(invalid_rows.head())
-
-            invalid_csv = invalid_rows.to_csv(index=False).encode("utf-8")
-            st.download_button(
-                "⬇️ Unduh Baris Tidak Valid",
-                data=invalid_csv,
-                file_name="invalid_coordinates.csv",
-                mime="text/csv"
-            )
-
-        df = df.dropna(subset=['Latitude', 'Longitude'])
-    else:
-        st.error("Kolom 'Latitude' dan/atau 'Longitude' tidak ditemukan dalam data.")
+    try:
+        cleaned = pipeline.clean(ingested)
+    except engine.PipelineError as e:
+        st.error(str(e))
         st.stop()
 
-    # Proses shapefiles
-    if shp_zips:
-        gdf_points = gpd.GeoDataFrame(
-            df.copy(),
-            geometry=[Point(xy) for xy in zip(df[lon_col], df[lat_col])],
-            crs="EPSG:4326"
+    invalid_rows = cleaned.value[1]
+    if inforce_only:
+        invalid_rows = engine.filter_inforce(invalid_rows, cutoff)
+
+    if not invalid_rows.empty:
+        st.warning(f"⚠️ Terdapat {len(invalid_rows):,} baris dengan koordinat tidak valid setelah parsing & koreksi:")
+        st.dataframe(parsing.reject_report(parsing.reject_counts(invalid_rows)), hide_index=True)
+        st.dataframe(invalid_rows.head())
+
+        invalid_csv = invalid_rows.to_csv(index=False).encode("utf-8")
+        st.download_button(
+            "⬇️ Unduh Baris Tidak Valid",
+            data=invalid_csv,
+            file_name="invalid_coordinates.csv",
+            mime="text/csv"
         )
 
-        joined_list = []
-        for shp_zip in shp_zips:
-            with tempfile.TemporaryDirectory() as tmpdir:
-                with zipfile.ZipFile(shp_zip, 'r') as zip_ref:
-                    zip_ref.extractall(tmpdir)
-
-                shp_path = None
-                for root, _, files in os.walk(tmpdir):
-                    for file in files:
-                        if file.endswith(".shp") and not file.startswith("._") and "__MACOSX" not in root:
-                            shp_path = os.path.join(root, file)
-
-                if not shp_path:
-                    st.warning(f"Tidak ditemukan file .shp dalam ZIP: {shp_zip.name}")
-                    continue
-
-                try:
-                    gdf_shape = gpd.read_file(shp_path)
-                    gdf_shape.columns = gdf_shape.columns.str.strip()
-                    gdf_points_proj = gdf_points.to_crs(gdf_shape.crs)
-                    joined = gpd.sjoin(gdf_points_proj, gdf_shape, how="left", predicate="intersects")
-                    joined_list.append(joined)
-                except Exception as e:
-                    st.error(f"Gagal memproses shapefile dari {shp_zip.name}: {e}")
+    use_grid_index = st.checkbox(
+        "⚡ Gunakan indeks grid gridcode (lebih cepat untuk shapefile nasional yang besar)",
+        value=False
+    )
 
-        if joined_list:
-            combined = pd.concat(joined_list)
-            keywords = ['gridcode', 'hasil_gridcode', 'kode_grid']
-            gridcode_cols = [col for col in combined.columns if any(kw in col.lower() for kw in keywords)]
-            grid_col = gridcode_cols[0] if gridcode_cols else None
+    resolve_options = {
+        "Risiko tertinggi dari semua layer": "max",
+        "Prioritas sesuai urutan upload": "priority",
+        "Risiko tertinggi + kolom gridcode per layer": "columns",
+    }
+    resolve_label = st.selectbox("Jika titik masuk ke beberapa shapefile, gunakan:", list(resolve_options))
 
-            if grid_col:
-                combined = combined[[lon_col, lat_col, grid_col]].drop_duplicates(subset=[lon_col, lat_col])
+    # Proses shapefiles
+    if shp_zips:
+        try:
+            classified = pipeline.classify(
+                cleaned, shp_zips, grid_resolution=hazard_grid.DEFAULT_RESOLUTION if use_grid_index else None,
+                policy=resolve_options[resolve_label]
+            )
+            _, grid_col, issues = classified.value
+            # Filter inforce diterapkan pada hasil klasifikasi agar klasifikasi dipakai ulang
+            filtered = pipeline.filter(classified, inforce_only, cutoff)
+            final = filtered.value
+        except engine.PipelineError as e:
+            final, grid_col, issues = None, None, e.issues
+
+        for level, message in issues:
+            if level == "error":
+                st.error(message)
             else:
-                combined = combined[[lon_col, lat_col]].drop_duplicates()
-
-            final = df.merge(combined, on=[lon_col, lat_col], how='left')
+                st.warning(message)
 
+        if final is not None:
             if grid_col:
-                final['Kategori Risiko'] = final[grid_col].map({1: 'Rendah', 2: 'Sedang', 3: 'Tinggi'}).fillna("No Risk")
                 st.dataframe(final[[lon_col, lat_col, grid_col, 'Kategori Risiko']],
                              use_container_width=True, hide_index=True)
                 st.info(f"🔍 Data akhir (termasuk yang tidak memiliki intersection di .shp) memiliki **{len(final):,} baris.**")
@@ -162,229 +136,208 @@ if csv_file:
             """, unsafe_allow_html=True)
 
             # Data untuk tabel rate
-            data_rows = [
-                {"Kategori Utama": "Building", "Kategori": "No Risk",
-                 "Residential_1_lantai": "0%", "Residential_>1_lantai": "0%",
-                 "Commercial_1_lantai": "0%", "Commercial_>1_lantai": "0%",
-                 "Industrial_1_lantai": "0%", "Industrial_>1_lantai": "0%"},
-                {"Kategori Utama": "Building", "Kategori": "Rendah (s.d. 0.75M)",
-                 "Residential_1_lantai": "15%", "Residential_>1_lantai": "10%",
-                 "Commercial_1_lantai": "20%", "Commercial_>1_lantai": "15%",
-                 "Industrial_1_lantai": "10%", "Industrial_>1_lantai": "8%"},
-                {"Kategori Utama": "Building", "Kategori": "Sedang (>0.75M - 1.5M)",
-                 "Residential_1_lantai": "30%", "Residential_>1_lantai": "20%",
-                 "Commercial_1_lantai": "35%", "Commercial_>1_lantai": "25%",
-                 "Industrial_1_lantai": "20%", "Industrial_>1_lantai": "15%"},
-                {"Kategori Utama": "Building", "Kategori": "Tinggi (>1.5M)",
-                 "Residential_1_lantai": "50%", "Residential_>1_lantai": "35%",
-                 "Commercial_1_lantai": "55%", "Commercial_>1_lantai": "40%",
-                 "Industrial_1_lantai": "40%", "Industrial_>1_lantai": "30%"},
-                {"Kategori Utama": "Content/Stock", "Kategori": "Rendah (≤0.75M)",
-                 "Residential_1_lantai": "20%", "Residential_>1_lantai": "15%",
-                 "Commercial_1_lantai": "30%", "Commercial_>1_lantai": "25%",
-                 "Industrial_1_lantai": "15%", "Industrial_>1_lantai": "10%"},
-                {"Kategori Utama": "Content/Stock", "Kategori": "Sedang (>0.75M - 1.5M)",
-                 "Residential_1_lantai": "40%", "Residential_>1_lantai": "30%",
-                 "Commercial_1_lantai": "50%", "Commercial_>1_lantai": "40%",
-                 "Industrial_1_lantai": "30%", "Industrial_>1_lantai": "25%"},
-                {"Kategori Utama": "Content/Stock", "Kategori": "Tinggi (>1.5M)",
-                 "Residential_1_lantai": "60%", "Residential_>1_lantai": "45%",
-                 "Commercial_1_lantai": "70%", "Commercial_>1_lantai": "55%",
-                 "Industrial_1_lantai": "50%", "Industrial_>1_lantai": "40%"},
-                {"Kategori Utama": "Machine", "Kategori": "Rendah (≤0.75M)",
-                 "Residential_1_lantai": "10%", "Residential_>1_lantai": "8%",
-                 "Commercial_1_lantai": "15%", "Commercial_>1_lantai": "12%",
-                 "Industrial_1_lantai": "25%", "Industrial_>1_lantai": "20%"},
-                {"Kategori Utama": "Machine", "Kategori": "Sedang (>0.75M - 1.5M)",
-                 "Residential_1_lantai": "25%", "Residential_>1_lantai": "20%",
-                 "Commercial_1_lantai": "35%", "Commercial_>1_lantai": "30%",
-                 "Industrial_1_lantai": "50%", "Industrial_>1_lantai": "40%"},
-                {"Kategori Utama": "Machine", "Kategori": "Tinggi (>1.5M)",
-                 "Residential_1_lantai": "45%", "Residential_>1_lantai": "35%",
-                 "Commercial_1_lantai": "55%", "Commercial_>1_lantai": "45%",
-                 "Industrial_1_lantai": "70%", "Industrial_>1_lantai": "60%"}
-            ]
-
-            df_rates = pd.DataFrame(data_rows)
-            columns = pd.MultiIndex.from_tuples(
-                [
-                    ("", "Kategori Utama"),
-                    ("", "Kategori"),
-                    ("Residential", "1 lantai"),
-                    ("Residential", ">1 lantai"),
-                    ("Commercial", "1 lantai"),
-                    ("Commercial", ">1 lantai"),
-                    ("Industrial", "1 lantai"),
-                    ("Industrial", ">1 lantai")
-                ]
+            rate_file = st.file_uploader(
+                "📄 Upload Tabel Rate (opsional, .csv / .yaml). Jika kosong, tabel rate bawaan yang dipakai",
+                type=["csv", "yaml", "yml"]
             )
-            df_rates.columns = columns
+            rate_table = rates.default_rate_table()
+            if rate_file:
+                try:
+                    rate_table = rates.RateTable.load(rate_file)
+                except Exception as e:
+                    st.error(f"Gagal membaca tabel rate dari {rate_file.name}: {e}")
+                    st.stop()
+
+            df_rates = rate_table.display_frame()
             st.dataframe(df_rates, use_container_width=True, hide_index=True)
 
             # Step 6: Hitung rate berdasarkan risiko dan okupasi
+            rated = None
             if 'Kategori Risiko' in final.columns:
-                building_col = "Kategori Okupasi"
-                floor_col = "Jumlah Lantai"
-
-                missing_cols = []
-                if building_col not in final.columns:
-                    missing_cols.append(building_col)
-                if floor_col not in final.columns:
-                    missing_cols.append(floor_col)
-                if missing_cols:
-                    st.error(f"Kolom berikut tidak ditemukan dalam data: {', '.join(missing_cols)}")
+                building_col = engine.OKUPASI_COL
+                floor_col = engine.FLOOR_COL
+
+                try:
+                    rated = pipeline.rate(filtered, rate_table)
+                    final, rate_unmatched = rated.value
+                except engine.PipelineError as e:
+                    st.error(str(e))
                     st.stop()
 
-                final[floor_col] = pd.to_numeric(final[floor_col], errors='coerce')
-                final[floor_col] = final[floor_col].apply(lambda x: 1 if x == 0 else x)
+                if any(rate_unmatched.values()):
+                    st.warning("⚠️ Sebagian baris tidak mendapatkan rate karena kombinasi berikut tidak ada di tabel rate:")
+                    st.dataframe(rates.unmatched_report(rate_unmatched), use_container_width=True, hide_index=True)
 
-                rate_dict = {
-                    'No Risk': {
-                        'Residensial': {'1': 0.0, 'more_than_1': 0.0},
-                        'Komersial': {'1': 0.0, 'more_than_1': 0.0},
-                        'Industrial': {'1': 0.0, 'more_than_1': 0.0}
-                    },
-                    'Rendah': {
-                        'Residensial': {'1': 0.15, 'more_than_1': 0.10},
-                        'Komersial': {'1': 0.20, 'more_than_1': 0.15},
-                        'Industrial': {'1': 0.10, 'more_than_1': 0.08}
-                    },
-                    'Sedang': {
-                        'Residensial': {'1': 0.30, 'more_than_1': 0.20},
-                        'Komersial': {'1': 0.35, 'more_than_1': 0.25},
-                        'Industrial': {'1': 0.20, 'more_than_1': 0.15}
-                    },
-                    'Tinggi': {
-                        'Residensial': {'1': 0.50, 'more_than_1': 0.35},
-                        'Komersial': {'1': 0.55, 'more_than_1': 0.40},
-                        'Industrial': {'1': 0.40, 'more_than_1': 0.30}
-                    }
-                }
-
-                def lookup_rate(row):
-                    try:
-                        risk = row['Kategori Risiko']
-                        okupasi = row[building_col]
-                        floors = row[floor_col]
-                        if pd.isna(floors):
-                            return None
-                        floors = int(floors)
-                        floor_key = '1' if floors == 1 else 'more_than_1'
-                        return rate_dict[risk][okupasi][floor_key]
-                    except:
-                        return None
-
-                final['Rate'] = final.apply(lookup_rate, axis=1)
-                st.dataframe(final[['Kategori Risiko', building_col, floor_col, 'Rate']],
+                rate_cols = [rate_col for _, _, rate_col, _ in engine.coverage_columns(final.columns)]
+                st.dataframe(final[['Kategori Risiko', building_col, floor_col] + rate_cols],
                              use_container_width=True, hide_index=True)
                 st.success(f"Data berhasil dimuat disertai rate sebanyak **{len(final):,} baris valid**.")
 
             # Step 7: Hitung Probable Maximum Losses (PML)
             st.markdown("### 💰 Probable Maximum Losses (PML)")
-            selected_rate = "Rate"
-            selected_tsi = "TSI IDR"
+            selected_tsi = engine.TSI_COL
 
-            if selected_rate not in final.columns or selected_tsi not in final.columns:
-                st.error(f"Kolom {selected_rate} dan/atau {selected_tsi} tidak ditemukan dalam data.")
+            if rated is None:
+                st.error(f"Kolom {engine.RATE_COL} tidak ditemukan dalam data.")
                 st.stop()
 
-            def clean_tsi_column(series):
-                return pd.to_numeric(
-                    series.astype(str).str.replace(r"[^\d]", "", regex=True),
-                    errors='coerce'
-                )
-
-            final[selected_tsi] = clean_tsi_column(final[selected_tsi])
-            final['PML'] = final[selected_tsi] * final[selected_rate]
+            try:
+                computed = pipeline.pml(rated)
+                final = computed.value
+            except engine.PipelineError as e:
+                st.error(str(e))
+                st.stop()
 
-            st.dataframe(final[[selected_tsi, selected_rate, 'PML']],
+            pml_cols = []
+            for _, tsi_col, rate_col, pml_col in engine.coverage_columns(final.columns):
+                pml_cols += [tsi_col, rate_col, pml_col]
+            if 'PML' not in pml_cols:
+                pml_cols += [selected_tsi, 'PML']
+            st.dataframe(final[pml_cols],
                          use_container_width=True, hide_index=True)
 
-            output_premi = io.BytesIO()
-            final.to_excel(output_premi, index=False, engine='openpyxl')
-            st.download_button(
-                "⬇️ Unduh Data dengan PML",
-                data=output_premi.getvalue(),
-                file_name="DataBanjirAskrindo_Computated.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+            # File unduhan hanya dibuat jika diminta, lalu disimpan per kunci hasil
+            exports = export.get_default_exports()
+            result_key = computed.key
+            col_format, col_background = st.columns(2)
+            export_format = col_format.selectbox("Format unduhan", list(export.EXPORT_FORMATS))
+            export_background = col_background.checkbox("Buat file di background", value=True)
+
+            export_state, export_value = exports.status(result_key, export_format)
+            if export_state in ("missing", "failed"):
+                if export_state == "failed":
+                    st.error(f"Gagal membuat file unduhan: {export_value}")
+                if st.button("📦 Siapkan File Unduhan"):
+                    if export_background:
+                        exports.submit(final, result_key, export_format)
+                        export_state = "running"
+                    else:
+                        with st.spinner("Membuat file unduhan..."):
+                            try:
+                                with instrument.measure(profiler, f"export_{export_format}", rows_in=len(final)):
+                                    export_value = exports.build(final, result_key, export_format)
+                                export_state = "ready"
+                            except engine.PipelineError as e:
+                                st.error(str(e))
+
+            if export_state == "running":
+                st.info("⏳ File unduhan sedang dibuat di background.")
+                st.button("🔄 Cek Status Unduhan")
+            elif export_state == "ready":
+                extension, mime = export.EXPORT_FORMATS[export_format]
+                with open(export_value, "rb") as f:
+                    st.download_button(
+                        "⬇️ Unduh Data dengan PML",
+                        data=f.read(),
+                        file_name=f"DataBanjirAskrindo_Computated.{extension}",
+                        mime=mime
+                    )
 
             # Step 8: Peta Interaktif dengan Pydeck
             if lon_col and lat_col and not final.empty:
                 st.subheader("🌐 Peta Portfolio Interaktif Berdasarkan Risiko")
 
-                # Mapping risiko ke bobot untuk heatmap
-                risk_mapping = {
-                    "Rendah": 0.3,
-                    "Sedang": 0.6,
-                    "Tinggi": 1.0,
-                    "No Risk": 0.1
-                }
-
-                # Mapping warna untuk scatterplot
-                color_mapping = {
-                    "Rendah": [0, 255, 0, 180],     # Hijau transparan
-                    "Sedang": [255, 255, 0, 180],   # Kuning transparan
-                    "Tinggi": [255, 0, 0, 180],     # Merah transparan
-                    "No Risk": [160, 160, 160, 180] # Abu-abu transparan
-                }
-
-                # Assign bobot dan warna
-                if 'Kategori Risiko' in final.columns:
-                    final["weight"] = final["Kategori Risiko"].map(risk_mapping).fillna(0.1)
-                    final["color"] = final["Kategori Risiko"].map(color_mapping)
-                    final["color"] = final["color"].apply(lambda x: x if isinstance(x, list) else [0, 0, 0, 180])
+                # Data peta diagregasi di server; titik individual hanya untuk viewport kecil
+                map_mode = st.radio("Mode peta", ["Agregat per area", "Titik (viewport kecil)"], horizontal=True)
+                zoom = st.slider("Level zoom", min_value=3, max_value=16, value=5)
+                center_lat = float(final[lat_col].mean())
+                center_lon = float(final[lon_col].mean())
+
+                points = None
+                if map_mode == "Titik (viewport kecil)":
+                    col_lat, col_lon = st.columns(2)
+                    center_lat = col_lat.number_input("Latitude pusat", value=center_lat, format="%.5f")
+                    center_lon = col_lon.number_input("Longitude pusat", value=center_lon, format="%.5f")
+                    bbox = map_layers.viewport_bbox(center_lon, center_lat, zoom)
+                    with instrument.measure(profiler, "viewport_points", rows_in=len(final)) as record:
+                        points = map_layers.viewport_points(final, bbox)
+                        record.rows_out = len(points) if points is not None else None
+                    if points is None:
+                        st.warning(f"⚠️ Viewport berisi lebih dari {map_layers.MAX_VIEWPORT_POINTS:,} titik; "
+                                   f"perbesar zoom. Peta ditampilkan sebagai agregat.")
+
+                if points is not None:
+                    st.caption(f"{len(points):,} titik di dalam viewport.")
+                    # Heatmap Layer
+                    heatmap_layer = pdk.Layer(
+                        "HeatmapLayer",
+                        data=points,
+                        get_position=["lon", "lat"],
+                        get_weight="weight",
+                        aggregation="MEAN",
+                        radiusPixels=25,
+                    )
+
+                    # Scatterplot Layer dengan warna berdasarkan risiko
+                    detail_layer = pdk.Layer(
+                        "ScatterplotLayer",
+                        data=points,
+                        get_position=["lon", "lat"],
+                        get_fill_color="color",
+                        get_radius=10,
+                        pickable=True,
+                        auto_highlight=True,
+                    )
                 else:
-                    final["weight"] = 1
-                    final["color"] = [[0, 0, 0, 180]] * len(final)
-
-                # Buat popup info
-                excluded_cols = ['SISTEM', 'NAMA FILE', 'Unique', 'TOC', 'Jumlah Lantai_Rev1', 'Jumlah Lantai_Rev2', 'gridcode', 'weight', 'color', 'Jumlah Lantai_Rev', 'Jumlah_Lantai_Fix']
-                final["popup"] = final.apply(
-                    lambda row: "<br>".join(
-                        [
-                            f"<b>{col}</b>: {row[col]}" if pd.notnull(row[col]) else f"<b>{col}</b>: -"
-                            for col in final.columns if col not in excluded_cols
-                        ]
-                    ),
-                    axis=1
-                )
-
-                # Data untuk map
-                data = final[[lon_col, lat_col, "popup", "weight", "color"]].to_dict(orient="records")
-
-                # Heatmap Layer
-                heatmap_layer = pdk.Layer(
-                    "HeatmapLayer",
-                    data=data,
-                    get_position=[lon_col, lat_col],
-                    get_weight="weight",
-                    aggregation="MEAN",
-                    radiusPixels=25,
-                )
-
-                # Scatterplot Layer dengan warna berdasarkan risiko
-                scatter_layer = pdk.Layer(
-                    "ScatterplotLayer",
-                    data=data,
-                    get_position=[lon_col, lat_col],
-                    get_fill_color="color",
-                    get_radius=10,
-                    pickable=True,
-                    auto_highlight=True,
-                )
+                    bins, bin_size = pipeline.map_bins(computed, zoom).value
+                    st.caption(f"{len(final):,} polis dalam {len(bins):,} sel grid ({bin_size:.3g}°).")
+                    heatmap_layer = pdk.Layer(
+                        "HeatmapLayer",
+                        data=bins[["lon", "lat", "weight"]],
+                        get_position=["lon", "lat"],
+                        get_weight="weight",
+                        aggregation="MEAN",
+                        radiusPixels=25,
+                    )
+
+                    # Sel grid berwarna sesuai risiko dominan
+                    detail_layer = pdk.Layer(
+                        "PolygonLayer",
+                        data=bins[["polygon", "color", "popup"]],
+                        get_polygon="polygon",
+                        get_fill_color="color",
+                        stroked=False,
+                        pickable=True,
+                        auto_highlight=True,
+                    )
+
+                # Akumulasi: lingkaran dengan total TSI / PML terbesar (batas treaty per lokasi)
+                layers = [heatmap_layer, detail_layer]
+                circles = None
+                if st.checkbox("🎯 Tampilkan akumulasi (lingkaran TSI / PML terbesar)"):
+                    col_radius, col_k, col_by = st.columns(3)
+                    radius_m = col_radius.selectbox(
+                        "Radius (meter)", accumulation.RADIUS_OPTIONS,
+                        index=accumulation.RADIUS_OPTIONS.index(accumulation.DEFAULT_RADIUS)
+                    )
+                    top_k = col_k.number_input("Jumlah lingkaran", min_value=1, max_value=100,
+                                               value=accumulation.DEFAULT_TOP_K)
+                    by = col_by.radio("Urutkan berdasarkan", list(accumulation.MEASURES),
+                                      format_func=lambda key: f"Total {key.upper()}", horizontal=True)
+                    circles = pipeline.accumulation(computed, radius_m, int(top_k), by).value
+                    layers.append(pdk.Layer(
+                        "ScatterplotLayer",
+                        data=map_layers.accumulation_circles(circles),
+                        get_position=["lon", "lat"],
+                        get_radius="radius",
+                        get_fill_color=map_layers.ACCUMULATION_COLOR,
+                        get_line_color=map_layers.ACCUMULATION_LINE_COLOR,
+                        stroked=True,
+                        line_width_min_pixels=2,
+                        pickable=True,
+                    ))
 
                 # View state untuk map
                 view_state = pdk.ViewState(
-                    latitude=float(final[lat_col].mean()),
-                    longitude=float(final[lon_col].mean()),
-                    zoom=5,
+                    latitude=center_lat,
+                    longitude=center_lon,
+                    zoom=zoom,
                     pitch=0,
                 )
 
                 # Combine semua layer ke dalam Deck
                 deck = pdk.Deck(
-                    layers=[heatmap_layer, scatter_layer],
+                    layers=layers,
                     initial_view_state=view_state,
                     tooltip={
                         "html": "{popup}",
@@ -403,29 +356,32 @@ if csv_file:
                 # Tampilkan map
                 st.pydeck_chart(deck, use_container_width=True, height = 750, width = 1000)
 
+                if circles is not None:
+                    st.write(f"**Top {len(circles)} Akumulasi (radius {radius_m:,} m):**")
+                    st.dataframe(
+                        circles.style.format({'Total TSI': '{:,.0f}', 'Total PML': '{:,.0f}'}),
+                        use_container_width=True,
+                        hide_index=True
+                    )
+
             # Step 9: Ringkasan Hasil
             st.markdown("## 📊 Ringkasan Hasil")
             st.write(f"**Jumlah Data:** {len(final):,}")
+            summary_cube = pipeline.aggregate(computed).value
+            with instrument.measure(profiler, "summaries", rows_in=len(summary_cube)):
+                summaries = cube.summaries_from_cube(summary_cube)
 
             if 'Kategori Risiko' in final.columns:
                 st.write("**Distribusi Kategori Risiko:**")
                 st.dataframe(
-                    final['Kategori Risiko'].value_counts().rename_axis('Kategori').reset_index(name='Jumlah'),
+                    summaries['distribusi_risiko'],
                     use_container_width=True,
                     hide_index=True
                 )
 
             if 'UY' in final.columns:
                 st.markdown("### 📋 Ringkasan Berdasarkan Underwriting Year (UY)")
-                summary_uy = final.groupby('UY').agg(
-                    Jumlah_Polis=('UY', 'count'),
-                    TotalTSI=(selected_tsi, 'sum'),
-                    TotalPML=('PML', 'sum')
-                ).reset_index().rename(columns={
-                    'Jumlah_Polis': 'Jumlah Polis',
-                    'TotalTSI': 'Total TSI',
-                    'TotalPML': 'Total PML'
-                })
+                summary_uy = summaries['uy']
 
                 st.dataframe(
                     summary_uy.style.format({
@@ -466,20 +422,16 @@ if csv_file:
 
             if 'Kategori Okupasi' in final.columns:
                 st.markdown("### 📋 Ringkasan Berdasarkan Kategori Okupasi")
-                summary_okupasi = final.groupby('Kategori Okupasi').agg(
-                    jml_polis=('Kategori Okupasi', 'count'),
-                    total_tsi=(selected_tsi, 'sum'),
-                    total_pml=('PML', 'sum')
-                ).reset_index().rename(columns={
-                    'jml_polis': 'Jumlah Polis',
-                    'total_tsi': 'Total TSI',
-                    'total_pml': 'Total PML'
-                })
-
-                summary_okupasi['Total TSI'] = summary_okupasi['Total TSI'].apply(lambda x: f"{x:.2e}")
-                summary_okupasi['Total PML'] = summary_okupasi['Total PML'].apply(lambda x: f"{x:.2e}")
+                summary_okupasi = summaries['okupasi']
 
-                st.dataframe(summary_okupasi, use_container_width=True, hide_index=True)
+                st.dataframe(
+                    summary_okupasi.style.format({
+                        'Total TSI': '{:.2e}',
+                        'Total PML': '{:.2e}',
+                    }),
+                    use_container_width=True,
+                    hide_index=True
+                )
 
                 summary_melted = summary_okupasi.melt(
                     id_vars='Kategori Okupasi',
@@ -516,62 +468,30 @@ if csv_file:
 
             if 'Kategori Risiko' in final.columns:
                 st.markdown("### 📋 Ringkasan Berdasarkan Kategori Risiko")
-                summary_riskclass = final.groupby('Kategori Risiko').agg(
-                    Jumlah_Polis=('Kategori Risiko', 'count'),
-                    TotalTSI=(selected_tsi, 'sum'),
-                    TotalPML=('PML', 'sum')
-                ).reset_index().rename(columns={
-                    'Jumlah_Polis': 'Jumlah Polis',
-                    'TotalTSI': 'Total TSI',
-                    'TotalPML': 'Total PML'
-                })
+                summary_riskclass = summaries['risiko']
 
-                summary_riskclass['Total TSI'] = summary_riskclass['Total TSI'].apply(lambda x: f"{x:.2e}")
-                summary_riskclass['Total PML'] = summary_riskclass['Total PML'].apply(lambda x: f"{x:.2e}")
-
-                st.dataframe(summary_riskclass, use_container_width=True, hide_index=True)
+                st.dataframe(
+                    summary_riskclass.style.format({
+                        'Total TSI': '{:.2e}',
+                        'Total PML': '{:.2e}',
+                    }),
+                    use_container_width=True,
+                    hide_index=True
+                )
 
             if 'UY' in final.columns and 'Kategori Risiko' in final.columns:
                 st.markdown("### 📋 Ringkasan Berdasarkan UY dan Kategori Risiko")
-                summary = final.groupby(['UY', 'Kategori Risiko']).agg(
-                    Count_Polis=('Kategori Risiko', 'count'),
-                    Sum_TSI=(selected_tsi, 'sum'),
-                    Estimated_Claim=('PML', 'sum')
-                ).reset_index().rename(columns={
-                    'Count_Polis': 'Jumlah Polis',
-                    'Sum_TSI': 'Total TSI',
-                    'Estimated_Claim': 'PML'
-                })
-
-                pivoted = summary.pivot(index='UY', columns='Kategori Risiko')
-                pivoted = pivoted.fillna(0)
-                pivoted.columns = [' '.join(col).strip() for col in pivoted.columns.values]
-                styled_df = pivoted.applymap(lambda x: f"{int(x):,}".replace(",", "."))
+                pivoted = summaries['uy_risiko']
+                styled_df = pivoted.style.format(lambda x: f"{int(x):,}".replace(",", "."))
                 st.dataframe(styled_df, use_container_width=True, hide_index=True)
 
                 st.markdown("### 📋 Ringkasan Berdasarkan UY, Kategori Risiko dan Okupasi")
-                count_polis = final.pivot_table(
-                    index='UY',
-                    columns=['Kategori Okupasi', 'Kategori Risiko'],
-                    aggfunc='size'
-                ).fillna(0).astype(int)
-
-                sum_tsi = final.pivot_table(
-                    index='UY',
-                    columns=['Kategori Okupasi', 'Kategori Risiko'],
-                    values=selected_tsi,
-                    aggfunc='sum'
-                ).fillna(0).astype(int)
-
-                est_claim = final.pivot_table(
-                    index='UY',
-                    columns=['Kategori Okupasi', 'Kategori Risiko'],
-                    values='PML',
-                    aggfunc='sum'
-                ).fillna(0).astype(int)
+                count_polis = summaries['count_polis']
+                sum_tsi = summaries['sum_tsi']
+                est_claim = summaries['pml']
 
                 def format_ribuan(df):
-                    return df.applymap(lambda x: f"{x:,}".replace(",", "."))
+                    return df.style.format(lambda x: f"{x:,}".replace(",", "."))
 
                 st.markdown("#### Count Polis")
                 st.dataframe(count_polis)
@@ -582,7 +502,40 @@ if csv_file:
                 st.markdown("#### Probable Maximum Loss")
                 st.dataframe(format_ribuan(est_claim))
 
+            # Step 10: What-if tabel rate, klasifikasi dan TSI dipakai ulang tanpa intersection ulang
+            if 'Kategori Risiko' in final.columns and st.checkbox("🧪 Analisis what-if tabel rate"):
+                st.markdown("### 🧪 What-if Tabel Rate")
+                col_scale, col_okupasi, col_source = st.columns(3)
+                factors = col_scale.multiselect("Skala rate", whatif.SCALE_OPTIONS, default=[0.9, 1.1],
+                                                format_func=lambda factor: f"x{factor:g}")
+                replaced_okupasi = col_okupasi.selectbox("Ganti rate okupasi", ["-"] + rate_table.okupasi_levels)
+                source_okupasi = col_source.selectbox("dengan rate okupasi", rate_table.okupasi_levels)
+
+                variants = whatif.scale_variants(rate_table, factors)
+                if replaced_okupasi != "-" and replaced_okupasi != source_okupasi:
+                    variants.append(whatif.variant_from_spec(
+                        rate_table, {"okupasi": replaced_okupasi, "copy_from": source_okupasi}
+                    ))
+                relative = st.checkbox(f"Tampilkan perubahan relatif terhadap {whatif.BASE_NAME}")
+
+                result = pipeline.whatif(computed, variants, rate_table).value
+                table = result.table(relative=relative)
+                if relative:
+                    st.dataframe(table.style.format("{:+.1%}", na_rep="-"), use_container_width=True)
+                else:
+                    st.dataframe(table.style.format(lambda x: f"{x:,.0f}".replace(",", ".")),
+                                 use_container_width=True)
+
+                st.bar_chart(result.totals().rename("Total PML"))
+
         else:
             st.warning("⚠️ Tidak ada shapefile yang berhasil diproses.")
 else:
     st.warning("⚠️ Silakan unggah file CSV terlebih dahulu.")
+
+# Panel Performance: waktu, CPU, memori dan jumlah baris per tahap pada rerun ini
+if profiler.records:
+    with st.expander("⏱️ Performance", expanded=False):
+        perf = profiler.frame()
+        st.dataframe(perf, use_container_width=True, hide_index=True)
+        st.caption("cached = hasil diambil dari memo; peak_rss_delta_mb = kenaikan puncak RSS selama tahap.")
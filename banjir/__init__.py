@@ -0,0 +1,25 @@
+"""Engine perhitungan PML asuransi banjir Askrindo (tanpa Streamlit)."""
+from .engine import (
+    PipelineError,
+    PipelineResult,
+    apply_rates,
+    classify,
+    clean_coordinate_column,
+    clean_coordinates,
+    clean_tsi_column,
+    compute_pml,
+    coverage_columns,
+    filter_inforce,
+    parse_expiry,
+    read_portfolio,
+    run_pipeline,
+    summarize,
+)
+from .hazard import content_hash
+from .parsing import parse_amounts, parse_coordinates, reject_counts, reject_report
+from .quote import QuoteEngine
+from .hazard_cache import HazardCache, get_default_cache
+from .rates import RateTable, default_rate_table, unmatched_report
+from .hazard_grid import HazardGrid
+from .streaming import StreamingResult, run_streaming
+from .whatif import WhatIfResult, run_whatif
@@ -0,0 +1,178 @@
+"""Analisis akumulasi: lingkaran dengan total TSI / PML terbesar.
+
+Titik polis diproyeksikan ke Web Mercator (EPSG:3857, meter) dan jarak dikoreksi
+dengan faktor skala cos(lat) sehingga radius lingkaran tetap dalam meter asli.
+Polis pada koordinat yang sama digabung dulu menjadi satu lokasi, lalu lokasi
+dimasukkan ke indeks grid (sel seukuran radius / CELLS_PER_RADIUS). Lingkaran
+berpusat di setiap lokasi; jumlah semua sel yang bisa dijangkau lingkaran dari
+sebuah sel (dihitung dengan prefix sum per baris grid) adalah batas atas total
+lingkaran untuk semua pusat di sel itu. Sel diperiksa dari batas atas terbesar
+dan total eksak hanya dihitung untuk sel yang masih bisa masuk peringkat,
+sehingga tidak ada pemindaian O(n²).
+
+Lingkaran hasil tidak saling tumpang tindih (jarak pusat minimal 2x radius),
+sehingga setiap polis hanya dihitung di satu lingkaran.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from . import engine
+from .hazard import quantize_points
+
+EARTH_RADIUS = 6_378_137.0
+RADIUS_OPTIONS = [200, 500, 1000, 2000]  # meter
+DEFAULT_RADIUS = 1000
+DEFAULT_TOP_K = 10
+MEASURES = {'tsi': engine.TSI_COL, 'pml': engine.PML_COL}
+PAIR_BUDGET = 10_000_000  # pasangan (pusat, tetangga) per batch perhitungan eksak
+CELLS_PER_RADIUS = 6  # sel lebih kecil → batas atas lebih ketat, lebih banyak rentang per pusat
+
+
+# lon/lat (derajat) → x/y Web Mercator (meter pada ekuator)
+def web_mercator(lon, lat):
+    x = EARTH_RADIUS * np.radians(lon)
+    y = EARTH_RADIUS * np.log(np.tan(np.pi / 4 + np.radians(lat) / 2))
+    return x, y
+
+
+# Polis digabung per lokasi (koordinat terkuantisasi sama) → frame lon, lat, count, tsi, pml
+def locations(final):
+    lon = final[engine.LON_COL].to_numpy(dtype='float64')
+    lat = final[engine.LAT_COL].to_numpy(dtype='float64')
+    keys = quantize_points(lon, lat)
+    valid = keys >= 0
+    frame = pd.DataFrame({'key': keys[valid], 'lon': lon[valid], 'lat': lat[valid], 'count': 1})
+    for name, col in MEASURES.items():
+        values = final[col] if col in final.columns else pd.Series(0.0, index=final.index)
+        frame[name] = pd.to_numeric(values, errors='coerce').fillna(0).to_numpy(dtype='float64')[valid]
+    return frame.groupby('key', sort=False).agg(
+        lon=('lon', 'first'), lat=('lat', 'first'), count=('count', 'sum'), tsi=('tsi', 'sum'), pml=('pml', 'sum'),
+    ).reset_index(drop=True)
+
+
+# Baris sel yang bisa dijangkau lingkaran berradius k sel dari sel pusat → list (dy, lebar ke kiri/kanan)
+def reach_rows(k):
+    rows = []
+    for dy in range(-k - 1, k + 2):
+        gap = max(abs(dy) - 1, 0)
+        rows.append((dy, 1 + math.isqrt(k * k - gap * gap)))
+    return rows
+
+
+class LocationGrid:
+    # Indeks grid lokasi. Lokasi diurutkan per kunci sel baris demi baris, sehingga sel berurutan
+    # dalam satu baris grid adalah satu rentang indeks dan jangkauan lingkaran = beberapa rentang
+    def __init__(self, x, y, radius, cells_per_radius=CELLS_PER_RADIUS):
+        size = radius / cells_per_radius
+        cx = np.floor(x / size).astype('int64')
+        cy = np.floor(y / size).astype('int64')
+        pad = cells_per_radius + 2
+        self.rows = reach_rows(cells_per_radius)
+        self.width = int(cx.max(initial=0) - cx.min(initial=0)) + 2 * pad + 1
+        self.cell_key = (cy - cy.min(initial=0) + pad) * self.width + (cx - cx.min(initial=0) + pad)
+        self.order = np.argsort(self.cell_key, kind='stable')
+        self.sorted_keys = self.cell_key[self.order]
+        self.cells, self.start, self.count = np.unique(self.sorted_keys, return_index=True, return_counts=True)
+
+    # Rentang indeks (lo, hi) pada urutan self.order per baris jangkauan, untuk setiap kunci sel
+    def ranges(self, keys):
+        for dy, half_width in self.rows:
+            base = keys + dy * self.width
+            yield (np.searchsorted(self.sorted_keys, base - half_width, side='left'),
+                   np.searchsorted(self.sorted_keys, base + half_width, side='right'))
+
+    # Batas atas per sel: jumlah weight (satu kolom per ukuran) semua lokasi dalam jangkauan
+    # lingkaran dari sel itu
+    def reach_sums(self, weight):
+        weight = weight[self.order]
+        prefix = np.concatenate([np.zeros((1,) + weight.shape[1:]), np.cumsum(weight, axis=0)])
+        total = np.zeros((len(self.cells),) + weight.shape[1:])
+        for lo, hi in self.ranges(self.cells):
+            total += prefix[hi] - prefix[lo]
+        return total
+
+    # Lokasi di dalam sel-sel (posisi pada self.cells)
+    def members(self, cells):
+        counts = self.count[cells]
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return self.order[np.repeat(self.start[cells], counts) + within]
+
+    # Pasangan (indeks pusat, indeks lokasi tetangga) untuk lokasi pada centers
+    def pairs(self, centers):
+        center_ids, neighbour_ids = [], []
+        for lo, hi in self.ranges(self.cell_key[centers]):
+            counts = hi - lo
+            within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            center_ids.append(np.repeat(np.arange(len(centers)), counts))
+            neighbour_ids.append(self.order[np.repeat(lo, counts) + within])
+        return np.concatenate(center_ids), np.concatenate(neighbour_ids)
+
+
+# Pilih lingkaran terbesar secara greedy, pusat saling berjarak minimal 2x radius (meter).
+# Mengembalikan list (indeks lokasi pusat, nilai)
+def select_circles(candidates, values, x, y, scale, radius_m, top_k):
+    chosen = []
+    for pos in np.argsort(-values, kind='stable'):
+        i = candidates[pos]
+        if all(math.hypot(x[i] - x[j], y[i] - y[j]) * scale[i] >= 2 * radius_m for j, _ in chosen):
+            chosen.append((i, values[pos]))
+            if len(chosen) == top_k:
+                break
+    return chosen
+
+
+# Top-K lingkaran berradius radius_m (meter) dengan total TSI / PML terbesar.
+# Mengembalikan frame: Peringkat, Longitude, Latitude, Radius (m), Jumlah Polis, Total TSI, Total PML
+def top_circles(final, radius_m=DEFAULT_RADIUS, top_k=DEFAULT_TOP_K, by='tsi', pair_budget=PAIR_BUDGET):
+    if by not in MEASURES:
+        raise engine.PipelineError(f"Ukuran akumulasi tidak dikenal: {by}")
+    loc = locations(final)
+    columns = ['Peringkat', engine.LON_COL, engine.LAT_COL, 'Radius (m)', 'Jumlah Polis', 'Total TSI', 'Total PML']
+    if loc.empty:
+        return pd.DataFrame(columns=columns)
+
+    x, y = web_mercator(loc['lon'].to_numpy(), loc['lat'].to_numpy())
+    scale = np.cos(np.radians(loc['lat'].to_numpy()))
+    # Radius dalam satuan Mercator pada lintang paling jauh dari ekuator (jangkauan konservatif)
+    grid = LocationGrid(x, y, radius_m / scale.min())
+    weight = loc[by].to_numpy()
+    reach = grid.reach_sums(np.column_stack([weight, np.ones(len(loc))]))
+    bound = reach[:, 0]
+    cost = grid.count * reach[:, 1]  # jumlah pasangan jika sel dihitung eksak
+    cell_order = np.argsort(-bound, kind='stable')
+
+    candidates = np.empty(0, dtype='int64')
+    values = np.empty(0)
+    chosen = []
+    next_cell = 0
+    while next_cell < len(cell_order):
+        # Batch sel berikutnya sesuai urutan batas atas, dibatasi jumlah pasangan
+        batch_cost = np.cumsum(cost[cell_order[next_cell:]])
+        stop = next_cell + max(1, int(np.searchsorted(batch_cost, pair_budget, side='right')))
+        # Urut per kunci sel agar searchsorted pada grid.pairs berjalan berurutan
+        centers = grid.members(np.sort(cell_order[next_cell:stop]))
+        next_cell = stop
+
+        center_ids, neighbour_ids = grid.pairs(centers)
+        inside = np.hypot(x[centers][center_ids] - x[neighbour_ids], y[centers][center_ids] - y[neighbour_ids]) \
+            * scale[centers][center_ids] <= radius_m
+        candidates = np.concatenate([candidates, centers])
+        values = np.concatenate([values, np.bincount(
+            center_ids[inside], weights=weight[neighbour_ids[inside]], minlength=len(centers)
+        )])
+
+        chosen = select_circles(candidates, values, x, y, scale, radius_m, top_k)
+        # Sel yang belum diperiksa tidak bisa melampaui lingkaran ke-K yang sudah terpilih
+        remaining = bound[cell_order[next_cell]] if next_cell < len(cell_order) else -np.inf
+        if len(chosen) == top_k and chosen[-1][1] >= remaining:
+            break
+
+    rows = []
+    measures = loc[['count', 'tsi', 'pml']].to_numpy()
+    for rank, (center, _) in enumerate(chosen, start=1):
+        inside = np.hypot(x - x[center], y - y[center]) * scale[center] <= radius_m
+        count, tsi, pml = measures[inside].sum(axis=0)
+        rows.append([rank, loc['lon'].iat[center], loc['lat'].iat[center], radius_m, int(count), tsi, pml])
+    return pd.DataFrame(rows, columns=columns)
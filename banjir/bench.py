@@ -0,0 +1,238 @@
+"""Benchmark per tahap pipeline dengan data sintetis.
+
+Untuk setiap ukuran portofolio (mis. 10k, 100k, 1M, 10M baris) dibuat CSV
+sintetis dan dua ZIP shapefile bahaya (EPSG:4326 dan UTM), lalu setiap tahap
+pipeline dijalankan dan diukur dengan banjir.instrument: waktu, waktu CPU,
+RSS, puncak alokasi tracemalloc (opsional) dan jumlah baris masuk / keluar.
+bench_quote mengukur latensi p50 / p99 layanan quote (banjir.quote).
+Hasil ditulis sebagai JSON agar bisa dibandingkan antar commit.
+"""
+import datetime
+import http.client
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from . import cube, engine, export, hazard_cache, hazard_grid, instrument, map_layers, quote, synthetic
+
+DEFAULT_SIZES = ["10k", "100k", "1M", "10M"]
+XLSX_MAX_BENCH_ROWS = 100_000  # XLSX di atas ukuran ini terlalu lambat untuk benchmark rutin
+
+
+# "10k" → 10000, "1M" → 1000000
+def parse_size(text):
+    text = str(text).strip().lower().replace("_", "")
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(__file__),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class StageTimer:
+    # Jalankan fn lewat instrument.measure (waktu, CPU, RSS, jumlah baris); dengan memory=True
+    # juga puncak alokasi tracemalloc
+    def __init__(self, rows, memory=True):
+        self.memory = memory
+        self.profiler = instrument.Profiler(rows=rows)
+
+    @property
+    def records(self):
+        return self.profiler.records
+
+    def run(self, stage, fn, rows_in=None, rows_out=len):
+        with instrument.measure(self.profiler, stage, rows_in=rows_in) as record:
+            if self.memory:
+                tracemalloc.start()
+            try:
+                result = fn()
+            finally:
+                if self.memory:
+                    record.tracemalloc_peak_mb = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+                    tracemalloc.stop()
+            record.rows_out = rows_out(result) if callable(rows_out) else rows_out
+        return result
+
+
+# File input sintetis untuk satu ukuran (dipakai ulang jika sudah ada di work_dir)
+def prepare_inputs(work_dir, rows, seed=0):
+    os.makedirs(work_dir, exist_ok=True)
+    portfolio = os.path.join(work_dir, f"portfolio-{rows}-{seed}.csv")
+    if not os.path.exists(portfolio):
+        synthetic.write_portfolio(portfolio, rows, seed=seed)
+
+    return portfolio, prepare_hazards(work_dir, seed)
+
+
+# Dua ZIP shapefile bahaya sintetis (EPSG:4326 dan UTM), dipakai ulang jika sudah ada
+def prepare_hazards(work_dir, seed=0):
+    os.makedirs(work_dir, exist_ok=True)
+    hazards = []
+    for i, crs in enumerate((None, "EPSG:32748")):
+        path = os.path.join(work_dir, f"hazard-{i}-{seed}.zip")
+        if not os.path.exists(path):
+            synthetic.write_hazard_zip(path, synthetic.hazard_layer(seed=seed + i, crs=crs))
+        hazards.append(path)
+    return hazards
+
+
+# Benchmark semua tahap untuk satu ukuran portofolio
+def bench_size(rows, work_dir, seed=0, workers=None, memory=True):
+    portfolio, hazards = prepare_inputs(work_dir, rows, seed)
+    timer = StageTimer(rows, memory=memory)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = hazard_cache.HazardCache(cache_dir)
+
+        df = timer.run("read_csv", lambda: engine.read_portfolio(portfolio))
+        n = len(df)
+        timer.run("parse_expiry", lambda: engine.parse_expiry(df), rows_in=n, rows_out=n)
+        timer.run("filter_inforce", lambda: engine.filter_inforce(df), rows_in=n)
+        valid, _ = timer.run("clean_coordinates", lambda: engine.clean_coordinates(df), rows_in=n,
+                             rows_out=lambda parts: len(parts[0]))
+        n = len(valid)
+
+        timer.run("load_hazard", lambda: [cache.load(path) for path in hazards], rows_in=len(hazards))
+        final, _, _ = timer.run("classify", lambda: engine.classify(valid, hazards, cache=cache, workers=workers),
+                                rows_in=n, rows_out=lambda result: len(result[0]))
+        # Layer yang sama dari disk, tetapi tanpa cache titik: classify di atas sudah mengisi cache titik
+        # sehingga indeks grid tidak akan pernah dipakai. cold membangun indeks grid, warm memakainya ulang
+        grid_cache = hazard_cache.HazardCache(cache_dir, point_cache=False)
+        for stage in ("classify_grid_cold", "classify_grid_warm"):
+            timer.run(stage, lambda: engine.classify(
+                valid, hazards, cache=grid_cache, grid_resolution=hazard_grid.DEFAULT_RESOLUTION, workers=workers,
+            ), rows_in=n, rows_out=lambda result: len(result[0]))
+
+        final, _ = timer.run("apply_rates", lambda: engine.apply_rates(final), rows_in=n,
+                             rows_out=lambda result: len(result[0]))
+        final = timer.run("compute_pml", lambda: engine.compute_pml(final), rows_in=n)
+        summary_cube = timer.run("build_cube", lambda: cube.build_cube(final), rows_in=n)
+        timer.run("summaries", lambda: cube.summaries_from_cube(summary_cube), rows_in=len(summary_cube))
+        timer.run("map_bins", lambda: map_layers.aggregate_bins(final, 5)[0], rows_in=n)
+
+        with tempfile.TemporaryDirectory() as out_dir:
+            timer.run("export_parquet", lambda: export.write_export(
+                final, os.path.join(out_dir, "hasil.parquet"), "parquet"), rows_in=n, rows_out=n)
+            if n <= XLSX_MAX_BENCH_ROWS:
+                timer.run("export_xlsx", lambda: export.write_export(
+                    final, os.path.join(out_dir, "hasil.xlsx"), "xlsx"), rows_in=n, rows_out=n)
+
+    return timer.records
+
+
+# Persentil latensi (ms) dari daftar durasi (detik)
+def latency_summary(durations):
+    ms = np.asarray(durations) * 1000
+    return {f"p{q}_ms": round(float(np.percentile(ms, q)), 3) for q in (50, 90, 99)} | {
+        "max_ms": round(float(ms.max()), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+    }
+
+
+# Latensi quote untuk permintaan acak di sekitar kota sintetis: in-process (QuoteEngine.quote_columns)
+# atau lewat server HTTP lokal. concurrency thread mengirim permintaan bersamaan, batch lokasi
+# per permintaan
+def bench_quote(hazard_sources, requests=2000, concurrency=1, batch=1, over_http=False, seed=0, rate_table=None):
+    started = time.perf_counter()
+    quote_engine = quote.QuoteEngine(hazard_sources, rate_table=rate_table, cache=False)
+    startup = time.perf_counter() - started
+
+    rng = np.random.default_rng(seed)
+    lon, lat = synthetic.city_points(rng, requests * batch)
+    okupasi = rng.choice(synthetic.OKUPASI, requests * batch, p=synthetic.OKUPASI_WEIGHTS)
+    floors = rng.integers(1, 4, requests * batch)
+    tsi = rng.lognormal(np.log(8e8), 1.0, requests * batch).round()
+    payloads = []
+    for start in range(0, requests * batch, batch):
+        part = slice(start, start + batch)
+        payloads.append([
+            {"lat": float(a), "lon": float(b), "okupasi": str(c), "floors": int(d), "tsi": float(e)}
+            for a, b, c, d, e in zip(lat[part], lon[part], okupasi[part], floors[part], tsi[part])
+        ])
+
+    server = None
+    if over_http:
+        server = quote.make_server(quote_engine, port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    local = threading.local()
+
+    def send(items):
+        if server is None:
+            columns = quote.request_columns(items)
+            started = time.perf_counter()
+            quote_engine.quote_columns(**columns)
+            return time.perf_counter() - started
+        connection = getattr(local, "connection", None)
+        if connection is None:
+            connection = local.connection = http.client.HTTPConnection(*server.server_address)
+        body = json.dumps(items)
+        started = time.perf_counter()
+        connection.request("POST", "/quote", body, {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        response.read()
+        duration = time.perf_counter() - started
+        if response.status != 200:
+            raise RuntimeError(f"Quote gagal: HTTP {response.status}")
+        return duration
+
+    try:
+        for items in payloads[:min(len(payloads), 50)]:  # pemanasan (transformer per thread, koneksi)
+            send(items)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            durations = list(executor.map(send, payloads))
+        elapsed = time.perf_counter() - started
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    return {
+        "mode": "http" if over_http else "inprocess",
+        "requests": requests,
+        "batch": batch,
+        "concurrency": concurrency,
+        "layers": len(quote_engine.layers),
+        "startup_s": round(startup, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        **latency_summary(durations),
+    }
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, work_dir=None, seed=0, workers=None, memory=True, progress=None):
+    work_dir = work_dir or os.path.join(tempfile.gettempdir(), "banjir-bench")
+    results = []
+    for size in sizes:
+        rows = parse_size(size)
+        records = bench_size(rows, work_dir, seed=seed, workers=workers, memory=memory)
+        results.extend(records)
+        if progress:
+            progress(rows, records)
+
+    return {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count(),
+        "memory_profiled": memory,
+        "seed": seed,
+        "results": results,
+    }
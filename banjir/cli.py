@@ -0,0 +1,385 @@
+"""Command line untuk menjalankan pipeline PML banjir tanpa browser.
+
+Contoh:
+    python -m banjir run --portfolio portofolio.csv --hazard a.zip b.zip --out hasil.parquet
+    python -m banjir ingest --portfolio portofolio.csv --store portofolio/
+    python -m banjir run --store portofolio/ --inforce-only --valuation-date 2025-06-30 --uy 2024 2025 \
+        --hazard a.zip --out hasil.parquet
+    python -m banjir bench --sizes 10k 100k --out bench.json
+    python -m banjir scenario --result hasil.parquet --scenarios 10000 --out ep.csv
+    python -m banjir whatif --result hasil.parquet --scale 0.8 0.9 1.1 1.2 --replace Industrial=Komersial \
+        --out whatif.csv
+    python -m banjir serve --hazard a.zip b.zip --port 8765
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from . import (
+    bench, engine, export, hazard, hazard_cache, hazard_grid, instrument, parsing, quote, rates, scenario, store,
+    streaming, synthetic, whatif,
+)
+
+
+# Simpan DataFrame sesuai ekstensi file tujuan
+def write_frame(df, path, index=False):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        df.to_parquet(path, index=index)
+    elif ext == ".xlsx":
+        export.write_xlsx(df, path, index=index)
+    elif ext in (".csv", ".gz"):
+        df.to_csv(path, index=index)
+    else:
+        raise engine.PipelineError(f"Format output tidak dikenal: {path}")
+
+
+# Baca hasil pipeline yang ditulis oleh write_frame / mode streaming
+def read_frame(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        return pd.read_parquet(path)
+    if ext == ".xlsx":
+        return pd.read_excel(path)
+    if ext in (".csv", ".gz"):
+        return pd.read_csv(path)
+    raise engine.PipelineError(f"Format file hasil tidak dikenal: {path}")
+
+
+# Hasil pipeline per potongan (.parquet per batch, .csv / .gz per chunk); format lain dibaca utuh
+def iter_frame_chunks(path, chunk_rows):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    elif ext in (".csv", ".gz"):
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+    else:
+        yield read_frame(path)
+
+
+# Cache layer sesuai opsi --cache-dir / --cache-budget-mb / --no-cache
+def build_cache(args):
+    if args.no_cache:
+        return False
+    if args.cache_dir is None and args.cache_budget_mb is None:
+        return None
+    return hazard_cache.HazardCache(args.cache_dir, args.cache_budget_mb)
+
+
+# Tulis tabel ringkasan sebagai CSV ke folder tujuan
+def write_summaries(summaries, directory):
+    os.makedirs(directory, exist_ok=True)
+    for name, table in summaries.items():
+        index = name in ('uy_risiko', 'count_polis', 'sum_tsi', 'pml')
+        table = table.copy()
+        table.columns = [' | '.join(map(str, col)) if isinstance(col, tuple) else str(col)
+                         for col in table.columns]
+        write_frame(table, os.path.join(directory, f"{name}.csv"), index=index)
+
+
+def report(issues, rate_unmatched, rejected):
+    for level, message in issues:
+        print(f"[{level}] {message}", file=sys.stderr)
+    for reason, count in rate_unmatched.items():
+        if count:
+            print(f"[warning] {count:,} baris tanpa rate: {rates.UNMATCHED_LABELS[reason]}", file=sys.stderr)
+    for reason, count in rejected.items():
+        print(f"[warning] {count:,} baris dengan koordinat tidak valid dibuang: {reason}", file=sys.stderr)
+
+
+def cmd_run(args):
+    if args.uy and not args.store:
+        raise engine.PipelineError("--uy hanya bisa dipakai bersama --store.")
+    profiler = None
+    if args.perf_log:
+        instrument.configure_json_log(args.perf_log)
+        profiler = instrument.Profiler(log=True, portfolio=os.path.basename(os.path.normpath(
+            args.portfolio or args.store)))
+
+    # Dataset portofolio: filter UY dan inforce di-push down saat membaca Parquet
+    portfolio = args.portfolio
+    valuation_date = args.valuation_date if args.inforce_only else None
+    if args.store and args.chunk_rows:
+        portfolio = store.iter_chunks(args.store, valuation_date, args.uy, args.chunk_rows)
+    elif args.store:
+        with instrument.measure(profiler, "read_store") as record:
+            portfolio = store.load(args.store, valuation_date, args.uy)
+            record.rows_out = len(portfolio)
+
+    options = dict(
+        inforce_only=args.inforce_only,
+        cutoff=args.valuation_date,
+        cache=build_cache(args),
+        rate_table=rates.RateTable.load(args.rate_table) if args.rate_table else None,
+        grid_resolution=args.grid_resolution,
+        policy=args.resolve,
+        workers=args.workers,
+        clip=args.clip,
+        profiler=profiler,
+    )
+
+    if args.chunk_rows:
+        result = streaming.run_streaming(
+            portfolio, args.hazard, args.out, chunk_rows=args.chunk_rows,
+            invalid_out=args.invalid_out, **options
+        )
+        report(result.issues, result.rate_unmatched, result.rejected)
+        rows_out = result.rows_out
+    else:
+        result = engine.run_pipeline(portfolio, args.hazard, **options)
+        report(result.issues, result.rate_unmatched, parsing.reject_counts(result.invalid_rows))
+        with instrument.measure(profiler, "write_output", rows_in=len(result.final), rows_out=len(result.final)):
+            write_frame(result.final, args.out)
+        if args.invalid_out and len(result.invalid_rows):
+            write_frame(result.invalid_rows, args.invalid_out)
+        rows_out = len(result.final)
+
+    if args.summary_dir:
+        write_summaries(result.summaries, args.summary_dir)
+
+    print(f"{rows_out:,} baris ditulis ke {args.out}")
+    return 0
+
+
+def cmd_ingest(args):
+    rows = store.ingest(args.portfolio, args.store, chunk_rows=args.chunk_rows)
+    print(f"{rows:,} baris portofolio ditulis ke dataset {args.store}")
+    return 0
+
+
+def cmd_synth(args):
+    rows = bench.parse_size(args.rows)
+    synthetic.write_portfolio(args.out, rows, seed=args.seed)
+    print(f"{rows:,} baris portofolio sintetis ditulis ke {args.out}")
+    if args.hazard_out:
+        synthetic.write_hazard_zip(args.hazard_out, synthetic.hazard_layer(seed=args.seed, crs=args.hazard_crs))
+        print(f"Shapefile bahaya sintetis ditulis ke {args.hazard_out}")
+    return 0
+
+
+def cmd_bench(args):
+    def progress(rows, records):
+        for record in records:
+            print(f"{rows:>12,} {record['stage']:<20} {record['wall_s']:>9.3f} s "
+                  f"{record['peak_rss_delta_mb']:>9.1f} MB", file=sys.stderr)
+
+    report = bench.run_benchmark(args.sizes, work_dir=args.work_dir, seed=args.seed, workers=args.workers,
+                                 memory=not args.no_memory, progress=progress)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Hasil benchmark ditulis ke {args.out}")
+    return 0
+
+
+def cmd_scenario(args):
+    final = read_frame(args.result)
+    result = scenario.run_scenarios(
+        final, args.scenarios, seed=args.seed, event_rate=args.event_rate, max_events=args.max_events,
+        cell_degrees=args.cell_degrees, memory_mb=args.memory_mb, workers=args.workers,
+    )
+    write_frame(result.ep_table(args.return_periods), args.out)
+    print(f"Kurva AEP / OEP dari {args.scenarios:,} skenario ditulis ke {args.out}")
+    return 0
+
+
+def cmd_whatif(args):
+    rate_table = rates.RateTable.load(args.rate_table) if args.rate_table else rates.default_rate_table()
+    variants = whatif.scale_variants(rate_table, args.scale or [])
+    for replacement in args.replace or []:
+        okupasi, _, source = replacement.partition("=")
+        if not source:
+            raise engine.PipelineError(f"Format --replace harus OKUPASI=SUMBER: {replacement}")
+        variants.append(whatif.variant_from_spec(rate_table, {"okupasi": okupasi, "copy_from": source}))
+    if args.variants:
+        variants += whatif.load_variants(rate_table, args.variants)
+    if not variants:
+        raise engine.PipelineError("Tidak ada varian: gunakan --scale, --replace dan/atau --variants.")
+
+    result = whatif.run_whatif(iter_frame_chunks(args.result, args.chunk_rows), variants, rate_table)
+    table = result.table(args.by, relative=args.relative)
+    write_frame(table, args.out, index=True)
+    print(f"PML {len(variants):,} varian rate (+ {whatif.BASE_NAME}) ditulis ke {args.out}")
+    return 0
+
+
+def cmd_serve(args):
+    quote_engine = quote.QuoteEngine(
+        args.hazard, rate_table=rates.RateTable.load(args.rate_table) if args.rate_table else None,
+        cache=build_cache(args), policy=args.resolve,
+    )
+    report(quote_engine.issues, {}, {})
+    print(f"Server quote berjalan di http://{args.host}:{args.port} (POST /quote, GET /health)", file=sys.stderr)
+    try:
+        quote.serve(quote_engine, args.host, args.port)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_bench_quote(args):
+    hazards = args.hazard or bench.prepare_hazards(
+        args.work_dir or os.path.join(tempfile.gettempdir(), "banjir-bench"), args.seed
+    )
+    results = []
+    for over_http in ([False, True] if args.http else [False]):
+        result = bench.bench_quote(hazards, requests=args.requests, concurrency=args.concurrency,
+                                   batch=args.batch, over_http=over_http, seed=args.seed)
+        print(f"{result['mode']:<10} p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms  "
+              f"{result['throughput_rps']:,.0f} permintaan/s", file=sys.stderr)
+        results.append(result)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"commit": bench.git_commit(), "cpu_count": os.cpu_count(), "results": results}, f, indent=2)
+        print(f"Hasil benchmark quote ditulis ke {args.out}")
+    return 0
+
+
+def add_cache_arguments(parser):
+    parser.add_argument("--cache-dir", help=f"Folder cache layer bahaya (default ${hazard_cache.CACHE_DIR_ENV} "
+                                            f"atau {hazard_cache.DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-budget-mb", type=float, help="Batas ukuran cache di disk (MB)")
+    parser.add_argument("--no-cache", action="store_true", help="Selalu baca ulang ZIP shapefile")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="banjir", description="Perhitungan PML asuransi banjir")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Jalankan pipeline penuh untuk satu portofolio")
+    source = run.add_mutually_exclusive_group(required=True)
+    source.add_argument("--portfolio", help="File CSV portofolio")
+    source.add_argument("--store", help="Dataset portofolio hasil 'banjir ingest'")
+    run.add_argument("--uy", nargs="+", help="Hanya UY ini (dengan --store, hanya partisi ini dibaca)")
+    run.add_argument("--valuation-date", type=datetime.date.fromisoformat, default=engine.INFORCE_CUTOFF,
+                     help=f"Tanggal valuasi untuk --inforce-only, YYYY-MM-DD (default {engine.INFORCE_CUTOFF})")
+    run.add_argument("--hazard", required=True, nargs="+", help="Satu atau lebih ZIP shapefile banjir")
+    run.add_argument("--out", required=True, help="File hasil (.parquet, .csv, .csv.gz, .xlsx)")
+    run.add_argument("--inforce-only", action="store_true",
+                     help="Hanya gunakan polis dengan EXPIRY DATE > tanggal valuasi")
+    run.add_argument("--summary-dir", help="Folder untuk menulis tabel ringkasan (CSV)")
+    run.add_argument("--invalid-out", help="File untuk baris dengan koordinat tidak valid")
+    run.add_argument("--chunk-rows", type=int, nargs="?", const=streaming.DEFAULT_CHUNK_ROWS,
+                     help="Mode streaming: proses CSV per potongan berisi N baris "
+                          f"(default {streaming.DEFAULT_CHUNK_ROWS:,}); output .parquet / .csv / .csv.gz")
+    run.add_argument("--rate-table", help="Tabel rate (.csv / .yaml), default banjir/data/rate_table.csv")
+    run.add_argument("--grid-resolution", type=float, nargs="?", const=hazard_grid.DEFAULT_RESOLUTION,
+                     help="Klasifikasi lewat indeks grid gridcode (resolusi dalam derajat, "
+                          f"default {hazard_grid.DEFAULT_RESOLUTION:g})")
+    run.add_argument("--resolve", choices=hazard.RESOLVE_POLICIES, default="max",
+                     help="Gridcode jika titik masuk beberapa layer: max (risiko terburuk), priority "
+                          "(urutan --hazard), columns (max + satu kolom per layer)")
+    run.add_argument("--clip", type=float, nargs=4, metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"),
+                     help="Hanya baca fitur bahaya yang berpotongan dengan bbox ini (mis. satu provinsi); titik "
+                          "di luar fitur tersebut tidak mendapat gridcode")
+    run.add_argument("--workers", type=int, help="Jumlah proses paralel untuk intersection (default: jumlah CPU)")
+    run.add_argument("--perf-log", help="Log JSON waktu / CPU / memori per tahap (satu baris per tahap); "
+                                        "'-' untuk stderr")
+    add_cache_arguments(run)
+    run.set_defaults(func=cmd_run)
+
+    ingest = subparsers.add_parser("ingest", help="Simpan CSV portofolio sebagai dataset Parquet per UY")
+    ingest.add_argument("--portfolio", required=True, help="File CSV portofolio")
+    ingest.add_argument("--store", required=True, help="Folder dataset (dataset lama di folder ini diganti)")
+    ingest.add_argument("--chunk-rows", type=int, default=streaming.DEFAULT_CHUNK_ROWS,
+                        help=f"Baris CSV per potongan (default {streaming.DEFAULT_CHUNK_ROWS:,})")
+    ingest.set_defaults(func=cmd_ingest)
+
+    synth = subparsers.add_parser("synth", help="Buat portofolio dan shapefile bahaya sintetis")
+    synth.add_argument("--rows", default="100k", help="Jumlah baris (mis. 10000, 100k, 1M)")
+    synth.add_argument("--out", required=True, help="File CSV portofolio")
+    synth.add_argument("--hazard-out", help="File ZIP shapefile bahaya")
+    synth.add_argument("--hazard-crs", help="CRS shapefile bahaya (default EPSG:4326)")
+    synth.add_argument("--seed", type=int, default=0)
+    synth.set_defaults(func=cmd_synth)
+
+    bench_parser = subparsers.add_parser("bench", help="Benchmark per tahap dengan data sintetis")
+    bench_parser.add_argument("--sizes", nargs="+", default=bench.DEFAULT_SIZES,
+                              help="Ukuran portofolio (default: 10k 100k 1M 10M)")
+    bench_parser.add_argument("--out", required=True, help="File JSON hasil benchmark")
+    bench_parser.add_argument("--work-dir", help="Folder data sintetis (dipakai ulang antar run)")
+    bench_parser.add_argument("--seed", type=int, default=0)
+    bench_parser.add_argument("--workers", type=int, help="Jumlah proses paralel untuk intersection")
+    bench_parser.add_argument("--no-memory", action="store_true",
+                              help="Tanpa tracemalloc (waktu lebih akurat, tanpa puncak memori)")
+    bench_parser.set_defaults(func=cmd_bench)
+
+    scenario_parser = subparsers.add_parser("scenario", help="Simulasi Monte Carlo kerugian (AEP / OEP)")
+    scenario_parser.add_argument("--result", required=True,
+                                 help="File hasil 'banjir run' (.parquet, .csv, .csv.gz, .xlsx)")
+    scenario_parser.add_argument("--out", required=True, help="File tabel AEP / OEP (.csv, .parquet, .xlsx)")
+    scenario_parser.add_argument("--scenarios", type=int, default=10_000, help="Jumlah tahun simulasi")
+    scenario_parser.add_argument("--seed", type=int, default=0)
+    scenario_parser.add_argument("--event-rate", type=float, default=scenario.DEFAULT_EVENT_RATE,
+                                 help="Rata-rata jumlah kejadian banjir per tahun (Poisson)")
+    scenario_parser.add_argument("--max-events", type=int, default=scenario.DEFAULT_MAX_EVENTS,
+                                 help="Batas jumlah kejadian per tahun")
+    scenario_parser.add_argument("--cell-degrees", type=float, default=scenario.DEFAULT_CELL_DEGREES,
+                                 help="Ukuran sel footprint (derajat)")
+    scenario_parser.add_argument("--return-periods", type=int, nargs="+", default=scenario.RETURN_PERIODS,
+                                 help="Periode ulang (tahun) untuk kuantil kerugian")
+    scenario_parser.add_argument("--memory-mb", type=float, default=scenario.DEFAULT_MEMORY_MB,
+                                 help="Budget memori per potongan skenario (MB)")
+    scenario_parser.add_argument("--workers", type=int, help="Jumlah proses paralel (default: jumlah CPU)")
+    scenario_parser.set_defaults(func=cmd_scenario)
+
+    whatif_parser = subparsers.add_parser("whatif", help="PML untuk banyak varian tabel rate sekaligus")
+    whatif_parser.add_argument("--result", required=True,
+                               help="File hasil 'banjir run' (.parquet, .csv, .csv.gz, .xlsx)")
+    whatif_parser.add_argument("--out", required=True, help="File tabel perbandingan (.csv, .parquet, .xlsx)")
+    whatif_parser.add_argument("--rate-table", help="Tabel rate dasar (.csv / .yaml), default banjir/data/rate_table.csv")
+    whatif_parser.add_argument("--scale", type=float, nargs="+", help="Faktor skala seluruh rate (mis. 0.8 0.9 1.1)")
+    whatif_parser.add_argument("--replace", nargs="+", metavar="OKUPASI=SUMBER",
+                               help="Rate OKUPASI diganti rate okupasi SUMBER (mis. Industrial=Komersial)")
+    whatif_parser.add_argument("--variants", help="File JSON berisi list varian (scale / copy_from / rate_table, "
+                                                  "opsional dibatasi coverage / risk / okupasi)")
+    whatif_parser.add_argument("--by", nargs="+", default=[engine.UY_COL, engine.RISK_COL],
+                               choices=[engine.UY_COL, engine.OKUPASI_COL, engine.RISK_COL],
+                               help="Kunci tabel perbandingan (default: UY dan Kategori Risiko)")
+    whatif_parser.add_argument("--relative", action="store_true",
+                               help=f"Tulis perubahan relatif terhadap {whatif.BASE_NAME} (0.1 = +10%%)")
+    whatif_parser.add_argument("--chunk-rows", type=int, default=streaming.DEFAULT_CHUNK_ROWS,
+                               help=f"Baris hasil per potongan (default {streaming.DEFAULT_CHUNK_ROWS:,})")
+    whatif_parser.set_defaults(func=cmd_whatif)
+
+    serve_parser = subparsers.add_parser("serve", help="Server HTTP quote satu lokasi / batch kecil")
+    serve_parser.add_argument("--hazard", required=True, nargs="+", help="Satu atau lebih ZIP shapefile banjir")
+    serve_parser.add_argument("--rate-table", help="Tabel rate (.csv / .yaml), default banjir/data/rate_table.csv")
+    serve_parser.add_argument("--resolve", choices=hazard.RESOLVE_POLICIES, default="max",
+                              help="Gridcode jika titik masuk beberapa layer")
+    serve_parser.add_argument("--host", default=quote.DEFAULT_HOST)
+    serve_parser.add_argument("--port", type=int, default=quote.DEFAULT_PORT)
+    add_cache_arguments(serve_parser)
+    serve_parser.set_defaults(func=cmd_serve)
+
+    bench_quote_parser = subparsers.add_parser("bench-quote", help="Benchmark latensi quote (p50 / p99)")
+    bench_quote_parser.add_argument("--hazard", nargs="+", help="ZIP shapefile banjir (default: shapefile sintetis)")
+    bench_quote_parser.add_argument("--requests", type=int, default=2000, help="Jumlah permintaan quote")
+    bench_quote_parser.add_argument("--concurrency", type=int, default=4, help="Jumlah permintaan bersamaan")
+    bench_quote_parser.add_argument("--batch", type=int, default=1, help="Jumlah lokasi per permintaan")
+    bench_quote_parser.add_argument("--http", action="store_true", help="Ukur juga lewat server HTTP lokal")
+    bench_quote_parser.add_argument("--work-dir", help="Folder data sintetis (dipakai ulang antar run)")
+    bench_quote_parser.add_argument("--seed", type=int, default=0)
+    bench_quote_parser.add_argument("--out", help="File JSON hasil benchmark")
+    bench_quote_parser.set_defaults(func=cmd_bench_quote)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except engine.PipelineError as e:
+        report(e.issues, {}, {})
+        print(f"[error] {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""Cube agregasi untuk semua tabel ringkasan.
+
+Portofolio dipindai satu kali menjadi cube kecil berisi jumlah polis, total TSI
+dan total PML per (UY, Kategori Okupasi, Kategori Risiko). Semua tabel ringkasan
+dan grafik diturunkan dari cube dengan roll-up. Cube dari beberapa chunk atau
+partisi bisa digabung dengan merge_cubes.
+"""
+import pandas as pd
+
+from . import engine
+
+MEASURES = ['count', 'tsi', 'pml']
+
+
+def cube_keys(columns):
+    return [col for col in (engine.UY_COL, engine.OKUPASI_COL, engine.RISK_COL) if col in columns]
+
+
+# Satu pemindaian portofolio: jumlah polis, TSI dan PML per (UY, okupasi, risiko)
+def build_cube(final):
+    keys = cube_keys(final.columns)
+    values = final[keys].copy()
+    values['count'] = 1
+    values['tsi'] = pd.to_numeric(final[engine.TSI_COL], errors='coerce')
+    values['pml'] = pd.to_numeric(final[engine.PML_COL], errors='coerce')
+    return values.groupby(keys, dropna=False, observed=True).agg(
+        count=('count', 'sum'),
+        tsi=('tsi', 'sum'),
+        pml=('pml', 'sum'),
+    )
+
+
+# Gabungkan cube dari beberapa chunk / partisi menjadi satu cube
+def merge_cubes(cubes):
+    combined = pd.concat(cubes)
+    return combined.groupby(level=list(range(combined.index.nlevels)), dropna=False, observed=True).sum()
+
+
+# Roll-up cube ke sebagian dimensi (baris dengan kunci kosong diabaikan, seperti groupby biasa).
+# Kunci category dikembalikan ke tipe nilainya agar tabel ringkasan berisi nilai biasa.
+def rollup(cube, keys, measures=MEASURES):
+    frame = cube.reset_index()
+    for col in frame.columns:
+        if isinstance(frame[col].dtype, pd.CategoricalDtype):
+            frame[col] = frame[col].astype(frame[col].cat.categories.dtype)
+    return frame.groupby(keys)[measures].sum()
+
+
+def totals(cube, key):
+    table = rollup(cube, key).reset_index()
+    table.columns = [key, 'Jumlah Polis', 'Total TSI', 'Total PML']
+    return table
+
+
+# Semua tabel ringkasan (kunci sama dengan engine.summarize) dari cube
+def summaries_from_cube(cube):
+    summaries = {}
+    names = list(cube.index.names)
+    has_uy = engine.UY_COL in names
+    has_risk = engine.RISK_COL in names
+    has_okupasi = engine.OKUPASI_COL in names
+
+    if has_risk:
+        counts = rollup(cube, engine.RISK_COL)['count'].sort_values(ascending=False, kind='stable')
+        summaries['distribusi_risiko'] = counts.rename_axis('Kategori').reset_index(name='Jumlah')
+    if has_uy:
+        summaries['uy'] = totals(cube, engine.UY_COL)
+    if has_okupasi:
+        summaries['okupasi'] = totals(cube, engine.OKUPASI_COL)
+    if has_risk:
+        summaries['risiko'] = totals(cube, engine.RISK_COL)
+
+    if has_uy and has_risk:
+        summary = rollup(cube, [engine.UY_COL, engine.RISK_COL]).rename(
+            columns={'count': 'Jumlah Polis', 'tsi': 'Total TSI', 'pml': 'PML'}
+        )
+        pivoted = summary.unstack(engine.RISK_COL).fillna(0)
+        pivoted.columns = [' '.join(col).strip() for col in pivoted.columns.values]
+        summaries['uy_risiko'] = pivoted
+
+        if has_okupasi:
+            by_cell = rollup(cube, [engine.UY_COL, engine.OKUPASI_COL, engine.RISK_COL])
+            for name, value in (('count_polis', 'count'), ('sum_tsi', 'tsi'), ('pml', 'pml')):
+                summaries[name] = by_cell[value].unstack([engine.OKUPASI_COL, engine.RISK_COL]) \
+                    .sort_index(axis=1).fillna(0).astype(int)
+    return summaries
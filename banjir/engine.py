@@ -0,0 +1,284 @@
+"""Mesin perhitungan PML banjir: baca CSV, bersihkan koordinat, intersection
+shapefile, rate, PML, dan ringkasan. Tidak bergantung pada Streamlit."""
+import datetime
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from . import cube, hazard, hazard_cache, instrument, parsing, rates
+
+LON_COL = "Longitude"
+LAT_COL = "Latitude"
+EXPIRY_COL = "EXPIRY DATE"
+OKUPASI_COL = "Kategori Okupasi"
+FLOOR_COL = "Jumlah Lantai"
+TSI_COL = "TSI IDR"
+RISK_COL = "Kategori Risiko"
+RATE_COL = "Rate"
+PML_COL = "PML"
+UY_COL = "UY"
+REJECT_COL = parsing.REJECT_COL
+
+# Kolom TSI per coverage untuk portofolio split-coverage
+COVERAGE_TSI_COLS = {
+    rates.BUILDING: "TSI Building",
+    'Content/Stock': "TSI Content",
+    'Machine': "TSI Machine",
+}
+
+INFORCE_CUTOFF = datetime.date(2024, 12, 31)
+NO_RISK = "No Risk"
+GRIDCODE_RISK = {1: 'Rendah', 2: 'Sedang', 3: 'Tinggi'}
+# Urutan kategori = urutan alfabet, sehingga groupby / sort sama seperti kolom teks
+RISK_LEVELS = sorted(list(GRIDCODE_RISK.values()) + [NO_RISK])
+CATEGORY_COLS = [UY_COL, OKUPASI_COL]
+CATEGORY_MAX_RATIO = 0.5  # kolom teks lain menjadi category jika nilai unik <= 50% jumlah baris
+FLOAT32_MAX_INT = 2 ** 24  # bilangan bulat sampai batas ini tepat di float32
+# Kolom yang di-parse sendiri oleh engine (koordinat, tanggal, TSI), bukan lewat inferensi tipe
+PARSED_COLS = {LAT_COL, LON_COL, EXPIRY_COL, TSI_COL, *COVERAGE_TSI_COLS.values()}
+
+# issues: pesan (level, pesan) yang terkumpul sebelum gagal, mis. alasan setiap ZIP shapefile ditolak
+class PipelineError(ValueError):
+    def __init__(self, message, issues=()):
+        super().__init__(message)
+        self.issues = list(issues)
+
+
+@dataclass
+class PipelineResult:
+    final: pd.DataFrame
+    invalid_rows: pd.DataFrame
+    grid_col: str = None
+    summaries: dict = field(default_factory=dict)
+    rate_unmatched: dict = field(default_factory=dict)
+    issues: list = field(default_factory=list)
+
+
+# Membaca file CSV portofolio
+def read_portfolio(source, **read_csv_kwargs):
+    df = pd.read_csv(source, **read_csv_kwargs)
+    df.columns = df.columns.str.strip()  # Bersihkan spasi pada nama kolom
+    return compact_frame(df)
+
+
+# Representasi ringkas untuk engine: UY, Kategori Okupasi dan kolom teks berulang → category,
+# bilangan bulat → tipe integer / float32 terkecil. Kolom yang masih akan di-parse (koordinat,
+# tanggal, TSI) dibiarkan apa adanya.
+def compact_frame(df):
+    for col in df.columns:
+        if col in PARSED_COLS:
+            continue
+        series = df[col]
+        if col in CATEGORY_COLS:
+            df[col] = series.astype('category')
+        elif pd.api.types.is_object_dtype(series):
+            if series.nunique() <= CATEGORY_MAX_RATIO * len(series):
+                df[col] = series.astype('category')
+        elif pd.api.types.is_integer_dtype(series):
+            df[col] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series):
+            values = series.to_numpy()
+            finite = values[np.isfinite(values)]
+            if np.array_equal(finite, np.trunc(finite)) and np.abs(finite).max(initial=0) <= FLOAT32_MAX_INT:
+                df[col] = series.astype('float32')
+    return df
+
+
+# Konversi EXPIRY DATE ke datetime64, mengembalikan False jika kolom tidak ada
+def parse_expiry(df):
+    if EXPIRY_COL not in df.columns:
+        return False
+    if not pd.api.types.is_datetime64_any_dtype(df[EXPIRY_COL]):
+        df[EXPIRY_COL] = pd.to_datetime(df[EXPIRY_COL], format='%d/%m/%Y', errors='coerce')
+    return True
+
+
+# Filter data inforce (EXPIRY DATE > cutoff)
+def filter_inforce(df, cutoff=INFORCE_CUTOFF):
+    return df[df[EXPIRY_COL] > pd.Timestamp(cutoff)]
+
+
+# Kolom koordinat teks → float (derajat desimal atau DMS, lihat banjir.parsing)
+def clean_coordinate_column(series):
+    return pd.Series(parsing.parse_coordinates(series)[0], index=series.index)
+
+
+# Parsing koordinat, mengembalikan (data valid, baris tidak valid). Baris tidak valid tetap
+# memakai teks koordinat aslinya dan diberi alasan penolakan di kolom REJECT_COL
+def clean_coordinates(df):
+    if LAT_COL not in df.columns or LON_COL not in df.columns:
+        raise PipelineError("Kolom 'Latitude' dan/atau 'Longitude' tidak ditemukan dalam data.")
+
+    lat, lat_empty = parsing.parse_coordinates(df[LAT_COL])
+    lon, lon_empty = parsing.parse_coordinates(df[LON_COL])
+    reasons = parsing.reject_reasons(lat, lon, lat_empty, lon_empty)
+    valid_mask = reasons == ''
+
+    # Seleksi boolean sudah menghasilkan frame baru; copy dangkal hanya melepas referensi ke df
+    valid = df[valid_mask].copy(deep=False)
+    valid[LAT_COL] = lat[valid_mask]
+    valid[LON_COL] = lon[valid_mask]
+    invalid = df[~valid_mask].copy(deep=False)
+    for col in (LAT_COL, LON_COL):
+        invalid[col] = invalid[col].astype(str).where(invalid[col].notna(), None)  # tipe sama di semua chunk
+    invalid[REJECT_COL] = pd.Series(reasons[~valid_mask], index=invalid.index).map(parsing.REJECT_LABELS)
+    return valid, invalid
+
+
+# Cache layer default bersama untuk satu proses; cache=False untuk selalu membaca ZIP
+def resolve_cache(cache):
+    if cache is False:
+        return None
+    return cache if cache is not None else hazard_cache.get_default_cache()
+
+
+# Intersection dengan shapefile dan kategorisasi risiko berdasarkan gridcode
+# grid_resolution (derajat) mengaktifkan indeks grid sebagai pengganti sjoin penuh.
+# policy menentukan gridcode jika titik masuk beberapa layer (lihat hazard.resolve_gridcodes).
+# Hanya koordinat yang dikirim ke tahap spasial; gridcode dipasang kembali berdasarkan posisi baris.
+# Layer hanya dibaca di sekitar portofolio (prune) atau di dalam clip (bbox EPSG:4326).
+# hazard_keys: hash isi ZIP yang sudah dihitung pemanggil (lihat hazard.source_keys), opsional.
+def classify(df, hazard_sources, cache=None, grid_resolution=None, policy="max", workers=None, profiler=None,
+             prune=True, clip=None, hazard_keys=None):
+    gridcodes, grid_col, issues = hazard.classify_coordinates(
+        df[LON_COL].to_numpy(dtype='float64'), df[LAT_COL].to_numpy(dtype='float64'), hazard_sources,
+        cache=resolve_cache(cache), grid_resolution=grid_resolution, policy=policy, workers=workers,
+        profiler=profiler, prune=prune, clip=clip, keys=hazard_keys,
+    )
+    if gridcodes is None:
+        raise PipelineError("Tidak ada shapefile yang berhasil diproses.", issues)
+
+    # Salinan dangkal: kolom portofolio tidak diduplikasi, kolom baru hanya ada di final
+    final = df.copy(deep=False)
+    final.index = pd.RangeIndex(len(final))
+    for col, codes in gridcodes.items():
+        final[col] = codes.astype('float32')
+    if grid_col:
+        risk = np.full(len(final), RISK_LEVELS.index(NO_RISK), dtype='int8')
+        for code, label in GRIDCODE_RISK.items():
+            risk[gridcodes[grid_col] == code] = RISK_LEVELS.index(label)
+        final[RISK_COL] = pd.Categorical.from_codes(risk, categories=RISK_LEVELS)
+    return final, grid_col, issues
+
+
+# Coverage yang dihitung sebagai list (coverage, kolom TSI, kolom rate, kolom PML).
+# Tanpa kolom TSI per coverage, TSI IDR dihitung sebagai Building dengan kolom Rate / PML.
+def coverage_columns(columns):
+    split = [cov for cov, tsi_col in COVERAGE_TSI_COLS.items() if tsi_col in columns]
+    if not split:
+        return [(rates.BUILDING, TSI_COL, RATE_COL, PML_COL)]
+    return [(cov, COVERAGE_TSI_COLS[cov], f"{RATE_COL} {cov}", f"{PML_COL} {cov}") for cov in split]
+
+
+# Hitung rate berdasarkan risiko, okupasi dan jumlah lantai untuk semua coverage.
+# Mengembalikan (final, unmatched) dengan unmatched = jumlah baris tanpa rate per alasan.
+def apply_rates(final, rate_table=None):
+    if RISK_COL not in final.columns:
+        raise PipelineError("Tidak ditemukan kolom terkait 'gridcode'. Tidak dapat mengkategorikan risiko.")
+
+    missing_cols = [col for col in (OKUPASI_COL, FLOOR_COL) if col not in final.columns]
+    if missing_cols:
+        raise PipelineError(f"Kolom berikut tidak ditemukan dalam data: {', '.join(missing_cols)}")
+
+    rate_table = rate_table or rates.default_rate_table()
+    coverages = coverage_columns(final.columns)
+    unknown = [cov for cov, *_ in coverages if cov not in rate_table.coverages]
+    if unknown:
+        raise PipelineError(f"Coverage berikut tidak ada di tabel rate: {', '.join(unknown)}")
+
+    floors = pd.to_numeric(final[FLOOR_COL], errors='coerce')
+    final[FLOOR_COL] = floors.mask(floors == 0, 1)
+    rate_matrix, unmatched = rate_table.rate(
+        final[RISK_COL], final[OKUPASI_COL], final[FLOOR_COL],
+        coverages=[cov for cov, *_ in coverages],
+    )
+    for (_, _, rate_col, _), coverage_rates in zip(coverages, rate_matrix):
+        final[rate_col] = coverage_rates
+    return final, unmatched
+
+
+# Kolom TSI teks → float dengan pemisah ribuan / desimal lokal (lihat banjir.parsing)
+def clean_tsi_column(series):
+    return pd.Series(parsing.parse_amounts(series), index=series.index)
+
+
+# Hitung Probable Maximum Losses (PML) untuk semua coverage dalam satu operasi matriks
+def compute_pml(final):
+    coverages = coverage_columns(final.columns)
+    tsi_cols = [tsi_col for _, tsi_col, _, _ in coverages]
+    rate_cols = [rate_col for _, _, rate_col, _ in coverages]
+    missing_cols = [col for col in rate_cols + tsi_cols if col not in final.columns]
+    if missing_cols:
+        raise PipelineError(f"Kolom {' dan/atau '.join(missing_cols)} tidak ditemukan dalam data.")
+
+    split = tsi_cols != [TSI_COL]
+    tsi_series = [clean_tsi_column(final[col]) for col in tsi_cols]
+    tsi = np.column_stack([series.to_numpy(dtype='float64') for series in tsi_series])
+    if split:
+        tsi = np.nan_to_num(tsi)  # TSI kosong berarti coverage tersebut tidak ditutup
+    pml = tsi * final[rate_cols].to_numpy(dtype='float64')
+
+    for i, (_, tsi_col, _, pml_col) in enumerate(coverages):
+        final[tsi_col] = tsi[:, i] if split else tsi_series[i]
+        final[pml_col] = pml[:, i]
+    if split:
+        final[TSI_COL] = clean_tsi_column(final[TSI_COL]) if TSI_COL in final.columns else tsi.sum(axis=1)
+        final[PML_COL] = pml.sum(axis=1)
+    return final
+
+
+# Ringkasan hasil per UY, okupasi dan kategori risiko (nilai numerik, tanpa format),
+# diturunkan dari satu cube agregasi
+def summarize(final):
+    return cube.summaries_from_cube(cube.build_cube(final))
+
+
+# Jalankan seluruh pipeline dari CSV sampai ringkasan (dipakai CLI / batch).
+# profiler (instrument.Profiler) mencatat waktu, CPU, memori dan jumlah baris per tahap.
+def run_pipeline(portfolio, hazard_sources, inforce_only=False, cutoff=INFORCE_CUTOFF, cache=None,
+                 rate_table=None, grid_resolution=None, policy="max", workers=None, profiler=None, clip=None):
+    issues = []
+    if isinstance(portfolio, pd.DataFrame):
+        df = portfolio
+    else:
+        with instrument.measure(profiler, "read_csv") as record:
+            df = read_portfolio(portfolio)
+            record.rows_out = len(df)
+
+    with instrument.measure(profiler, "parse_expiry", rows_in=len(df), rows_out=len(df)):
+        has_expiry = parse_expiry(df)
+    if has_expiry:
+        if inforce_only:
+            with instrument.measure(profiler, "filter_inforce", rows_in=len(df)) as record:
+                df = filter_inforce(df, cutoff)
+                record.rows_out = len(df)
+    elif inforce_only:
+        issues.append(("warning", f"Kolom `{EXPIRY_COL}` tidak ditemukan, tidak bisa filter data inforce."))
+
+    with instrument.measure(profiler, "clean_coordinates", rows_in=len(df)) as record:
+        df, invalid_rows = clean_coordinates(df)
+        record.rows_out = len(df)
+
+    with instrument.measure(profiler, "classify", rows_in=len(df)) as record:
+        final, grid_col, join_issues = classify(
+            df, hazard_sources, cache=cache, grid_resolution=grid_resolution, policy=policy, workers=workers,
+            profiler=profiler, clip=clip,
+        )
+        record.rows_out = len(final)
+    issues.extend(join_issues)
+
+    with instrument.measure(profiler, "apply_rates", rows_in=len(final), rows_out=len(final)):
+        final, rate_unmatched = apply_rates(final, rate_table)
+    with instrument.measure(profiler, "compute_pml", rows_in=len(final), rows_out=len(final)):
+        final = compute_pml(final)
+    with instrument.measure(profiler, "summarize", rows_in=len(final)):
+        summaries = summarize(final)
+    return PipelineResult(
+        final=final,
+        invalid_rows=invalid_rows,
+        grid_col=grid_col,
+        summaries=summaries,
+        rate_unmatched=rate_unmatched,
+        issues=issues,
+    )
@@ -0,0 +1,178 @@
+"""Ekspor hasil perhitungan ke Parquet, CSV (gzip) atau XLSX.
+
+File ekspor dibuat hanya jika diminta dan disimpan per kunci hasil (kunci tahap
+pipeline, lihat banjir.stages), sehingga rerun Streamlit dengan hasil yang sama
+langsung memakai file yang sudah ada. XLSX ditulis dengan XlsxWriter mode
+constant_memory (baris demi baris) dan pembuatan file bisa dijalankan di thread
+background.
+"""
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import xlsxwriter
+
+from . import engine
+
+EXPORT_DIR_ENV = "BANJIR_EXPORT_DIR"
+DEFAULT_EXPORT_DIR = os.path.join(tempfile.gettempdir(), "banjir-exports")
+DEFAULT_MAX_FILES = 16
+
+# Format → (ekstensi file, MIME type)
+EXPORT_FORMATS = {
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+    "csv.gz": ("csv.gz", "application/gzip"),
+}
+XLSX_MAX_ROWS = 1_048_575  # batas baris Excel dikurangi header
+XLSX_CHUNK_ROWS = 50_000
+
+
+# XLSX write-only: XlsxWriter menulis setiap baris langsung ke file sementara di disk.
+# Mode constant_memory hanya menerima sel baris demi baris, sedangkan DataFrame.to_excel
+# menulis kolom demi kolom, sehingga baris ditulis sendiri per potongan.
+def write_xlsx(df, path, index=False):
+    if len(df) > XLSX_MAX_ROWS:
+        raise engine.PipelineError(
+            f"Data berisi {len(df):,} baris, melebihi batas Excel ({XLSX_MAX_ROWS:,}). "
+            f"Gunakan format Parquet atau CSV (gzip)."
+        )
+    if index:
+        df = df.reset_index()
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd'})
+    try:
+        sheet = workbook.add_worksheet()
+        sheet.write_row(0, 0, [' | '.join(map(str, col)) if isinstance(col, tuple) else str(col)
+                               for col in df.columns], workbook.add_format({'bold': True}))
+        for start in range(0, len(df), XLSX_CHUNK_ROWS):
+            chunk = df.iloc[start:start + XLSX_CHUNK_ROWS]
+            columns = [excel_values(chunk.iloc[:, i]) for i in range(chunk.shape[1])]
+            for offset, row in enumerate(zip(*columns), start=start + 1):
+                sheet.write_row(offset, 0, row)
+    finally:
+        workbook.close()
+
+
+# Nilai kolom sebagai objek Python untuk XlsxWriter; kosong (NaN / NaT / NA) → None (sel kosong)
+def excel_values(series):
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def write_export(df, path, fmt):
+    if fmt == "xlsx":
+        write_xlsx(df, path)
+    elif fmt == "parquet":
+        df.to_parquet(path, index=False)
+    elif fmt == "csv.gz":
+        df.to_csv(path, index=False, compression="gzip")
+    else:
+        raise engine.PipelineError(f"Format ekspor tidak dikenal: {fmt}")
+
+
+class ExportCache:
+    def __init__(self, directory=None, max_files=DEFAULT_MAX_FILES, workers=1):
+        self.directory = directory or os.environ.get(EXPORT_DIR_ENV, DEFAULT_EXPORT_DIR)
+        self.max_files = max_files
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="banjir-export")
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, key, fmt):
+        ext, _ = EXPORT_FORMATS[fmt]
+        return os.path.join(self.directory, f"{key}.{ext}")
+
+    # Path file ekspor jika sudah ada, None jika belum dibuat
+    def get(self, key, fmt):
+        path = self.path_for(key, fmt)
+        try:
+            os.utime(path)  # tandai sebagai baru dipakai
+        except FileNotFoundError:
+            return None
+        return path
+
+    # Buat file ekspor (atau pakai yang sudah ada) lalu kembalikan path-nya
+    def build(self, df, key, fmt):
+        path = self.get(key, fmt)
+        if path is not None:
+            return path
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(key, fmt)
+        # Ekstensi tetap di akhir nama file sementara agar writer Excel mengenali formatnya
+        ext, _ = EXPORT_FORMATS[fmt]
+        tmp_path = os.path.join(self.directory, f"{key}.{os.getpid()}.{threading.get_ident()}.tmp.{ext}")
+        try:
+            write_export(df, tmp_path, fmt)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict()
+        return path
+
+    # Jalankan build di thread background; permintaan yang sama memakai Future yang sama
+    def submit(self, df, key, fmt):
+        with self._lock:
+            future = self._futures.get((key, fmt))
+            if future is None or (future.done() and self._stale(future)):
+                future = self._executor.submit(self.build, df, key, fmt)
+                self._futures[(key, fmt)] = future
+            return future
+
+    # Status ekspor: ("ready", path), ("running", None), ("failed", pesan) atau ("missing", None)
+    def status(self, key, fmt):
+        path = self.get(key, fmt)
+        if path is not None:
+            return "ready", path
+        with self._lock:
+            future = self._futures.get((key, fmt))
+        if future is None:
+            return "missing", None
+        if not future.done():
+            return "running", None
+        error = future.exception()
+        if error is not None:
+            return "failed", str(error)
+        # File hasil Future bisa sudah dihapus evict(); anggap belum dibuat agar bisa dibangun ulang
+        if self._stale(future):
+            with self._lock:
+                if self._futures.get((key, fmt)) is future:
+                    del self._futures[(key, fmt)]
+            return "missing", None
+        return "ready", future.result()
+
+    # Future yang selesai tanpa error tapi file-nya sudah tidak ada juga dianggap basi
+    @staticmethod
+    def _stale(future):
+        return future.exception() is not None or not os.path.exists(future.result())
+
+    # Simpan hanya max_files file yang paling baru dipakai
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if ".tmp" in name:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except FileNotFoundError:
+                continue
+        for _, path in sorted(entries, reverse=True)[self.max_files:]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+_default_exports = None
+_default_lock = threading.Lock()
+
+
+# Cache ekspor bersama untuk satu proses (semua sesi Streamlit memakai instance yang sama)
+def get_default_exports():
+    global _default_exports
+    with _default_lock:
+        if _default_exports is None:
+            _default_exports = ExportCache()
+        return _default_exports
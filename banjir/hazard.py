@@ -0,0 +1,449 @@
+"""Pembacaan shapefile bahaya banjir dan intersection titik portofolio."""
+import hashlib
+import os
+import tempfile
+import zipfile
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyproj
+import shapely
+
+from . import hazard_grid, instrument, pools
+
+GRIDCODE_KEYWORDS = ['gridcode', 'hasil_gridcode', 'kode_grid']
+CHUNK_SIZE = 1 << 20
+POINT_CHUNK_SIZE = 500_000
+PARALLEL_MIN_ROWS = 100_000  # di bawah jumlah titik ini, kirim data ke worker lebih mahal dari sjoin langsung
+WORKER_LAYER_ENTRIES = 8
+RESOLVE_POLICIES = ("max", "priority", "columns")
+POINT_CACHE_DECIMALS = 6  # koordinat dibulatkan ke 1e-6 derajat (~0,1 m) untuk cache titik
+BBOX_SNAP_DEGREES = 0.5  # bbox portofolio dibulatkan keluar agar layer terpotong bisa dipakai ulang
+BBOX_SEGMENT_DEGREES = 0.05  # kerapatan titik sisi bbox saat diproyeksikan ke CRS layer
+
+
+# Nama file untuk pesan peringatan (UploadedFile Streamlit, path, atau file object)
+def source_name(source):
+    name = getattr(source, "name", source)
+    return os.path.basename(name) if isinstance(name, (str, os.PathLike)) else str(source)
+
+
+# Hash SHA-256 dari isi ZIP (path atau file object)
+def content_hash(source):
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    source.seek(0)
+    for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+# Hash isi setiap ZIP, dihitung sekali oleh pemanggil yang memproses banyak chunk dengan layer yang
+# sama; None untuk ZIP yang gagal dibaca (kesalahannya dilaporkan oleh classify_coordinates)
+def source_keys(hazard_sources):
+    keys = []
+    for source in hazard_sources:
+        try:
+            keys.append(content_hash(source))
+        except Exception:
+            keys.append(None)
+    return keys
+
+
+# Cari file .shp di dalam folder hasil ekstraksi ZIP
+def find_shapefile(directory):
+    shp_path = None
+    for root, _, files in os.walk(directory):
+        for file in files:
+            if file.endswith(".shp") and not file.startswith("._") and "__MACOSX" not in root:
+                shp_path = os.path.join(root, file)
+    return shp_path
+
+
+# Bbox titik (EPSG:4326) dibulatkan keluar ke kelipatan snap; None jika tidak ada titik valid
+def portfolio_bbox(lon, lat, snap=BBOX_SNAP_DEGREES):
+    valid = np.isfinite(lon) & np.isfinite(lat)
+    if not valid.any():
+        return None
+    lon, lat = lon[valid], lat[valid]
+    return (
+        float(np.floor(lon.min() / snap) * snap), float(np.floor(lat.min() / snap) * snap),
+        float((np.floor(lon.max() / snap) + 1) * snap), float((np.floor(lat.max() / snap) + 1) * snap),
+    )
+
+
+# Bbox EPSG:4326 → (minx, miny, maxx, maxy) di CRS layer yang mencakup seluruh bbox
+def bbox_bounds(bbox, crs):
+    if crs is None or crs.to_epsg() == 4326:
+        return tuple(bbox)
+    area = shapely.segmentize(shapely.box(*bbox), BBOX_SEGMENT_DEGREES)
+    return tuple(gpd.GeoSeries([area], crs="EPSG:4326").to_crs(crs).total_bounds)
+
+
+# Fitur layer yang berpotongan dengan bbox (EPSG:4326)
+def clip_to_bbox(gdf, bbox):
+    idx = gdf.sindex.query(shapely.box(*bbox_bounds(bbox, gdf.crs)), predicate="intersects")
+    return gdf.iloc[np.sort(idx)].reset_index(drop=True)
+
+
+# Baca satu ZIP shapefile menjadi GeoDataFrame, None jika tidak ada .shp di dalamnya.
+# bbox (EPSG:4326): hanya fitur yang berpotongan dengan bbox yang dibaca (filter spasial shapefile)
+def read_hazard_zip(source, bbox=None):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with zipfile.ZipFile(source, 'r') as zip_ref:
+            zip_ref.extractall(tmpdir)
+
+        shp_path = find_shapefile(tmpdir)
+        if not shp_path:
+            return None
+
+        if bbox is not None:
+            crs = gpd.read_file(shp_path, rows=0).crs
+            gdf_shape = gpd.read_file(shp_path, bbox=bbox_bounds(bbox, crs))
+        else:
+            gdf_shape = gpd.read_file(shp_path)
+        gdf_shape.columns = gdf_shape.columns.str.strip()
+        return gdf_shape
+
+
+# Cari kolom gridcode pada hasil join
+def find_gridcode_column(columns):
+    gridcode_cols = [col for col in columns if any(kw in col.lower() for kw in GRIDCODE_KEYWORDS)]
+    return gridcode_cols[0] if gridcode_cols else None
+
+
+class PointProjector:
+    # Koordinat titik di CRS layer; setiap titik diproyeksikan sekali per CRS dan dipakai
+    # bersama oleh semua layer dengan CRS yang sama
+    def __init__(self, lon, lat):
+        self.lon = lon
+        self.lat = lat
+        self._projected = {}
+
+    # (x, y) untuk titik pada posisi rows
+    def xy(self, crs, rows):
+        if crs is None or crs.to_epsg() == 4326:
+            return self.lon[rows], self.lat[rows]
+        if crs not in self._projected:
+            self._projected[crs] = (np.full(len(self.lon), np.nan), np.full(len(self.lon), np.nan),
+                                    np.zeros(len(self.lon), dtype=bool))
+        x, y, done = self._projected[crs]
+        missing = rows[~done[rows]]
+        if len(missing):
+            transformer = pyproj.Transformer.from_crs("EPSG:4326", crs, always_xy=True)
+            x[missing], y[missing] = transformer.transform(self.lon[missing], self.lat[missing])
+            done[missing] = True
+        return x[rows], y[rows]
+
+
+# Gridcode untuk titik (lon/lat EPSG:4326) terhadap satu layer. Mengembalikan array
+# (row_id, gridcode) untuk setiap pasangan titik-poligon yang berpotongan, dengan row_id
+# posisi titik dalam array masukan. Jika grid diberikan, indeks grid yang dipakai.
+# xy: koordinat titik yang sudah diproyeksikan ke CRS layer (PointProjector), opsional.
+def classify_points(layer, grid_col, lon, lat, grid=None, xy=None):
+    if grid is not None:
+        gridcode = grid.classify(lon, lat)
+        row_id = np.flatnonzero(~np.isnan(gridcode))
+        return row_id, gridcode[row_id]
+
+    if xy is not None:
+        points = shapely.points(*xy)
+    else:
+        points = gpd.GeoSeries.from_xy(lon, lat, crs="EPSG:4326")
+        if layer.crs is not None:
+            points = points.to_crs(layer.crs)
+        points = points.values
+    row_id, layer_idx = layer.sindex.query(points, predicate="intersects")
+    codes = pd.to_numeric(layer[grid_col], errors='coerce').to_numpy(dtype='float64')[layer_idx]
+    valid = ~np.isnan(codes)
+    return row_id[valid], codes[valid]
+
+
+# Gabungkan hasil per layer menjadi satu gridcode per titik.
+#   max      : gridcode tertinggi (risiko terburuk) dari semua layer
+#   priority : layer pertama (sesuai urutan upload) yang memiliki poligon di titik tersebut
+#   columns  : seperti max, ditambah satu kolom gridcode per layer
+def resolve_gridcodes(layer_hits, n, policy="max"):
+    if policy not in RESOLVE_POLICIES:
+        raise ValueError(f"Aturan penggabungan layer tidak dikenal: {policy}")
+
+    per_layer = []
+    for row_id, codes in layer_hits:
+        layer_codes = np.full(n, np.nan)
+        np.fmax.at(layer_codes, row_id, codes)  # poligon tumpang tindih dalam satu layer: ambil maksimum
+        per_layer.append(layer_codes)
+
+    resolved = np.full(n, np.nan)
+    for layer_codes in per_layer:
+        if policy == "priority":
+            resolved = np.where(np.isnan(resolved), layer_codes, resolved)
+        else:
+            resolved = np.fmax(resolved, layer_codes)
+    return resolved, per_layer
+
+
+# Worker proses: layer (beserta STRtree-nya) dan indeks grid dibaca dari file cache lalu disimpan
+# per proses. Pool worker hidup selama proses (banjir.pools), jadi setiap file hanya dibaca sekali
+# per worker; entri yang paling lama tidak dipakai dibuang setelah WORKER_LAYER_ENTRIES
+_worker_layers = OrderedDict()
+
+
+def _worker_cached(path, load):
+    value = _worker_layers.get(path)
+    if value is None:
+        value = load()
+    _worker_layers[path] = value
+    _worker_layers.move_to_end(path)
+    while len(_worker_layers) > WORKER_LAYER_ENTRIES:
+        _worker_layers.popitem(last=False)
+    return value
+
+
+def _classify_task(task):
+    layer_path, grid_path, grid_col, lon, lat, xy = task
+    layer = _worker_cached(layer_path, lambda: gpd.read_parquet(layer_path))
+    grid = _worker_cached(grid_path, lambda: hazard_grid.HazardGrid.open(grid_path, layer)) if grid_path else None
+    return classify_points(layer, grid_col, lon, lat, grid, xy)
+
+
+# Kunci int64 per titik dari lon/lat yang dibulatkan ke POINT_CACHE_DECIMALS desimal;
+# -1 untuk koordinat kosong / di luar rentang (tidak pernah disimpan di cache titik)
+def quantize_points(lon, lat, decimals=POINT_CACHE_DECIMALS):
+    scale = 10 ** decimals
+    valid = (np.abs(lon) <= 180) & (np.abs(lat) <= 90)
+    qx = np.rint(np.where(valid, lon, 0) * scale).astype('int64') + 180 * scale
+    qy = np.rint(np.where(valid, lat, 0) * scale).astype('int64') + 90 * scale
+    return np.where(valid, qx * (180 * scale + 1) + qy, -1)
+
+
+def default_workers():
+    return max(1, min(os.cpu_count() or 1, 8))
+
+
+# Intersection titik (array lon/lat EPSG:4326) dengan semua shapefile.
+# Mengembalikan (gridcodes, grid_col, issues):
+#   gridcodes: dict nama kolom → array gridcode sejajar dengan lon/lat (posisi i = titik i),
+#              kosong jika tidak ada layer dengan kolom gridcode, None jika tidak ada layer
+#              yang berhasil diproses
+#   issues   : list (level, pesan) untuk ditampilkan oleh front end
+# cache: HazardCache untuk layer yang sudah pernah dibaca, None untuk selalu membaca ZIP.
+# grid_resolution: jika diisi (derajat), titik diklasifikasi lewat indeks grid HazardGrid
+# dan hanya titik di sel batas poligon yang diuji dengan sjoin eksak.
+# workers: jumlah proses paralel (layer x potongan titik) di pool bersama (banjir.pools); butuh
+# cache karena worker membaca layer dari file cache. workers=1, tanpa cache, atau kurang dari
+# PARALLEL_MIN_ROWS titik yang perlu diuji berjalan di proses ini.
+# Dengan cache, gridcode per layer juga disimpan per koordinat (quantize_points) sehingga
+# hanya koordinat yang belum pernah diklasifikasi terhadap layer tersebut yang diuji.
+# Layer hanya dibaca untuk fitur di sekitar portofolio (bbox titik, prune=True) atau di dalam
+# clip (bbox EPSG:4326, mis. satu provinsi); titik di luar fitur yang terbaca tidak mendapat gridcode.
+# keys: hash isi setiap ZIP (source_keys) jika sudah dihitung pemanggil, agar ZIP tidak dibaca
+# dan di-hash ulang setiap chunk; None dihitung di sini.
+def classify_coordinates(lon, lat, hazard_sources, cache=None, grid_resolution=None,
+                         policy="max", workers=None, chunk_size=POINT_CHUNK_SIZE, profiler=None,
+                         prune=True, clip=None, keys=None):
+    issues = []
+    lon = np.asarray(lon, dtype='float64')
+    lat = np.asarray(lat, dtype='float64')
+    bbox = tuple(clip) if clip is not None else portfolio_bbox(lon, lat) if prune else None
+    keys = list(keys) if keys is not None else [None] * len(hazard_sources)
+
+    layers = []
+    point_cache_keys = []
+    for source, key in zip(hazard_sources, keys):
+        name = source_name(source)
+        try:
+            with instrument.measure(profiler, "hazard_load", source=name, bbox=bbox) as record:
+                key = (key or content_hash(source)) if cache is not None else None
+                if cache is not None:
+                    gdf_shape = cache.load(source, key, bbox)
+                else:
+                    gdf_shape = read_hazard_zip(source, bbox)
+                record.rows_out = len(gdf_shape) if gdf_shape is not None else 0
+        except Exception as e:
+            issues.append(("error", f"Gagal memproses shapefile dari {name}: {e}"))
+            continue
+
+        if gdf_shape is None:
+            issues.append(("warning", f"Tidak ditemukan file .shp dalam ZIP: {name}"))
+            continue
+
+        layer_grid_col = find_gridcode_column(gdf_shape.columns)
+        grid = None
+        if layer_grid_col and grid_resolution and hazard_grid.supports_layer(gdf_shape, layer_grid_col):
+            try:
+                with instrument.measure(profiler, "hazard_grid", source=name):
+                    if cache is not None:
+                        grid = cache.load_grid(cache.layer_key(key, bbox), gdf_shape, layer_grid_col,
+                                               grid_resolution)
+                    else:
+                        grid = hazard_grid.HazardGrid.build(gdf_shape, layer_grid_col, grid_resolution)
+            except Exception as e:
+                issues.append(("warning", f"Indeks grid untuk {name} gagal dipakai, kembali ke sjoin: {e}"))
+        layer_key = cache.layer_key(key, bbox) if cache is not None else None
+        layers.append((name, layer_key, gdf_shape, layer_grid_col, grid))
+        # Bbox otomatis mencakup semua titik sehingga hasilnya sama dengan layer utuh; dengan clip
+        # titik di luar clip tidak punya gridcode, jadi cache titiknya dipisah per clip
+        point_cache_keys.append(layer_key if clip is not None else key)
+
+    if not layers:
+        return None, None, issues
+
+    gridcoded = [layer for layer in layers if layer[3]]
+    point_cache_keys = [point_key for layer, point_key in zip(layers, point_cache_keys) if layer[3]]
+    if not gridcoded:
+        return {}, None, issues
+    grid_col = gridcoded[0][3]
+
+    n = len(lon)
+    workers = default_workers() if workers is None else workers
+
+    # Titik yang diuji per layer: semua titik tanpa cache; dengan cache hanya satu titik per
+    # koordinat yang belum ada di cache titik layer itu (plus koordinat yang tidak bisa di-cache)
+    todos = [np.arange(n)] * len(gridcoded)
+    cached = [None] * len(gridcoded)
+    if cache is not None and cache.point_cache:
+        with instrument.measure(profiler, "point_cache_lookup", rows_in=n) as record:
+            point_keys = quantize_points(lon, lat)
+            cacheable = np.flatnonzero(point_keys >= 0)
+            uncacheable = np.flatnonzero(point_keys < 0)
+            unique_keys, first, inverse = np.unique(
+                point_keys[cacheable], return_index=True, return_inverse=True
+            )
+            slot = np.full(n, -1)
+            slot[cacheable] = inverse
+            for i, key in enumerate(point_cache_keys):
+                codes, found = cache.lookup_points(key, unique_keys)
+                cached[i] = (codes, found)
+                todos[i] = np.sort(np.concatenate([cacheable[first[~found]], uncacheable]))
+            record.rows_out = sum(len(todo) for todo in todos)
+
+    spans = [
+        [(start, min(len(todo), start + chunk_size)) for start in range(0, len(todo), chunk_size)] or [(0, 0)]
+        for todo in todos
+    ]
+    tasks = [(i, start, stop) for i in range(len(gridcoded)) for start, stop in spans[i]]
+
+    # File cache per layer untuk worker; jika ada yang sudah terhapus (eviction) jalankan di proses ini
+    layer_files = []
+    for _, key, _, _, grid in gridcoded:
+        layer_path = cache.path_for(key) if cache is not None else None
+        grid_path = cache.grid_path_for(key, grid.resolution) if cache is not None and grid is not None else None
+        layer_files.append((layer_path, grid_path))
+    files_ready = cache is not None and all(
+        os.path.exists(path) for files in layer_files for path in files if path is not None
+    )
+
+    results = {}
+    failed = set()
+    projector = PointProjector(lon, lat)
+    query_rows = sum(len(todo) for todo in todos)
+    with instrument.measure(profiler, "hazard_query", rows_in=query_rows, layers=len(gridcoded)) as record:
+        if workers > 1 and files_ready and len(tasks) > 1 and query_rows >= PARALLEL_MIN_ROWS:
+            payloads = []
+            for i, start, stop in tasks:
+                layer_path, grid_path = layer_files[i]
+                _, _, gdf_shape, layer_grid_col, grid = gridcoded[i]
+                rows = todos[i][start:stop]
+                xy = projector.xy(gdf_shape.crs, rows) if grid is None else None
+                payloads.append((layer_path, grid_path, layer_grid_col, lon[rows], lat[rows], xy))
+            pool = pools.get_pool(workers)
+            broken = False
+            try:
+                futures = [pool.submit(_classify_task, payload) for payload in payloads]
+            except BrokenProcessPool as e:
+                futures, broken = [], True
+                results.update(dict.fromkeys(tasks, e))
+            for task, future in zip(tasks, futures):
+                try:
+                    results[task] = future.result()
+                except BrokenProcessPool as e:
+                    results[task], broken = e, True
+                except Exception as e:
+                    results[task] = e
+            if broken:
+                pools.discard_pool(workers, pool)
+        else:
+            for task in tasks:
+                i, start, stop = task
+                _, _, gdf_shape, layer_grid_col, grid = gridcoded[i]
+                rows = todos[i][start:stop]
+                try:
+                    xy = projector.xy(gdf_shape.crs, rows) if grid is None else None
+                    results[task] = classify_points(gdf_shape, layer_grid_col, lon[rows], lat[rows], grid, xy)
+                except Exception as e:
+                    results[task] = e
+        record.rows_out = sum(len(result[0]) for result in results.values() if not isinstance(result, Exception))
+
+    # Susun ulang hasil per layer sesuai urutan upload agar hasil selalu sama
+    layer_hits = []
+    layer_names = []
+    for i, (name, *_) in enumerate(gridcoded):
+        row_ids, codes = [], []
+        for start, stop in spans[i]:
+            result = results[(i, start, stop)]
+            if isinstance(result, Exception):
+                issues.append(("error", f"Gagal memproses shapefile dari {name}: {result}"))
+                failed.add(i)
+                break
+            row_ids.append(todos[i][result[0] + start])
+            codes.append(result[1])
+        if i in failed:
+            continue
+        row_ids, codes = np.concatenate(row_ids), np.concatenate(codes)
+        if cached[i] is not None:
+            row_ids, codes = merge_point_cache(cache, point_cache_keys[i], cached[i], unique_keys, slot, row_ids,
+                                               codes, profiler)
+        layer_hits.append((row_ids, codes))
+        layer_names.append(name)
+
+    if not layer_hits:
+        return None, None, issues
+
+    with instrument.measure(profiler, "resolve_gridcodes", rows_in=n, rows_out=n):
+        resolved, per_layer = resolve_gridcodes(layer_hits, n, policy)
+    gridcodes = {grid_col: resolved}
+    if policy == "columns":
+        for name, layer_codes in zip(unique_layer_names(layer_names), per_layer):
+            gridcodes[f"{grid_col}_{name}"] = layer_codes
+    return gridcodes, grid_col, issues
+
+
+# Gabungkan hit baru dengan cache titik satu layer: gridcode wakil koordinat baru disimpan ke
+# cache lalu disebarkan ke semua titik dengan kunci yang sama → (row_ids, codes) untuk semua titik
+def merge_point_cache(cache, key, cached, unique_keys, slot, row_ids, codes, profiler=None):
+    unique_codes, found = cached
+    unique_codes = unique_codes.copy()
+    hit_slot = slot[row_ids]
+    keyed = hit_slot >= 0
+    np.fmax.at(unique_codes, hit_slot[keyed], codes[keyed])
+
+    with instrument.measure(profiler, "point_cache_store", rows_in=int((~found).sum())):
+        cache.store_points(key, unique_keys[~found], unique_codes[~found])
+
+    cacheable = np.flatnonzero(slot >= 0)
+    expanded = unique_codes[slot[cacheable]]
+    hit = ~np.isnan(expanded)
+    return (
+        np.concatenate([cacheable[hit], row_ids[~keyed]]),
+        np.concatenate([expanded[hit], codes[~keyed]]),
+    )
+
+
+# Nama kolom per layer dari nama file ZIP (tanpa ekstensi, dibuat unik)
+def unique_layer_names(names):
+    seen = {}
+    result = []
+    for name in names:
+        base = os.path.splitext(name)[0]
+        seen[base] = seen.get(base, 0) + 1
+        result.append(base if seen[base] == 1 else f"{base}_{seen[base]}")
+    return result
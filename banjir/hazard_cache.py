@@ -0,0 +1,251 @@
+"""Cache shapefile bahaya banjir berdasarkan hash isi ZIP.
+
+Layer yang sudah pernah dibaca disimpan sebagai GeoParquet di disk (dipakai
+bersama oleh semua sesi Streamlit dan run CLI) dan sebagai GeoDataFrame dengan
+spatial index (STRtree) yang sudah dibangun di memori proses. Layer yang
+dipotong per bbox portofolio diambil dari GeoParquet layer utuh (dengan kolom
+bbox per fitur sehingga hanya row group di sekitar bbox yang dibaca); ZIP
+hanya di-parse sekali per isi.
+
+Hasil klasifikasi titik juga disimpan per layer (cache titik): kunci koordinat
+terkuantisasi → gridcode layer tersebut, sebagai Parquet di samping layer.
+Karena dikunci dengan hash isi layer, cache titik otomatis tidak dipakai lagi
+saat shapefile berubah, dan upload portofolio berikutnya hanya perlu menguji
+koordinat yang belum pernah dilihat.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pyproj
+import pyarrow.parquet as pq
+
+from . import hazard, hazard_grid
+from .hazard import content_hash
+
+CACHE_DIR_ENV = "BANJIR_CACHE_DIR"
+CACHE_BUDGET_ENV = "BANJIR_CACHE_BUDGET_MB"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "banjir", "hazard")
+DEFAULT_BUDGET_MB = 2048
+DEFAULT_MEMORY_ENTRIES = 8
+
+
+class HazardCache:
+    # point_cache=False: hanya layer dan indeks grid yang di-cache, setiap titik selalu diuji ulang
+    def __init__(self, directory=None, budget_mb=None, memory_entries=DEFAULT_MEMORY_ENTRIES, point_cache=True):
+        self.directory = directory or os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR)
+        self.point_cache = point_cache
+        if budget_mb is None:
+            budget_mb = float(os.environ.get(CACHE_BUDGET_ENV, DEFAULT_BUDGET_MB))
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path_for(self, key):
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def grid_path_for(self, key, resolution):
+        return os.path.join(self.directory, f"{key}.grid-{resolution:g}.npy")
+
+    def point_path_for(self, key):
+        return os.path.join(self.directory, f"{key}.points.parquet")
+
+    # Cache titik untuk satu layer → (kunci terurut, gridcode; NaN = tidak masuk poligon mana pun)
+    def _points(self, key):
+        memory_key = (key, "points")
+        with self._lock:
+            points = self._memory.get(memory_key)
+            if points is not None:
+                self._memory.move_to_end(memory_key)
+                return points
+
+        path = self.point_path_for(key)
+        if os.path.exists(path):
+            table = pd.read_parquet(path)
+            points = (table['key'].to_numpy(dtype='int64'), table['code'].to_numpy(dtype='float64'))
+            os.utime(path)
+        else:
+            points = (np.empty(0, dtype='int64'), np.empty(0, dtype='float64'))
+        self._remember(memory_key, points)
+        return points
+
+    # Gridcode tersimpan untuk kunci titik (lihat hazard.quantize_points) → (codes, found)
+    def lookup_points(self, key, point_keys):
+        stored_keys, stored_codes = self._points(key)
+        point_keys = np.asarray(point_keys, dtype='int64')
+        if not len(stored_keys):
+            return np.full(len(point_keys), np.nan), np.zeros(len(point_keys), dtype=bool)
+        pos = np.minimum(np.searchsorted(stored_keys, point_keys), len(stored_keys) - 1)
+        found = stored_keys[pos] == point_keys
+        return np.where(found, stored_codes[pos], np.nan), found
+
+    # Tambahkan hasil klasifikasi titik baru ke cache titik layer
+    def store_points(self, key, point_keys, codes):
+        if not len(point_keys):
+            return
+        stored_keys, stored_codes = self._points(key)
+        merged_keys, first = np.unique(
+            np.concatenate([np.asarray(point_keys, dtype='int64'), stored_keys]), return_index=True
+        )
+        merged_codes = np.concatenate([np.asarray(codes, dtype='float64'), stored_codes])[first]
+
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.point_path_for(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pd.DataFrame({'key': merged_keys, 'code': merged_codes}).to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        self._remember((key, "points"), (merged_keys, merged_codes))
+        self.evict()
+
+    def _remember(self, memory_key, value):
+        with self._lock:
+            self._memory[memory_key] = value
+            self._memory.move_to_end(memory_key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    # Kunci file layer: hash isi ZIP, ditambah bbox jika layer dipotong. Nilai bbox ditulis dengan repr
+    # float (presisi penuh) agar bbox yang sama dengan tipe / format berbeda (106, 106.0, np.float64)
+    # memakai file yang sama, sedangkan bbox yang berbeda sedikit (106.5 dan 106.500001) tidak
+    def layer_key(self, key, bbox=None):
+        if bbox is None:
+            return key
+        return f"{key}.bbox{'_'.join(repr(float(value) + 0.0) for value in bbox)}"
+
+    # Ambil layer dari cache (memori → disk → baca ZIP). None jika ZIP tidak berisi .shp.
+    # bbox (EPSG:4326): hanya fitur di dalam bbox, dipotong dari layer utuh di memori atau di disk.
+    # ZIP hanya dibaca jika layer utuh belum ada sama sekali; layer utuhnya lalu disimpan di disk
+    # agar bbox lain (upload portofolio berikutnya) tidak perlu mem-parse ZIP lagi
+    def load(self, source, key=None, bbox=None):
+        key = key or content_hash(source)
+        layer_key = self.layer_key(key, bbox)
+
+        with self._lock:
+            gdf = self._memory.get(layer_key)
+            if gdf is not None:
+                self._memory.move_to_end(layer_key)
+                return gdf
+            full = self._memory.get(key) if bbox is not None else None
+
+        path = self.path_for(layer_key)
+        full_path = self.path_for(key)
+        if os.path.exists(path):
+            gdf = gpd.read_parquet(path)
+            os.utime(path)  # tandai sebagai baru dipakai untuk LRU
+        elif full is not None:
+            gdf = hazard.clip_to_bbox(full, bbox)
+            self._store(layer_key, gdf)
+        elif bbox is not None and os.path.exists(full_path):
+            gdf = read_clipped(full_path, bbox)
+            os.utime(full_path)
+            self._store(layer_key, gdf)
+        else:
+            gdf = hazard.read_hazard_zip(source)
+            if gdf is None:
+                return None
+            self._store(key, gdf)
+            if bbox is not None:
+                gdf = hazard.clip_to_bbox(gdf, bbox)
+                self._store(layer_key, gdf)
+
+        gdf.sindex  # bangun STRtree sekali, dipakai ulang oleh sjoin berikutnya
+        self._remember(layer_key, gdf)
+        return gdf
+
+    # Indeks grid untuk layer yang sudah dimuat; dibangun sekali lalu dibuka sebagai memmap
+    def load_grid(self, key, gdf, grid_col, resolution=hazard_grid.DEFAULT_RESOLUTION):
+        memory_key = (key, "grid", resolution)
+        with self._lock:
+            grid = self._memory.get(memory_key)
+            if grid is not None:
+                self._memory.move_to_end(memory_key)
+                return grid
+
+        path = self.grid_path_for(key, resolution)
+        if os.path.exists(path) and os.path.exists(f"{path}.json"):
+            grid = hazard_grid.HazardGrid.open(path, gdf)
+            os.utime(path)
+        else:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+            hazard_grid.HazardGrid.build(gdf, grid_col, resolution, path=tmp_path)
+            os.replace(f"{tmp_path}.json", f"{path}.json")
+            os.replace(tmp_path, path)
+            grid = hazard_grid.HazardGrid.open(path, gdf)
+            self.evict()
+
+        self._remember(memory_key, grid)
+        return grid
+
+    def _store(self, key, gdf):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        gdf.to_parquet(tmp_path, write_covering_bbox=True)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    # Hapus file yang paling lama tidak dipakai sampai ukuran cache di bawah budget
+    def evict(self):
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith((".parquet", ".npy")) or ".tmp" in name:
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.budget_bytes:
+                break
+            for stale in (path, f"{path}.json"):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith((".parquet", ".npy", ".json")):
+                    os.remove(os.path.join(self.directory, name))
+
+
+# Fitur GeoParquet layer utuh di dalam bbox (EPSG:4326). Dengan kolom bbox per fitur hanya row group
+# yang berpotongan yang dibaca; file cache lama tanpa kolom tersebut dibaca utuh lalu dipotong
+def read_clipped(path, bbox):
+    geo = json.loads(pq.read_schema(path).metadata.get(b"geo", b"{}"))
+    column = geo["columns"][geo["primary_column"]] if geo else {}
+    crs = pyproj.CRS.from_user_input(column["crs"]) if column.get("crs") else pyproj.CRS("EPSG:4326")
+    if "covering" in column:
+        gdf = gpd.read_parquet(path, bbox=hazard.bbox_bounds(bbox, crs))
+    else:
+        gdf = gpd.read_parquet(path)
+    return hazard.clip_to_bbox(gdf, bbox)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+# Cache bersama untuk satu proses (semua sesi Streamlit memakai instance yang sama)
+def get_default_cache():
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = HazardCache()
+        return _default_cache
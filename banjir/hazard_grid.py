@@ -0,0 +1,148 @@
+"""Indeks grid (raster) gridcode untuk klasifikasi titik tanpa sjoin.
+
+Setiap layer dirasterisasi sekali ke grid EPSG:4326 beresolusi tetap. Sel yang
+seluruhnya berada di dalam satu poligon menyimpan gridcode-nya, sel kosong
+bernilai 0, dan sel yang dilewati batas poligon ditandai BOUNDARY. Titik
+diklasifikasi dengan aritmetika koordinat → sel; hanya titik di sel BOUNDARY
+yang diuji ulang secara eksak terhadap poligon.
+"""
+import json
+import math
+
+import geopandas as gpd
+import numpy as np
+import shapely
+
+DEFAULT_RESOLUTION = 0.005  # derajat, ±550 m di ekuator
+BOUNDARY = 255
+MAX_GRIDCODE = BOUNDARY - 2
+ROW_BLOCK = 512
+METERS_PER_DEGREE = 111_320  # panjang satu derajat di ekuator, untuk memadatkan sisi layer terproyeksi
+EDGE_TOLERANCE = 1e-6  # dalam satuan sel: titik sisi sedekat ini ke garis sel menandai sel di kedua sisinya
+
+
+# Layer bisa diindeks jika gridcode berupa bilangan bulat 0..MAX_GRIDCODE
+def supports_layer(layer, grid_col):
+    if not grid_col or grid_col not in layer.columns:
+        return False
+    codes = layer[grid_col].dropna().to_numpy(dtype='float64')
+    return bool(np.all((codes >= 0) & (codes <= MAX_GRIDCODE) & (codes == np.round(codes))))
+
+
+class HazardGrid:
+    def __init__(self, cells, minx, maxy, resolution, layer, grid_col):
+        self.cells = cells
+        self.minx = minx
+        self.maxy = maxy
+        self.resolution = resolution
+        self.layer = layer
+        self.grid_col = grid_col
+
+    @classmethod
+    def build(cls, layer, grid_col, resolution=DEFAULT_RESOLUTION, path=None):
+        geoms = layer.geometry.values
+        codes = layer[grid_col].to_numpy(dtype='float64')
+        if layer.crs is not None and layer.crs.to_epsg() != 4326:
+            # Sisi yang lurus di CRS terproyeksi melengkung di EPSG:4326: padatkan dulu di CRS layer
+            # (segmen ±resolution / 2 derajat) agar sisi hasil proyeksi mengikuti sisi aslinya
+            if layer.crs.is_projected:
+                unit = layer.crs.axis_info[0].unit_conversion_factor
+                geoms = shapely.segmentize(geoms, resolution / 2 * METERS_PER_DEGREE / unit)
+            geoms = gpd.GeoSeries(geoms, crs=layer.crs).to_crs(4326).values
+
+        minx, miny, maxx, maxy = shapely.total_bounds(geoms) if len(geoms) else (np.nan,) * 4
+        if not np.all(np.isfinite([minx, miny, maxx, maxy])):
+            # Layer tanpa geometri (mis. tidak ada fitur di sekitar portofolio): grid satu sel kosong
+            minx = miny = maxx = maxy = 0.0
+        minx = math.floor(minx / resolution) * resolution
+        maxy = math.ceil(maxy / resolution) * resolution
+        # Satu sel cadangan agar titik tepat di batas kanan / bawah tetap masuk grid
+        ncols = math.ceil((maxx - minx) / resolution) + 1
+        nrows = math.ceil((maxy - miny) / resolution) + 1
+
+        # Disimpan sebagai memmap jika path diberikan agar bisa dibuka ulang tanpa memuat ke RAM
+        if path:
+            cells = np.lib.format.open_memmap(path, mode='w+', dtype=np.uint8, shape=(nrows, ncols))
+            cells[:] = 0
+        else:
+            cells = np.zeros((nrows, ncols), dtype=np.uint8)
+
+        # Isi sel berdasarkan titik tengah sel (gridcode disimpan +1, 0 = tanpa poligon)
+        for geom, code in zip(geoms, codes):
+            if geom is None or geom.is_empty or np.isnan(code):
+                continue
+            shapely.prepare(geom)
+            gx0, gy0, gx1, gy1 = geom.bounds
+            c0 = max(0, int(math.floor((gx0 - minx) / resolution)))
+            c1 = min(ncols, int(math.ceil((gx1 - minx) / resolution)))
+            r0 = max(0, int(math.floor((maxy - gy1) / resolution)))
+            r1 = min(nrows, int(math.ceil((maxy - gy0) / resolution)))
+            xs = minx + (np.arange(c0, c1) + 0.5) * resolution
+            for rb in range(r0, r1, ROW_BLOCK):
+                re = min(r1, rb + ROW_BLOCK)
+                ys = maxy - (np.arange(rb, re) + 0.5) * resolution
+                grid_x, grid_y = np.meshgrid(xs, ys)
+                inside = shapely.contains_xy(geom, grid_x, grid_y)
+                block = cells[rb:re, c0:c1]
+                np.maximum(block, np.where(inside, np.uint8(code + 1), np.uint8(0)), out=block)
+
+        # Tandai sel yang dilewati batas poligon. Setelah segmentize, tiap segmen lebih pendek
+        # dari setengah sel sehingga hanya menyentuh sel kedua ujungnya dan dua sel sudutnya.
+        # Sisi yang tepat di garis sel (atau bergeser sedikit karena pembulatan proyeksi) menandai
+        # sel di kedua sisi garis, karena titik di sisi tersebut bisa jatuh ke sel mana pun.
+        boundaries = shapely.segmentize(shapely.boundary(geoms[~shapely.is_empty(geoms)]), resolution / 2)
+        coords = shapely.get_coordinates(boundaries)
+        col_pos = (coords[:, 0] - minx) / resolution
+        row_pos = (maxy - coords[:, 1]) / resolution
+        edge = np.zeros((nrows, ncols), dtype=bool)
+        for col_offset in (-EDGE_TOLERANCE, EDGE_TOLERANCE):
+            for row_offset in (-EDGE_TOLERANCE, EDGE_TOLERANCE):
+                cols = np.clip(np.floor(col_pos + col_offset).astype(np.int64), 0, ncols - 1)
+                rows = np.clip(np.floor(row_pos + row_offset).astype(np.int64), 0, nrows - 1)
+                edge[rows, cols] = True
+                edge[rows[:-1], cols[1:]] = True
+                edge[rows[1:], cols[:-1]] = True
+        cells[edge] = BOUNDARY
+
+        if path:
+            cells.flush()
+            with open(f"{path}.json", "w") as f:
+                json.dump({"minx": minx, "maxy": maxy, "resolution": resolution, "grid_col": grid_col}, f)
+        return cls(cells, minx, maxy, resolution, layer, grid_col)
+
+    @classmethod
+    def open(cls, path, layer):
+        with open(f"{path}.json") as f:
+            meta = json.load(f)
+        cells = np.load(path, mmap_mode='r')
+        return cls(cells, meta["minx"], meta["maxy"], meta["resolution"], layer, meta["grid_col"])
+
+    # Gridcode per titik (NaN jika tidak ada poligon), lon/lat dalam EPSG:4326
+    def classify(self, lon, lat):
+        lon = np.asarray(lon, dtype='float64')
+        lat = np.asarray(lat, dtype='float64')
+        nrows, ncols = self.cells.shape
+        cols = np.floor((lon - self.minx) / self.resolution)
+        rows = np.floor((self.maxy - lat) / self.resolution)
+        in_bounds = (cols >= 0) & (cols < ncols) & (rows >= 0) & (rows < nrows)
+
+        values = np.zeros(len(lon), dtype=np.uint8)
+        values[in_bounds] = self.cells[rows[in_bounds].astype(np.int64), cols[in_bounds].astype(np.int64)]
+
+        gridcode = np.where((values > 0) & (values != BOUNDARY), values.astype('float64') - 1, np.nan)
+        boundary_idx = np.flatnonzero(values == BOUNDARY)
+        if len(boundary_idx):
+            gridcode[boundary_idx] = self.exact(lon[boundary_idx], lat[boundary_idx])
+        return gridcode
+
+    # Uji eksak titik di sel batas terhadap poligon pada CRS layer (gridcode terbesar jika tumpang tindih)
+    def exact(self, lon, lat):
+        points = gpd.GeoSeries.from_xy(lon, lat, crs="EPSG:4326")
+        if self.layer.crs is not None:
+            points = points.to_crs(self.layer.crs)
+        point_idx, layer_idx = self.layer.sindex.query(points.values, predicate="intersects")
+        codes = self.layer[self.grid_col].to_numpy(dtype='float64')[layer_idx]
+        result = np.full(len(lon), np.nan)
+        valid = ~np.isnan(codes)
+        np.fmax.at(result, point_idx[valid], codes[valid])
+        return result
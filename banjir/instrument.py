@@ -0,0 +1,119 @@
+"""Instrumentasi per tahap: waktu, waktu CPU, memori (RSS) dan jumlah baris.
+
+Setiap tahap dibungkus dengan measure(profiler, nama). Tanpa profiler
+(profiler=None) pembungkus tidak melakukan apa-apa. Puncak RSS diambil dari
+thread sampling ringan (psutil); tanpa psutil dipakai ru_maxrss proses.
+Catatan tahap bisa ditampilkan sebagai tabel dan dikirim sebagai log JSON
+(logger "banjir.perf").
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:  # psutil opsional
+    psutil = None
+    import resource
+
+LOGGER_NAME = "banjir.perf"
+SAMPLE_INTERVAL = 0.01  # detik
+
+logger = logging.getLogger(LOGGER_NAME)
+
+
+def current_rss():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RssSampler:
+    # Puncak RSS selama satu tahap, diambil tiap SAMPLE_INTERVAL detik di thread terpisah
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.start_rss = current_rss()
+        self.peak = self.start_rss
+        self._stop = threading.Event()
+        self._thread = None
+        if psutil is not None:
+            self._process = psutil.Process()
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self._process.memory_info().rss)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        end = current_rss()
+        self.peak = max(self.peak, end)
+        return end
+
+
+class Profiler:
+    def __init__(self, log=False, **context):
+        self.log = log
+        self.context = context
+        self.records = []
+
+    def frame(self):
+        return pd.DataFrame(self.records)
+
+    # Total waktu per tahap (tahap bertingkat juga dihitung di tahap induknya)
+    def totals(self):
+        frame = self.frame()
+        if frame.empty:
+            return frame
+        return frame.groupby('stage', sort=False)[['wall_s', 'cpu_s']].sum().reset_index()
+
+
+class StageRecord(dict):
+    # Catatan satu tahap; rows_out / cached / kolom lain bisa diisi di dalam blok with
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+@contextmanager
+def measure(profiler, stage, rows_in=None, **extra):
+    record = StageRecord(stage=stage, rows_in=rows_in, rows_out=None)
+    record.update(extra)
+    if profiler is None:
+        yield record
+        return
+
+    record.update(profiler.context)
+    profiler.records.append(record)  # urut sesuai waktu mulai
+    record['depth'] = sum(1 for r in profiler.records if r.get('_open'))
+    record['_open'] = True
+    sampler = RssSampler()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield record
+    finally:
+        record['wall_s'] = round(time.perf_counter() - wall_start, 4)
+        record['cpu_s'] = round(time.process_time() - cpu_start, 4)
+        end_rss = sampler.stop()
+        record['rss_mb'] = round(end_rss / 2 ** 20, 1)
+        record['peak_rss_delta_mb'] = round((sampler.peak - sampler.start_rss) / 2 ** 20, 1)
+        del record['_open']
+        if profiler.log:
+            logger.info(json.dumps(record, default=str))
+
+
+# Arahkan log JSON ke file (atau stderr untuk "-"), satu objek JSON per baris
+def configure_json_log(target):
+    handler = logging.StreamHandler() if target == "-" else logging.FileHandler(target)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return handler
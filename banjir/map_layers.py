@@ -0,0 +1,161 @@
+"""Data peta portofolio yang diagregasi di server.
+
+Polis dikelompokkan ke sel grid (derajat) yang ukurannya mengikuti level zoom,
+dengan jumlah polis, total TSI, total PML dan risiko dominan per sel. Titik
+individual beserta popup-nya hanya dikirim untuk viewport kecil, sehingga
+ukuran data yang dikirim ke browser tidak bergantung pada ukuran portofolio.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from . import engine
+
+# Bobot heatmap dan warna per kategori risiko
+RISK_WEIGHT = {"Rendah": 0.3, "Sedang": 0.6, "Tinggi": 1.0, engine.NO_RISK: 0.1}
+RISK_COLOR = {
+    "Rendah": [0, 255, 0, 180],      # Hijau transparan
+    "Sedang": [255, 255, 0, 180],    # Kuning transparan
+    "Tinggi": [255, 0, 0, 180],      # Merah transparan
+    engine.NO_RISK: [160, 160, 160, 180],  # Abu-abu transparan
+}
+DEFAULT_WEIGHT = 0.1
+DEFAULT_COLOR = [0, 0, 0, 180]
+
+# Kolom yang tidak ditampilkan di popup titik
+POPUP_EXCLUDED = ['SISTEM', 'NAMA FILE', 'Unique', 'TOC', 'Jumlah Lantai_Rev1', 'Jumlah Lantai_Rev2', 'gridcode',
+                  'Jumlah Lantai_Rev', 'Jumlah_Lantai_Fix']
+
+TILE_PIXELS = 256
+BIN_PIXELS = 24            # lebar satu sel agregasi di layar (piksel)
+MAX_BINS = 20_000
+MAX_VIEWPORT_POINTS = 20_000
+MAP_WIDTH = 1000
+MAP_HEIGHT = 750
+ACCUMULATION_COLOR = [255, 215, 0, 60]
+ACCUMULATION_LINE_COLOR = [255, 215, 0, 255]
+
+
+# Derajat per piksel pada level zoom web mercator
+def degrees_per_pixel(zoom):
+    return 360 / (TILE_PIXELS * 2 ** zoom)
+
+
+# Ukuran sel agregasi (derajat) untuk level zoom
+def bin_size_for_zoom(zoom):
+    return degrees_per_pixel(zoom) * BIN_PIXELS
+
+
+# Batas (minx, miny, maxx, maxy) area yang terlihat untuk pusat dan zoom tertentu
+def viewport_bbox(lon, lat, zoom, width=MAP_WIDTH, height=MAP_HEIGHT):
+    step = degrees_per_pixel(zoom)
+    half_w = step * width / 2
+    # Tinggi piksel dalam derajat lintang menyusut dengan cos(lintang) pada web mercator
+    half_h = step * height / 2 * math.cos(math.radians(lat))
+    return lon - half_w, lat - half_h, lon + half_w, lat + half_h
+
+
+def risk_labels(final):
+    if engine.RISK_COL in final.columns:
+        return final[engine.RISK_COL].astype(object).where(final[engine.RISK_COL].notna(), "-")
+    return pd.Series("-", index=final.index, dtype=object)
+
+
+def numeric_column(final, col):
+    if col in final.columns:
+        return pd.to_numeric(final[col], errors='coerce').to_numpy(dtype='float64')
+    return np.zeros(len(final))
+
+
+# Agregasi per sel grid: satu baris per sel dengan poligon sel, statistik dan popup.
+# Sel diperbesar dua kali lipat sampai jumlahnya tidak melebihi max_bins.
+def aggregate_bins(final, zoom, max_bins=MAX_BINS):
+    lon = final[engine.LON_COL].to_numpy(dtype='float64')
+    lat = final[engine.LAT_COL].to_numpy(dtype='float64')
+    size = bin_size_for_zoom(zoom)
+    while True:
+        ix = np.floor(lon / size).astype(np.int64)
+        iy = np.floor(lat / size).astype(np.int64)
+        # Satu kunci integer per sel agar jumlah sel bisa dihitung dengan hashing
+        iy_min = iy.min(initial=0)
+        span = int(iy.max(initial=0) - iy_min) + 1
+        _, cells = pd.factorize(ix * span + (iy - iy_min))
+        if len(cells) <= max_bins:
+            break
+        size *= 2
+
+    risk = risk_labels(final).to_numpy()
+    values = pd.DataFrame({
+        'ix': ix, 'iy': iy, 'risk': risk,
+        'tsi': numeric_column(final, engine.TSI_COL),
+        'pml': numeric_column(final, engine.PML_COL),
+        'weight': pd.Series(risk).map(RISK_WEIGHT).fillna(DEFAULT_WEIGHT).to_numpy(),
+    })
+
+    bins = values.groupby(['ix', 'iy']).agg(
+        count=('tsi', 'size'), tsi=('tsi', 'sum'), pml=('pml', 'sum'), weight=('weight', 'mean'),
+    )
+    by_risk = values.groupby(['ix', 'iy', 'risk']).size().unstack('risk', fill_value=0)
+    bins['risk'] = by_risk.idxmax(axis=1).reindex(bins.index)
+    bins = bins.reset_index()
+
+    x0 = bins['ix'].to_numpy() * size
+    y0 = bins['iy'].to_numpy() * size
+    bins['lon'] = x0 + size / 2
+    bins['lat'] = y0 + size / 2
+    bins['polygon'] = [
+        [[x, y], [x + size, y], [x + size, y + size], [x, y + size]]
+        for x, y in zip(x0.tolist(), y0.tolist())
+    ]
+    bins['color'] = [RISK_COLOR.get(r, DEFAULT_COLOR) for r in bins['risk']]
+    bins['popup'] = (
+        "<b>Jumlah Polis</b>: " + bins['count'].map('{:,}'.format)
+        + "<br><b>Total TSI</b>: " + bins['tsi'].map('{:,.0f}'.format)
+        + "<br><b>Total PML</b>: " + bins['pml'].map('{:,.0f}'.format)
+        + "<br><b>Risiko Dominan</b>: " + bins['risk'].astype(str)
+    )
+    return bins.drop(columns=['ix', 'iy']), size
+
+
+# Teks popup per baris, dibangun per kolom (bukan per baris dengan apply)
+def popup_text(frame, excluded=POPUP_EXCLUDED):
+    parts = []
+    for col in frame.columns:
+        if col in excluded:
+            continue
+        values = frame[col].astype(str).where(frame[col].notna(), "-")
+        parts.append(f"<b>{col}</b>: " + values)
+    if not parts:
+        return pd.Series("", index=frame.index)
+    return parts[0].str.cat(parts[1:], sep="<br>")
+
+
+# Titik individual di dalam bbox; None jika jumlahnya melebihi max_points
+def viewport_points(final, bbox, max_points=MAX_VIEWPORT_POINTS):
+    minx, miny, maxx, maxy = bbox
+    lon = final[engine.LON_COL].to_numpy(dtype='float64')
+    lat = final[engine.LAT_COL].to_numpy(dtype='float64')
+    inside = (lon >= minx) & (lon <= maxx) & (lat >= miny) & (lat <= maxy)
+    if inside.sum() > max_points:
+        return None
+
+    subset = final[inside]
+    risk = risk_labels(subset)
+    return pd.DataFrame({
+        'lon': subset[engine.LON_COL].to_numpy(dtype='float64'),
+        'lat': subset[engine.LAT_COL].to_numpy(dtype='float64'),
+        'weight': risk.map(RISK_WEIGHT).fillna(DEFAULT_WEIGHT).to_numpy(),
+        'color': [RISK_COLOR.get(r, DEFAULT_COLOR) for r in risk],
+        'popup': popup_text(subset).to_numpy(),
+    })
+
+
+# Lingkaran akumulasi (hasil accumulation.top_circles) untuk ScatterplotLayer berradius meter
+def accumulation_circles(circles):
+    return pd.DataFrame({
+        'lon': circles[engine.LON_COL].to_numpy(dtype='float64'),
+        'lat': circles[engine.LAT_COL].to_numpy(dtype='float64'),
+        'radius': circles['Radius (m)'].to_numpy(dtype='float64'),
+        'popup': popup_text(circles).to_numpy(),
+    })
@@ -0,0 +1,166 @@
+"""Parser cepat untuk koordinat dan nilai TSI dari teks CSV.
+
+Setiap kolom teks dipindai satu kali dengan satu regex terkompilasi (RE2 lewat
+pyarrow.compute, tanpa loop Python per baris). Koordinat boleh berupa derajat
+desimal dengan titik atau koma desimal dan tanda minus en dash, maupun DMS
+(6°10'30"S, 106 49 12 BT) dengan bagian yang dipisah spasi atau tanda °/′/″;
+teks ambigu seperti 106.49.12 ditolak sebagai tidak terbaca. TSI boleh memakai pemisah ribuan dan desimal gaya
+Indonesia maupun internasional (Rp 1.234.567,89 / 1,234,567.89 / 1.000.000,- /
+1.000.000 IDR).
+Kolom yang sudah numerik langsung dipakai tanpa parsing teks.
+
+Koordinat yang ditolak diberi alasan (kosong, tidak terbaca, Latitude dan
+Longitude tertukar, di luar Indonesia) untuk laporan penolakan.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+REJECT_COL = "Alasan Tidak Valid"
+
+# Batas wilayah Indonesia (derajat) dengan sedikit kelonggaran
+LON_BOUNDS = (94.0, 142.0)
+LAT_BOUNDS = (-11.5, 6.5)
+
+EMPTY = 'empty'
+UNPARSEABLE = 'unparseable'
+SWAPPED = 'swapped'
+OUT_OF_BOUNDS = 'out_of_bounds'
+REJECT_LABELS = {
+    EMPTY: "Koordinat kosong",
+    UNPARSEABLE: "Format koordinat tidak terbaca",
+    SWAPPED: "Latitude dan Longitude tertukar",
+    OUT_OF_BOUNDS: "Di luar wilayah Indonesia",
+}
+
+NUMBER = r"\d+(?:[.,]\d+)?"
+# Bentuk paling umum (derajat desimal) diuji dulu; pola DMS lengkap hanya untuk sisanya
+DECIMAL_PATTERN = rf"^\s*(?P<sign>[-–−+])?\s*(?P<deg>{NUMBER})\s*°?\s*$"
+HEMISPHERE = r"LS|LU|BT|BB|[NSEW]"
+NEGATIVE_HEMISPHERES = ["S", "W", "LS", "BB"]
+# Bagian DMS wajib dipisah spasi atau tanda °/′/″, dan derajat bulat jika ada menit: teks seperti
+# 106.49.12 atau -6,123,456 tidak ditebak sebagai DMS melainkan ditolak sebagai tidak terbaca
+DEGREE_SEPARATOR = r"(?:\s*[°º]\s*|\s+)"
+MINUTE_SEPARATOR = r"(?:\s*['′’]\s*|\s+)"
+COORDINATE_PATTERN = (
+    rf"(?i)^\s*(?P<hemi_before>{HEMISPHERE})?\s*(?P<sign>[-–−+])?\s*"
+    rf"(?:(?P<deg>{NUMBER})\s*[°º]?"
+    rf"|(?P<int_deg>\d+){DEGREE_SEPARATOR}"
+    rf"(?:(?P<min>{NUMBER})\s*['′’]?"
+    rf"|(?P<int_min>\d+){MINUTE_SEPARATOR}(?P<sec>{NUMBER})\s*(?:\"|″|”|''|′′)?))"
+    rf"\s*(?P<hemi>{HEMISPHERE})?\s*$"
+)
+CURRENCY = r"Rp\.?|IDR"
+AMOUNT_PATTERN = (
+    rf"(?i)^\s*(?:{CURRENCY})?\s*(?P<sign>[-–−])?\s*"
+    r"(?P<int>\d{1,3}(?:[.,\s]\d{3})+|\d+)(?:(?P<dec>[.,])(?P<frac>\d+))?(?:[.,]-{1,2})?"
+    rf"\s*(?:{CURRENCY})?\s*$"
+)
+BLANK_PATTERN = r"^[\s\-–−]*$"
+
+
+# Kolom pandas → array string Arrow (null untuk NaN / None)
+def arrow_text(series):
+    try:
+        return pa.array(series, type=pa.string(), from_pandas=True)
+    except (pa.ArrowTypeError, pa.ArrowInvalid):
+        text = series.astype(str).where(series.notna(), None)
+        return pa.array(text, type=pa.string(), from_pandas=True)
+
+
+# Satu grup hasil extract_regex; null jika baris tidak cocok atau grup opsional tidak terisi
+def group(parts, name):
+    values = pc.struct_field(parts, name)
+    return pc.if_else(pc.equal(values, ""), pa.scalar(None, pa.string()), values)
+
+
+# Angka desimal dengan titik atau koma desimal → float64 (NaN untuk null)
+def decimal_values(text):
+    return pc.cast(pc.replace_substring(text, ",", "."), pa.float64()).to_numpy(zero_copy_only=False, writable=True)
+
+
+# Derajat desimal dari hasil extract_regex (grup deg, dan menit / detik / belahan bumi jika ada di pola)
+def degree_values(parts):
+    names = {field.name for field in parts.type}
+    if 'int_deg' not in names:
+        values = decimal_values(group(parts, 'deg'))
+    else:
+        values = decimal_values(pc.coalesce(group(parts, 'deg'), group(parts, 'int_deg')))
+        minutes = np.nan_to_num(decimal_values(pc.coalesce(group(parts, 'min'), group(parts, 'int_min'))))
+        seconds = np.nan_to_num(decimal_values(group(parts, 'sec')))
+        values = values + minutes / 60 + seconds / 3600
+        values[(minutes >= 60) | (seconds >= 60)] = np.nan
+
+    negative = pc.is_in(group(parts, 'sign'), pa.array(["-", "–", "−"])).to_numpy(zero_copy_only=False)
+    for name in ('hemi_before', 'hemi'):
+        if name in names:
+            hemisphere = pc.utf8_upper(group(parts, name))
+            negative |= pc.is_in(hemisphere, pa.array(NEGATIVE_HEMISPHERES)).to_numpy(zero_copy_only=False)
+    values[negative] = -values[negative]
+    return values
+
+
+# Kolom koordinat → (nilai float64, mask kosong). Nilai NaN yang tidak kosong berarti tidak terbaca
+def parse_coordinates(series):
+    if pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        return values, np.isnan(values)
+
+    text = arrow_text(series)
+    values = degree_values(pc.extract_regex(text, DECIMAL_PATTERN))
+    failed = np.flatnonzero(np.isnan(values))
+    if len(failed):
+        failed_text = text.take(pa.array(failed))
+        values[failed] = degree_values(pc.extract_regex(failed_text, COORDINATE_PATTERN))
+
+    # Hanya baris yang gagal di-parse yang diperiksa apakah kosong
+    failed = np.flatnonzero(np.isnan(values))
+    empty = np.zeros(len(values), dtype=bool)
+    if len(failed):
+        blank = pc.match_substring_regex(text.take(pa.array(failed)), BLANK_PATTERN)
+        empty[failed] = pc.fill_null(blank, True).to_numpy(zero_copy_only=False)
+    return values, empty
+
+
+# Kolom nilai uang → float64 (NaN jika kosong / tidak terbaca). Jika titik dan koma sama-sama
+# dipakai, pemisah terakhir adalah desimal; satu pemisah yang diikuti tepat tiga digit dianggap ribuan
+def parse_amounts(series):
+    if pd.api.types.is_numeric_dtype(series):
+        return series.to_numpy(dtype='float64', na_value=np.nan)
+
+    parts = pc.extract_regex(arrow_text(series), AMOUNT_PATTERN)
+    integer = pc.replace_substring_regex(group(parts, 'int'), r"[.,\s]", "")
+    number = pc.binary_join_element_wise(integer, pc.coalesce(group(parts, 'frac'), "0"), ".")
+    values = pc.cast(number, pa.float64()).to_numpy(zero_copy_only=False, writable=True)
+    negative = pc.is_valid(group(parts, 'sign')).to_numpy(zero_copy_only=False)
+    values[negative] = -values[negative]
+    return values
+
+
+def in_bounds(values, bounds):
+    return (values >= bounds[0]) & (values <= bounds[1])
+
+
+# Alasan penolakan per baris (kunci REJECT_LABELS, '' untuk koordinat valid)
+def reject_reasons(lat, lon, lat_empty, lon_empty):
+    lat_ok = in_bounds(lat, LAT_BOUNDS)
+    lon_ok = in_bounds(lon, LON_BOUNDS)
+    swapped = ~lat_ok & ~lon_ok & in_bounds(lat, LON_BOUNDS) & in_bounds(lon, LAT_BOUNDS)
+    return np.select(
+        [lat_empty | lon_empty, np.isnan(lat) | np.isnan(lon), swapped, ~(lat_ok & lon_ok)],
+        [EMPTY, UNPARSEABLE, SWAPPED, OUT_OF_BOUNDS],
+        default='',
+    )
+
+
+# Jumlah baris per alasan penolakan (label) dari baris tidak valid
+def reject_counts(invalid_rows):
+    if REJECT_COL not in invalid_rows.columns:
+        return {}
+    counts = invalid_rows[REJECT_COL].value_counts()
+    return {label: int(counts[label]) for label in REJECT_LABELS.values() if counts.get(label, 0)}
+
+
+def reject_report(counts):
+    return pd.DataFrame(list(counts.items()), columns=['Alasan', 'Jumlah Baris'])
@@ -0,0 +1,29 @@
+"""Pool proses bersama untuk tahap paralel.
+
+Pool dibuat saat pertama dipakai lalu hidup selama proses (satu pool per jumlah
+worker), sehingga worker tidak di-fork ulang setiap panggilan dan cache per
+worker (mis. layer bahaya yang sudah dibaca) tetap terpakai antar chunk, antar
+panggilan dan antar rerun Streamlit.
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+_pools = {}
+_lock = threading.Lock()
+
+
+# Pool bersama dengan jumlah worker tertentu
+def get_pool(workers):
+    with _lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        return pool
+
+
+# Buang pool yang rusak (mis. worker mati) agar panggilan berikutnya membuat pool baru
+def discard_pool(workers, pool):
+    with _lock:
+        if _pools.get(workers) is pool:
+            del _pools[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
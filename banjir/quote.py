@@ -0,0 +1,254 @@
+"""Quote banjir satu lokasi dengan latensi rendah.
+
+QuoteEngine membaca layer bahaya dan tabel rate sekali saat start, lalu menjawab
+quote (satu lokasi atau batch kecil) langsung dari indeks spasial STRtree di
+memori: tanpa CSV, tanpa upload ulang dan tanpa pipeline lengkap. Gridcode,
+Kategori Risiko, rate Building dan PML mengikuti aturan yang sama dengan
+engine.classify / apply_rates / compute_pml. Indeks hanya dibaca setelah
+start, sehingga satu engine bisa dipakai bersama oleh banyak thread.
+
+serve() menjalankan server HTTP (stdlib, satu thread per koneksi):
+    POST /quote   {"lat": ..., "lon": ..., "okupasi": ..., "floors": ..., "tsi": ...}
+                  atau list objek tersebut untuk batch
+    GET  /health
+"""
+import json
+import logging
+import math
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import pyproj
+import shapely
+
+from . import engine, hazard, parsing, rates
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BATCH = 1000
+MAX_BODY_BYTES = 1_000_000  # cukup untuk MAX_BATCH lokasi; body lebih besar ditolak tanpa dibaca
+QUOTE_FIELDS = ('lat', 'lon', 'okupasi', 'floors', 'tsi')
+
+logger = logging.getLogger(__name__)
+
+
+class QuoteEngine:
+    def __init__(self, hazard_sources, rate_table=None, cache=None, policy="max"):
+        if policy not in hazard.RESOLVE_POLICIES:
+            raise ValueError(f"Aturan penggabungan layer tidak dikenal: {policy}")
+        self.rate_table = rate_table or rates.default_rate_table()
+        self.policy = policy
+        self.issues = []
+        self.layers = []  # (nama, indeks spasial, gridcode per poligon, CRS layer atau None untuk EPSG:4326)
+        self._local = threading.local()
+        self._risk_index = {level: i for i, level in enumerate(self.rate_table.risk_levels)}
+        self._okupasi_index = {level: i for i, level in enumerate(self.rate_table.okupasi_levels)}
+
+        cache = engine.resolve_cache(cache)
+        for source in hazard_sources:
+            name = hazard.source_name(source)
+            try:
+                gdf_shape = cache.load(source) if cache is not None else hazard.read_hazard_zip(source)
+            except Exception as e:
+                self.issues.append(("error", f"Gagal memproses shapefile dari {name}: {e}"))
+                continue
+            if gdf_shape is None:
+                self.issues.append(("warning", f"Tidak ditemukan file .shp dalam ZIP: {name}"))
+                continue
+            grid_col = hazard.find_gridcode_column(gdf_shape.columns)
+            if not grid_col:
+                self.issues.append(("warning", f"Kolom gridcode tidak ditemukan dalam shapefile: {name}"))
+                continue
+            crs = gdf_shape.crs if gdf_shape.crs is not None and gdf_shape.crs.to_epsg() != 4326 else None
+            codes = pd.to_numeric(gdf_shape[grid_col], errors='coerce').to_numpy(dtype='float64')
+            self.layers.append((name, gdf_shape.sindex, codes, crs))
+
+        if not self.layers:
+            raise engine.PipelineError("Tidak ada shapefile yang berhasil diproses.", self.issues)
+
+    # Transformer pyproj per thread (objek Transformer tidak aman dipakai bersama antar thread)
+    def _transformer(self, crs):
+        transformers = getattr(self._local, "transformers", None)
+        if transformers is None:
+            transformers = self._local.transformers = {}
+        if crs not in transformers:
+            transformers[crs] = pyproj.Transformer.from_crs("EPSG:4326", crs, always_xy=True)
+        return transformers[crs]
+
+    # Gridcode per titik (NaN jika tidak ada poligon) setelah layer digabung sesuai policy
+    def gridcodes(self, lon, lat):
+        layer_hits = []
+        for _, tree, codes, crs in self.layers:
+            x, y = (lon, lat) if crs is None else self._transformer(crs).transform(lon, lat)
+            row_id, layer_idx = tree.query(shapely.points(x, y), predicate="intersects")
+            layer_codes = codes[layer_idx]
+            valid = ~np.isnan(layer_codes)
+            layer_hits.append((row_id[valid], layer_codes[valid]))
+        return hazard.resolve_gridcodes(layer_hits, len(lon), self.policy)[0]
+
+    # Rate Building per lokasi langsung dari tensor rate (NaN jika kombinasi tidak ada)
+    def building_rates(self, risk, okupasi, floors):
+        table = self.rate_table
+        risk_code = np.array([self._risk_index.get(value, -1) for value in risk], dtype=np.intp)
+        okupasi_code = np.array([self._okupasi_index.get(value, -1) for value in okupasi], dtype=np.intp)
+        floors = np.asarray(pd.to_numeric(floors, errors='coerce'), dtype='float64')
+        bucket = rates.floor_bucket(np.where(floors == 0, 1, floors)).astype(np.intp)
+        valid = (risk_code >= 0) & (okupasi_code >= 0) & (bucket >= 0)
+        rate = table.tensor[table.coverages.index(rates.BUILDING), risk_code, okupasi_code, bucket]
+        return np.where(valid, rate, np.nan)
+
+    # Quote untuk batch lokasi (list / array sejajar) → dict kolom (array per kolom)
+    def quote_columns(self, lat, lon, okupasi, floors, tsi):
+        lat, lat_empty = coordinate_values(lat)
+        lon, lon_empty = coordinate_values(lon)
+        reasons = parsing.reject_reasons(lat, lon, lat_empty, lon_empty)
+        valid = np.flatnonzero(reasons == '')
+
+        gridcode = np.full(len(lat), np.nan)
+        if len(valid):
+            gridcode[valid] = self.gridcodes(lon[valid], lat[valid])
+        risk = np.full(len(lat), engine.NO_RISK, dtype=object)
+        for code, label in engine.GRIDCODE_RISK.items():
+            risk[gridcode == code] = label
+
+        rate = self.building_rates(risk, np.atleast_1d(okupasi), np.atleast_1d(floors))
+        tsi = amount_values(tsi)
+        invalid = reasons != ''
+        risk[invalid] = None
+        rate[invalid] = np.nan
+        return {
+            engine.LAT_COL: lat,
+            engine.LON_COL: lon,
+            'gridcode': gridcode,
+            engine.RISK_COL: risk,
+            engine.RATE_COL: rate,
+            engine.TSI_COL: tsi,
+            engine.PML_COL: tsi * rate,
+            parsing.REJECT_COL: [parsing.REJECT_LABELS.get(reason) for reason in reasons],
+        }
+
+    # Quote untuk batch lokasi sebagai frame: Latitude, Longitude, gridcode, Kategori Risiko, Rate,
+    # TSI IDR, PML dan alasan jika koordinat ditolak
+    def quote_many(self, lat, lon, okupasi, floors, tsi):
+        return pd.DataFrame(self.quote_columns(lat, lon, okupasi, floors, tsi))
+
+    # Quote satu lokasi → dict; PipelineError jika koordinat ditolak
+    def quote(self, lat, lon, okupasi, floors, tsi):
+        result = quote_records(self.quote_columns([lat], [lon], [okupasi], [floors], [tsi]))[0]
+        reason = result.pop(parsing.REJECT_COL)
+        if reason:
+            raise engine.PipelineError(f"Koordinat tidak valid: {reason}")
+        return result
+
+
+# Koordinat dari list / array: angka dipakai langsung, teks di-parse (banjir.parsing)
+# → (nilai float64, mask kosong)
+def coordinate_values(values):
+    values = np.atleast_1d(values)
+    if values.dtype.kind in 'fiu':
+        values = values.astype('float64')
+        return values, np.isnan(values)
+    return parsing.parse_coordinates(pd.Series(values, dtype=object))
+
+
+def amount_values(values):
+    values = np.atleast_1d(values)
+    if values.dtype.kind in 'fiu':
+        return values.astype('float64')
+    return parsing.parse_amounts(pd.Series(values, dtype=object))
+
+
+# Nilai numpy → nilai Python yang bisa di-JSON-kan (NaN → None)
+def json_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+# Kolom hasil quote → list dict per lokasi
+def quote_records(columns):
+    names = list(columns)
+    return [{name: json_value(value) for name, value in zip(names, row)} for row in zip(*columns.values())]
+
+
+# Body JSON (satu objek atau list objek) → kolom argumen quote_many
+def request_columns(body):
+    items = body if isinstance(body, list) else [body]
+    if not items or len(items) > MAX_BATCH:
+        raise ValueError(f"Batch harus berisi 1 sampai {MAX_BATCH} lokasi")
+    missing = sorted({name for item in items for name in QUOTE_FIELDS if name not in item})
+    if missing:
+        raise ValueError(f"Field berikut wajib diisi: {', '.join(missing)}")
+    return {name: [item[name] for item in items] for name in QUOTE_FIELDS}
+
+
+class QuoteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # koneksi keep-alive untuk klien yang mengirim banyak quote
+    disable_nagle_algorithm = True  # header dan body dikirim terpisah; tanpa ini ada jeda ±40 ms per respons
+    quote_engine = None
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send(404, {"error": "Tidak ditemukan"})
+            return
+        self._send(200, {"status": "ok", "layers": [name for name, *_ in self.quote_engine.layers]})
+
+    # Body yang tidak dibaca (panjang tidak valid / terlalu besar) membuat koneksi keep-alive tidak
+    # bisa dipakai lagi, sehingga koneksi ditutup setelah respons error
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length < 0:
+                raise ValueError(length)
+        except ValueError:
+            self.close_connection = True
+            self._send(400, {"error": "Header Content-Length tidak valid"})
+            return
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self._send(413, {"error": f"Body request melebihi {MAX_BODY_BYTES:,} byte"})
+            return
+
+        body = self.rfile.read(length)
+        if self.path != "/quote":
+            self._send(404, {"error": "Tidak ditemukan"})
+            return
+        try:
+            payload = json.loads(body)
+            result = quote_records(self.quote_engine.quote_columns(**request_columns(payload)))
+        except (ValueError, TypeError, AttributeError) as e:
+            self._send(400, {"error": str(e)})
+            return
+        except Exception:
+            logger.exception("Quote gagal diproses")
+            self._send(500, {"error": "Terjadi kesalahan di server"})
+            return
+        self._send(200, result if isinstance(payload, list) else result[0])
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+# Server HTTP quote (belum berjalan; panggil serve_forever / shutdown). port=0 memilih port bebas
+def make_server(quote_engine, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    handler = type("BoundQuoteHandler", (QuoteHandler,), {"quote_engine": quote_engine})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def serve(quote_engine, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    with make_server(quote_engine, host, port) as server:
+        server.serve_forever()
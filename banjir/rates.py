@@ -0,0 +1,209 @@
+"""Tabel rate (Building / Content/Stock / Machine) dan rate engine tervektorisasi.
+
+Tabel rate dibaca dari satu file (CSV atau YAML) yang dipakai untuk tampilan
+maupun perhitungan. (Kategori Risiko, Kategori Okupasi, bucket lantai) diubah
+menjadi kode integer lalu rate diambil dengan indexing ke tensor rate
+berdimensi (coverage x risiko x okupasi x lantai).
+"""
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_RATE_TABLE = os.path.join(os.path.dirname(__file__), "data", "rate_table.csv")
+
+BUILDING = 'Building'
+FLOOR_BUCKETS = ['1', 'more_than_1']
+KEY_COLUMNS = ['Kategori Utama', 'Kategori Risiko', 'Kategori']
+
+# Nama okupasi dan lantai untuk header tabel tampilan
+OKUPASI_DISPLAY = {'Residensial': 'Residential', 'Komersial': 'Commercial', 'Industrial': 'Industrial'}
+FLOOR_DISPLAY = {'1': '1 lantai', 'more_than_1': '>1 lantai'}
+
+# Alasan baris tidak mendapat rate
+UNKNOWN_RISK = 'unknown_risk'
+UNKNOWN_OKUPASI = 'unknown_okupasi'
+NAN_FLOORS = 'nan_floors'
+UNMATCHED_LABELS = {
+    UNKNOWN_RISK: "Kategori Risiko tidak dikenal",
+    UNKNOWN_OKUPASI: "Kategori Okupasi tidak dikenal",
+    NAN_FLOORS: "Jumlah Lantai kosong / tidak valid",
+}
+
+
+# Nilai rate dari file: 0.15, "0.15" atau "15%"
+def parse_rate(value):
+    if isinstance(value, str):
+        value = value.strip()
+        if value.endswith('%'):
+            return float(value[:-1].replace(',', '.')) / 100
+        return float(value.replace(',', '.'))
+    return float(value)
+
+
+# Kode kategori (-1 untuk nilai yang tidak ada di levels)
+def encode(values, levels):
+    if isinstance(values, pd.Series) and isinstance(values.dtype, pd.CategoricalDtype) \
+            and list(values.cat.categories) == list(levels):
+        return values.cat.codes.to_numpy()
+    return pd.Categorical(values, categories=levels).codes
+
+
+# Bucket lantai: 0 untuk 1 lantai, 1 untuk lebih dari 1, -1 untuk kosong / tidak valid
+def floor_bucket(floors):
+    floors = pd.to_numeric(floors, errors='coerce')
+    floors = np.asarray(floors, dtype='float64')
+    valid = np.isfinite(floors)
+    bucket = np.where(np.trunc(floors) == 1, 0, 1).astype(np.int8)
+    bucket[~valid] = -1
+    return bucket
+
+
+class RateTable:
+    # frame: satu baris per (Kategori Utama, Kategori Risiko) dengan label tampilan
+    # pada kolom 'Kategori' dan kolom rate '<okupasi>_<bucket lantai>'
+    def __init__(self, frame):
+        missing = [col for col in KEY_COLUMNS if col not in frame.columns]
+        if missing:
+            raise ValueError(f"Kolom berikut tidak ditemukan dalam tabel rate: {', '.join(missing)}")
+
+        self.frame = frame.reset_index(drop=True)
+        self.rate_columns = [col for col in frame.columns if col not in KEY_COLUMNS]
+        self.coverages = list(dict.fromkeys(frame['Kategori Utama']))
+        self.risk_levels = list(dict.fromkeys(frame['Kategori Risiko']))
+        self.okupasi_levels = list(dict.fromkeys(col.split('_', 1)[0] for col in self.rate_columns))
+        self.floor_levels = list(FLOOR_BUCKETS)
+
+        # Kombinasi yang tidak ada di tabel bernilai NaN
+        self.tensor = np.full(
+            (len(self.coverages), len(self.risk_levels), len(self.okupasi_levels), len(self.floor_levels)),
+            np.nan
+        )
+        for row in self.frame.itertuples(index=False):
+            row = dict(zip(self.frame.columns, row))
+            c = self.coverages.index(row['Kategori Utama'])
+            r = self.risk_levels.index(row['Kategori Risiko'])
+            for col in self.rate_columns:
+                okupasi, floor_key = col.split('_', 1)
+                if floor_key not in self.floor_levels or pd.isna(row[col]):
+                    continue
+                o = self.okupasi_levels.index(okupasi)
+                f = self.floor_levels.index(floor_key)
+                self.tensor[c, r, o, f] = parse_rate(row[col])
+
+    @classmethod
+    def load(cls, source=None):
+        source = DEFAULT_RATE_TABLE if source is None else source
+        name = getattr(source, "name", source)
+        if isinstance(name, str) and name.lower().endswith((".yaml", ".yml")):
+            return cls.from_yaml(source)
+        return cls(pd.read_csv(source))
+
+    # YAML: {coverage: {risiko: {label: ..., <okupasi>: {'1': rate, 'more_than_1': rate}}}}
+    @classmethod
+    def from_yaml(cls, source):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("Tabel rate YAML membutuhkan paket PyYAML; gunakan format CSV.")
+
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, encoding="utf-8") as f:
+                data = yaml.safe_load(f)
+        else:
+            data = yaml.safe_load(source)
+
+        rows = []
+        for coverage, by_risk in data.items():
+            for risk, entry in by_risk.items():
+                entry = dict(entry)
+                row = {'Kategori Utama': coverage, 'Kategori Risiko': risk,
+                       'Kategori': entry.pop('label', risk)}
+                for okupasi, by_floor in entry.items():
+                    for floor_key, rate in by_floor.items():
+                        row[f"{okupasi}_{floor_key}"] = rate
+                rows.append(row)
+        return cls(pd.DataFrame(rows))
+
+    # Sidik jari isi tabel (level dan tensor rate) untuk kunci cache
+    def fingerprint(self):
+        digest = hashlib.sha256()
+        digest.update(repr((self.coverages, self.risk_levels, self.okupasi_levels, self.floor_levels)).encode())
+        digest.update(self.tensor.tobytes())
+        return digest.hexdigest()
+
+    # Rate bersarang {risiko: {okupasi: {lantai: rate}}} untuk satu coverage
+    def rate_dict(self, coverage=BUILDING):
+        c = self.coverages.index(coverage)
+        return {
+            risk: {
+                okupasi: {
+                    floor_key: float(self.tensor[c, r, o, f])
+                    for f, floor_key in enumerate(self.floor_levels)
+                    if not np.isnan(self.tensor[c, r, o, f])
+                }
+                for o, okupasi in enumerate(self.okupasi_levels)
+            }
+            for r, risk in enumerate(self.risk_levels)
+        }
+
+    # Tabel rate untuk ditampilkan (header dua tingkat, nilai dalam persen)
+    def display_frame(self):
+        df_rates = self.frame[['Kategori Utama', 'Kategori']].copy()
+        columns = [("", "Kategori Utama"), ("", "Kategori")]
+        for col in self.rate_columns:
+            okupasi, floor_key = col.split('_', 1)
+            df_rates[col] = [f"{parse_rate(v) * 100:g}%" if pd.notna(v) else "-" for v in self.frame[col]]
+            columns.append((OKUPASI_DISPLAY.get(okupasi, okupasi), FLOOR_DISPLAY.get(floor_key, floor_key)))
+        df_rates.columns = pd.MultiIndex.from_tuples(columns)
+        return df_rates
+
+    # Rate untuk setiap coverage sekaligus: array (len(coverages), n) dengan NaN jika tidak
+    # cocok, dan jumlah baris tidak cocok per alasan
+    def rate(self, risk, okupasi, floors, coverages=None):
+        coverages = self.coverages if coverages is None else coverages
+        coverage_code = np.array([self.coverages.index(cov) for cov in coverages], dtype=np.intp)
+
+        risk_code = encode(risk, self.risk_levels)
+        okupasi_code = encode(okupasi, self.okupasi_levels)
+        bucket = floor_bucket(floors)
+
+        unknown_risk = risk_code < 0
+        unknown_okupasi = okupasi_code < 0
+        nan_floors = bucket < 0
+        valid = ~(unknown_risk | unknown_okupasi | nan_floors)
+
+        rates = self.tensor[
+            coverage_code[:, None],
+            np.where(valid, risk_code, 0)[None, :],
+            np.where(valid, okupasi_code, 0)[None, :],
+            np.where(valid, bucket, 0)[None, :],
+        ]
+        rates[:, ~valid] = np.nan
+
+        unmatched = {
+            UNKNOWN_RISK: int(unknown_risk.sum()),
+            UNKNOWN_OKUPASI: int(unknown_okupasi.sum()),
+            NAN_FLOORS: int(nan_floors.sum()),
+        }
+        return rates, unmatched
+
+
+_default_table = None
+
+
+# Tabel rate bawaan (banjir/data/rate_table.csv), dibaca sekali per proses
+def default_rate_table():
+    global _default_table
+    if _default_table is None:
+        _default_table = RateTable.load()
+    return _default_table
+
+
+# Tabel jumlah baris tanpa rate per alasan (untuk ditampilkan)
+def unmatched_report(unmatched):
+    return pd.DataFrame(
+        [(UNMATCHED_LABELS.get(reason, reason), count) for reason, count in unmatched.items() if count],
+        columns=['Alasan', 'Jumlah Baris'],
+    )
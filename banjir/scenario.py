@@ -0,0 +1,186 @@
+"""Simulasi Monte Carlo kerugian banjir untuk distribusi PML (AEP / OEP).
+
+Setiap skenario adalah satu tahun simulasi berisi sejumlah kejadian banjir
+(Poisson). Setiap kejadian punya footprint acak per sel spasial dan faktor
+kerusakan acak per Kategori Risiko (lognormal dengan rata-rata 1). Kerugian
+polis dalam satu kejadian = PML deterministik x faktor kerusakan band risikonya,
+jika selnya terkena footprint.
+
+Polis lebih dulu digabung menjadi eksposur per (sel, band risiko, UY, okupasi),
+sehingga kerugian semua skenario dihitung sebagai perkalian matriks
+(skenario x eksposur) @ (eksposur x kelompok laporan). Skenario diproses per
+potongan sesuai budget memori dan potongan dibagi ke beberapa proses; seed per
+potongan diturunkan dari satu SeedSequence sehingga, untuk seed dan budget
+memori yang sama, hasil tidak bergantung pada jumlah worker. Potongan dikirim ke
+pool proses bersama (banjir.pools); simulasi kecil dijalankan di proses ini.
+"""
+import os
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from . import engine, pools
+
+# Peluang sel terkena footprint satu kejadian dan koefisien variasi faktor kerusakan per band
+BAND_PARAMS = {
+    'Tinggi': (0.60, 0.5),
+    'Sedang': (0.35, 0.6),
+    'Rendah': (0.15, 0.8),
+    engine.NO_RISK: (0.02, 1.0),
+}
+DEFAULT_CELL_DEGREES = 0.25
+DEFAULT_EVENT_RATE = 1.0
+DEFAULT_MAX_EVENTS = 4
+DEFAULT_MEMORY_MB = 256
+# Di bawah skenario x (sel + eksposur x kelompok) ini, mengirim spec ke worker lebih mahal dari simulasinya
+PARALLEL_MIN_WORK = 50_000_000
+RETURN_PERIODS = [2, 5, 10, 25, 50, 100, 250]
+TOTAL_LABEL = "Semua"
+
+
+@dataclass
+class ScenarioResult:
+    groups: pd.DataFrame        # satu baris per kolom hasil: UY, Kategori Okupasi (TOTAL_LABEL untuk total)
+    aggregate: np.ndarray       # (skenario x kelompok) total kerugian tahunan
+    occurrence: np.ndarray      # (skenario x kelompok) kerugian kejadian terbesar dalam setahun
+
+    # Kerugian per periode ulang (kuantil 1 - 1/RP) dan rata-rata tahunan, AEP dan OEP per kelompok
+    def ep_table(self, return_periods=RETURN_PERIODS):
+        tables = []
+        for measure, losses in (("AEP", self.aggregate), ("OEP", self.occurrence)):
+            table = self.groups.copy()
+            table.insert(0, 'Ukuran', measure)
+            table['Rata-rata'] = losses.mean(axis=0)
+            for rp in return_periods:
+                table[f"RP {rp}"] = np.quantile(losses, 1 - 1 / rp, axis=0)
+            tables.append(table)
+        return pd.concat(tables, ignore_index=True)
+
+
+# Parameter lognormal (mu, sigma) dengan rata-rata 1 dan koefisien variasi cv
+def lognormal_params(cv):
+    sigma = np.sqrt(np.log1p(np.square(cv)))
+    return -sigma ** 2 / 2, sigma
+
+
+# Eksposur per (sel, band, UY, okupasi) dan matriks kelompok laporan.
+# Mengembalikan (spec untuk simulate_chunk, groups)
+def build_exposure(final, cell_degrees=DEFAULT_CELL_DEGREES, band_params=BAND_PARAMS):
+    missing = [col for col in (engine.LON_COL, engine.LAT_COL, engine.RISK_COL, engine.PML_COL)
+               if col not in final.columns]
+    if missing:
+        raise engine.PipelineError(f"Kolom {' dan/atau '.join(missing)} tidak ditemukan dalam data.")
+
+    pml = pd.to_numeric(final[engine.PML_COL], errors='coerce').fillna(0).to_numpy(dtype='float64')
+    ix = np.floor(final[engine.LON_COL].to_numpy(dtype='float64') / cell_degrees).astype('int64')
+    iy = np.floor(final[engine.LAT_COL].to_numpy(dtype='float64') / cell_degrees).astype('int64')
+    cell, _ = pd.factorize((ix - ix.min(initial=0)) * (iy.max(initial=0) - iy.min(initial=0) + 1)
+                           + (iy - iy.min(initial=0)))
+
+    bands = list(band_params)
+    band = pd.Categorical(final[engine.RISK_COL], categories=bands).codes
+    band = np.where(band < 0, bands.index(engine.NO_RISK), band)
+
+    group_cols = [col for col in (engine.UY_COL, engine.OKUPASI_COL) if col in final.columns]
+    keys = pd.DataFrame({'cell': cell, 'band': band})
+    for col in group_cols:
+        keys[col] = final[col].to_numpy()
+    keys['pml'] = pml
+    exposure = keys.groupby(['cell', 'band'] + group_cols, dropna=False, observed=True, sort=True)['pml'].sum().reset_index()
+
+    # Kelompok laporan: setiap (UY, okupasi), total per UY, total per okupasi, dan total portofolio
+    columns, groups = [], []
+    for dims in ([group_cols] if len(group_cols) > 1 else []) + [[col] for col in group_cols] + [[]]:
+        if dims:
+            grouped = exposure.groupby(dims, dropna=False, observed=True, sort=True)
+            labels, uniques = grouped.ngroup().to_numpy(), grouped.size().index
+        else:
+            labels, uniques = np.zeros(len(exposure), dtype='int64'), [()]
+        for j, unique in enumerate(uniques):
+            unique = unique if isinstance(unique, tuple) else (unique,)
+            columns.append(labels == j)
+            groups.append({col: dict(zip(dims, unique)).get(col, TOTAL_LABEL) for col in group_cols})
+    weights = np.column_stack(columns) * exposure['pml'].to_numpy()[:, None]
+
+    spec = {
+        'cell': exposure['cell'].to_numpy(dtype='int64'),
+        'band': exposure['band'].to_numpy(dtype='int64'),
+        'n_cells': int(cell.max(initial=-1)) + 1,
+        'hit_prob': np.array([band_params[name][0] for name in bands]),
+        'damage': np.array([lognormal_params(band_params[name][1]) for name in bands]),
+        'weights': weights,
+    }
+    return spec, pd.DataFrame(groups, columns=group_cols)
+
+
+# Jumlah skenario per potongan agar array kerja satu potongan muat dalam budget memori
+def scenarios_per_chunk(spec, memory_mb=DEFAULT_MEMORY_MB):
+    exposures, groups = spec['weights'].shape
+    bytes_per_scenario = 8 * (spec['n_cells'] + 2 * exposures + 3 * groups)
+    return max(1, int(memory_mb * 2 ** 20 // bytes_per_scenario))
+
+
+# Satu potongan skenario → (aggregate, occurrence) berukuran (size x kelompok)
+def simulate_chunk(spec, seed, size, event_rate=DEFAULT_EVENT_RATE, max_events=DEFAULT_MAX_EVENTS):
+    rng = np.random.default_rng(seed)
+    cell, band, weights = spec['cell'], spec['band'], spec['weights']
+    threshold = spec['hit_prob'][band]
+    mu, sigma = spec['damage'][:, 0], spec['damage'][:, 1]
+
+    events = np.minimum(rng.poisson(event_rate, size), max_events)
+    aggregate = np.zeros((size, weights.shape[1]))
+    occurrence = np.zeros((size, weights.shape[1]))
+    for event in range(max_events):
+        active = np.flatnonzero(events > event)
+        if not len(active):
+            break
+        # Footprint: intensitas per sel; band berisiko lebih tinggi terkena lebih dulu di sel yang sama
+        intensity = rng.random((len(active), spec['n_cells']))
+        damage = np.exp(mu + sigma * rng.standard_normal((len(active), len(mu))))
+        factor = damage[:, band] * (intensity[:, cell] < threshold)
+        losses = factor @ weights
+        aggregate[active] += losses
+        occurrence[active] = np.maximum(occurrence[active], losses)
+    return aggregate, occurrence
+
+
+# Ukuran kerja satu skenario untuk memilih paralel atau tidak
+def simulation_width(spec):
+    exposures, groups = spec['weights'].shape
+    return spec['n_cells'] + exposures * groups
+
+
+def _simulate_task(task):
+    return simulate_chunk(*task)
+
+
+# Simulasi n_scenarios tahun untuk portofolio final (hasil run_pipeline / compute_pml)
+def run_scenarios(final, n_scenarios, seed=0, event_rate=DEFAULT_EVENT_RATE, max_events=DEFAULT_MAX_EVENTS,
+                  cell_degrees=DEFAULT_CELL_DEGREES, band_params=BAND_PARAMS, memory_mb=DEFAULT_MEMORY_MB,
+                  workers=None):
+    spec, groups = build_exposure(final, cell_degrees, band_params)
+    chunk = scenarios_per_chunk(spec, memory_mb)
+    sizes = [min(chunk, n_scenarios - start) for start in range(0, n_scenarios, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(spec, chunk_seed, size, event_rate, max_events) for chunk_seed, size in zip(seeds, sizes)]
+
+    workers = max(1, min(os.cpu_count() or 1, 8)) if workers is None else workers
+    results = None
+    if workers > 1 and len(tasks) > 1 and n_scenarios * simulation_width(spec) >= PARALLEL_MIN_WORK:
+        pool = pools.get_pool(workers)
+        try:
+            results = list(pool.map(_simulate_task, tasks))
+        except BrokenProcessPool:
+            # Worker mati (mis. kehabisan memori): buang pool lalu ulangi di proses ini
+            pools.discard_pool(workers, pool)
+    if results is None:
+        results = [simulate_chunk(*task) for task in tasks]
+
+    width = len(groups)
+    return ScenarioResult(
+        groups=groups,
+        aggregate=np.concatenate([result[0] for result in results]) if results else np.zeros((0, width)),
+        occurrence=np.concatenate([result[1] for result in results]) if results else np.zeros((0, width)),
+    )
@@ -0,0 +1,169 @@
+"""Pipeline bertahap dengan memo per tahap.
+
+Tahap: ingest → clean → classify → filter → rate → pml → aggregate / map_bins /
+accumulation / whatif → render.
+Setiap tahap diberi kunci dari kunci tahap sebelumnya dan parameternya sendiri,
+lalu hasilnya disimpan di memo. Rerun Streamlit dengan input yang sama hanya
+mengambil hasil dari memo, dan perubahan satu widget hanya menghitung ulang
+tahap yang bergantung padanya.
+
+Filter inforce dijalankan setelah klasifikasi: klasifikasi setiap baris tidak
+bergantung pada baris lain, sehingga mengganti Full Data / Inforce Only cukup
+menyaring hasil klasifikasi yang sudah ada di memo.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from . import accumulation, cube, engine, instrument, map_layers, rates, whatif
+from .hazard import content_hash
+
+DEFAULT_MEMO_ENTRIES = 32
+
+
+@dataclass
+class Stage:
+    key: str
+    value: object
+
+
+# Kunci tahap dari nama tahap, kunci tahap sebelumnya dan parameter
+def stage_key(name, *parts):
+    return hashlib.sha256(repr((name,) + parts).encode()).hexdigest()
+
+
+# Jumlah baris hasil tahap (frame pertama jika hasilnya tuple)
+def rows_of(value):
+    if isinstance(value, tuple):
+        value = value[0] if value else None
+    return len(value) if hasattr(value, "__len__") else None
+
+
+class StageMemo:
+    # Memo LRU di memori proses; nilai dipakai bersama oleh semua sesi
+    def __init__(self, max_entries=DEFAULT_MEMO_ENTRIES):
+        self.max_entries = max_entries
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._values:
+                self._values.move_to_end(key)
+                return self._values[key]
+
+        value = compute()
+        with self._lock:
+            self._values[key] = value
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_entries:
+                self._values.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class StagedPipeline:
+    def __init__(self, memo=None, cache=None, workers=None, profiler=None):
+        self.memo = memo or StageMemo()
+        self.cache = cache
+        self.workers = workers
+        self.profiler = profiler
+
+    # Pipeline dengan memo yang sama tetapi profiler sendiri (satu profiler per rerun / sesi)
+    def with_profiler(self, profiler):
+        return StagedPipeline(self.memo, self.cache, self.workers, profiler)
+
+    # Tahap yang diambil dari memo dicatat dengan cached=True
+    def _run(self, name, parts, compute, rows_in=None):
+        key = stage_key(name, *parts)
+        with instrument.measure(self.profiler, name, rows_in=rows_in, cached=True) as record:
+            def computed():
+                record.cached = False
+                return compute()
+            value = self.memo.get_or_compute(key, computed)
+            record.rows_out = rows_of(value)
+        return Stage(key, value)
+
+    # CSV portofolio → (df, ada kolom EXPIRY DATE)
+    def ingest(self, source):
+        def compute():
+            df = engine.read_portfolio(source)
+            return df, engine.parse_expiry(df)
+        return self._run("ingest", (content_hash(source),), compute)
+
+    # Koordinat bersih → (data valid, baris tidak valid)
+    def clean(self, ingested):
+        return self._run("clean", (ingested.key,), lambda: engine.clean_coordinates(ingested.value[0]),
+                         rows_in=len(ingested.value[0]))
+
+    # Gridcode dan Kategori Risiko untuk semua baris valid → (final, grid_col, issues)
+    def classify(self, cleaned, hazard_sources, grid_resolution=None, policy="max"):
+        hazard_keys = tuple(content_hash(source) for source in hazard_sources)
+
+        def compute():
+            return engine.classify(
+                cleaned.value[0], hazard_sources, cache=self.cache, grid_resolution=grid_resolution,
+                policy=policy, workers=self.workers, profiler=self.profiler, hazard_keys=hazard_keys,
+            )
+        return self._run("classify", (cleaned.key, hazard_keys, grid_resolution, policy), compute,
+                         rows_in=len(cleaned.value[0]))
+
+    # Filter inforce atas hasil klasifikasi → final
+    def filter(self, classified, inforce_only=False, cutoff=engine.INFORCE_CUTOFF):
+        final = classified.value[0]
+        if not inforce_only or engine.EXPIRY_COL not in final.columns:
+            return Stage(stage_key("filter", classified.key, False), final)
+        return self._run("filter", (classified.key, True, cutoff),
+                         lambda: engine.filter_inforce(final, cutoff).reset_index(drop=True), rows_in=len(final))
+
+    # Rate per coverage → (final, unmatched)
+    def rate(self, filtered, rate_table=None):
+        rate_table = rate_table or rates.default_rate_table()
+        return self._run("rate", (filtered.key, rate_table.fingerprint()),
+                         lambda: engine.apply_rates(filtered.value.copy(deep=False), rate_table),
+                         rows_in=len(filtered.value))
+
+    # PML → final
+    def pml(self, rated):
+        return self._run("pml", (rated.key,), lambda: engine.compute_pml(rated.value[0].copy(deep=False)),
+                         rows_in=len(rated.value[0]))
+
+    # Cube ringkasan (lihat banjir.cube)
+    def aggregate(self, computed):
+        return self._run("aggregate", (computed.key,), lambda: cube.build_cube(computed.value),
+                         rows_in=len(computed.value))
+
+    # PML total semua varian rate sekaligus, dari klasifikasi dan TSI hasil pml (lihat banjir.whatif)
+    def whatif(self, computed, variants, rate_table=None):
+        rate_table = rate_table or rates.default_rate_table()
+        return self._run("whatif", (computed.key, rate_table.fingerprint(), whatif.variants_fingerprint(variants)),
+                         lambda: whatif.run_whatif(computed.value, variants, rate_table),
+                         rows_in=len(computed.value))
+
+    # Sel peta agregat → (bins, ukuran sel)
+    def map_bins(self, computed, zoom):
+        return self._run("map_bins", (computed.key, zoom), lambda: map_layers.aggregate_bins(computed.value, zoom),
+                         rows_in=len(computed.value))
+
+    # Top-K lingkaran akumulasi TSI / PML (lihat banjir.accumulation)
+    def accumulation(self, computed, radius_m, top_k, by='tsi'):
+        return self._run("accumulation", (computed.key, radius_m, top_k, by),
+                         lambda: accumulation.top_circles(computed.value, radius_m, top_k, by),
+                         rows_in=len(computed.value))
+
+
+_default_pipeline = None
+_default_lock = threading.Lock()
+
+
+# Pipeline bersama untuk satu proses (semua sesi Streamlit memakai memo yang sama)
+def get_default_pipeline():
+    global _default_pipeline
+    with _default_lock:
+        if _default_pipeline is None:
+            _default_pipeline = StagedPipeline()
+        return _default_pipeline
@@ -0,0 +1,158 @@
+"""Penyimpanan portofolio kolumnar: dataset Parquet yang dipartisi per UY.
+
+CSV portofolio di-ingest sekali, per potongan sehingga memori tetap kecil,
+menjadi dataset Parquet bergaya hive (UY=2023/...). UY disimpan sebagai teks
+aslinya (nilai seperti "UY2023" tidak hilang), EXPIRY DATE sebagai timestamp,
+dan setiap potongan diurutkan per EXPIRY DATE agar statistik min/max row group
+sempit. Saat dibaca, tipe kolom ditentukan oleh isi seperti read_csv, sehingga
+hasil load sama dengan engine.read_portfolio untuk CSV yang sama.
+
+Saat dibaca, filter UY hanya membuka partisi yang cocok. Filter inforce
+(EXPIRY DATE > tanggal valuasi) di-push down lewat pyarrow.dataset, sehingga
+row group yang seluruhnya sudah expired tidak dibaca. Menjalankan ulang untuk
+tanggal valuasi atau subset UY lain tidak perlu mem-parse CSV lagi.
+"""
+import datetime
+import json
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from . import engine, instrument, streaming
+
+META_FILE = "_banjir_store.json"  # diawali '_' sehingga diabaikan oleh pyarrow.dataset
+ROW_GROUP_ROWS = 64_000
+
+
+def is_store(directory):
+    return os.path.isfile(os.path.join(directory, META_FILE))
+
+
+def read_meta(directory):
+    if not is_store(directory):
+        raise engine.PipelineError(f"{directory} bukan dataset portofolio (jalankan 'banjir ingest' dulu).")
+    with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Skema tetap untuk semua potongan: teks apa adanya (termasuk UY, kolom partisi), EXPIRY DATE timestamp
+def chunk_schema(columns):
+    return pa.schema([(col, pa.timestamp('ns') if col == engine.EXPIRY_COL else pa.string()) for col in columns])
+
+
+def uy_partitioning():
+    return ds.partitioning(pa.schema([(engine.UY_COL, pa.string())]), flavor="hive")
+
+
+# CSV portofolio → dataset Parquet di directory (menggantikan dataset lama di directory yang sama).
+# Mengembalikan jumlah baris yang ditulis
+def ingest(portfolio, directory, chunk_rows=streaming.DEFAULT_CHUNK_ROWS, profiler=None):
+    if os.path.exists(directory) and os.listdir(directory) and not is_store(directory):
+        raise engine.PipelineError(f"Folder {directory} tidak kosong dan bukan dataset portofolio.")
+
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".ingest-", dir=parent)
+    rows = 0
+    columns = None
+    try:
+        for index, chunk in enumerate(streaming.iter_portfolio_chunks(portfolio, chunk_rows)):
+            with instrument.measure(profiler, "ingest_chunk", rows_in=len(chunk), rows_out=len(chunk), chunk=index):
+                if columns is None:
+                    columns = list(chunk.columns)
+                    if engine.UY_COL not in columns:
+                        raise engine.PipelineError(f"Kolom `{engine.UY_COL}` tidak ditemukan, dataset "
+                                                   f"tidak bisa dipartisi.")
+                chunk[engine.UY_COL] = chunk[engine.UY_COL].str.strip()
+                if engine.parse_expiry(chunk):
+                    chunk = chunk.sort_values(engine.EXPIRY_COL, kind='stable')
+                # Tanpa metadata pandas: tipe saat dibaca ditentukan oleh isi, seperti read_csv
+                table = pa.Table.from_pandas(chunk, schema=chunk_schema(columns), preserve_index=False)
+                table = table.replace_schema_metadata(None)
+                ds.write_dataset(
+                    table, staging, format="parquet", partitioning=uy_partitioning(),
+                    basename_template=f"part-{index:05d}-{{i}}.parquet",
+                    existing_data_behavior="overwrite_or_ignore",
+                    max_rows_per_group=ROW_GROUP_ROWS, min_rows_per_group=min(ROW_GROUP_ROWS, len(table)),
+                )
+            rows += len(chunk)
+
+        meta = {
+            "source": os.path.basename(str(getattr(portfolio, "name", portfolio))),
+            "rows": rows,
+            "columns": columns or [],
+            "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        }
+        with open(os.path.join(staging, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        os.replace(staging, directory)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return rows
+
+
+# Ekspresi filter pyarrow: EXPIRY DATE > valuation_date (jika diberikan) dan UY di uy (jika diberikan)
+def row_filter(valuation_date=None, uy=None):
+    conditions = []
+    if valuation_date is not None:
+        cutoff = pa.scalar(pd.Timestamp(valuation_date), type=pa.timestamp('ns'))
+        conditions.append(ds.field(engine.EXPIRY_COL) > cutoff)
+    if uy:
+        conditions.append(ds.field(engine.UY_COL).isin([str(year).strip() for year in uy]))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def open_dataset(directory):
+    return ds.dataset(directory, format="parquet", partitioning=uy_partitioning())
+
+
+# Kolom dataset ke urutan kolom CSV asal (kolom partisi UY ada di akhir pada dataset)
+def restore_columns(df, columns):
+    return df[[col for col in columns if col in df.columns]]
+
+
+# Kolom teks yang seluruh nilainya angka → numerik, seperti inferensi tipe read_csv
+# (bilangan bulat → int64, atau float64 jika ada nilai kosong)
+def infer_numeric(df):
+    for col in df.columns:
+        series = df[col]
+        if col in engine.PARSED_COLS or not (pd.api.types.is_object_dtype(series)
+                                             or pd.api.types.is_string_dtype(series)):
+            continue
+        values = pd.to_numeric(series, errors='coerce')
+        if values.notna().sum() == series.notna().sum():
+            df[col] = values
+    return df
+
+
+# Portofolio untuk satu tanggal valuasi (inforce: EXPIRY DATE > valuation_date) dan subset UY.
+# valuation_date=None membaca semua polis. Hasil siap dipakai engine (lihat engine.compact_frame)
+def load(directory, valuation_date=None, uy=None):
+    meta = read_meta(directory)
+    if valuation_date is not None and engine.EXPIRY_COL not in meta["columns"]:
+        raise engine.PipelineError(f"Kolom `{engine.EXPIRY_COL}` tidak ditemukan, tidak bisa filter data inforce.")
+    table = open_dataset(directory).to_table(filter=row_filter(valuation_date, uy))
+    df = restore_columns(table.to_pandas(), meta["columns"]).reset_index(drop=True)
+    return engine.compact_frame(infer_numeric(df))
+
+
+# Potongan portofolio dengan filter yang sama seperti load, untuk mode streaming
+def iter_chunks(directory, valuation_date=None, uy=None, chunk_rows=streaming.DEFAULT_CHUNK_ROWS):
+    meta = read_meta(directory)
+    if valuation_date is not None and engine.EXPIRY_COL not in meta["columns"]:
+        raise engine.PipelineError(f"Kolom `{engine.EXPIRY_COL}` tidak ditemukan, tidak bisa filter data inforce.")
+    scanner = open_dataset(directory).scanner(filter=row_filter(valuation_date, uy), batch_size=chunk_rows)
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield restore_columns(batch.to_pandas(), meta["columns"])
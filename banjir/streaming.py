@@ -0,0 +1,197 @@
+"""Mode streaming untuk portofolio yang lebih besar dari memori.
+
+CSV dibaca per potongan (chunk). Setiap chunk melewati pembersihan koordinat,
+filter inforce, intersection, rate dan PML, lalu langsung ditulis ke file hasil.
+Ringkasan dihitung dari agregat parsial (jumlah polis, TSI, PML per UY x okupasi
+x risiko) yang dijumlahkan antar chunk, sehingga memori puncak ditentukan oleh
+ukuran chunk, bukan ukuran portofolio.
+"""
+import gzip
+import os
+import tempfile
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from . import cube, engine, hazard, hazard_cache, instrument, parsing
+
+DEFAULT_CHUNK_ROWS = 250_000
+
+
+@dataclass
+class StreamingResult:
+    rows_in: int = 0
+    rows_out: int = 0
+    invalid_count: int = 0
+    rejected: dict = field(default_factory=dict)  # alasan koordinat tidak valid → jumlah baris
+    grid_col: str = None
+    summaries: dict = field(default_factory=dict)
+    rate_unmatched: dict = field(default_factory=dict)
+    issues: list = field(default_factory=list)
+
+
+# Potongan portofolio; semua kolom (termasuk UY) dibaca sebagai teks agar tipe sama di setiap chunk
+def iter_portfolio_chunks(source, chunk_rows=DEFAULT_CHUNK_ROWS):
+    for chunk in pd.read_csv(source, chunksize=chunk_rows, dtype=str):
+        chunk.columns = chunk.columns.str.strip()
+        yield chunk
+
+
+# UY → Int64 agar tipe sama di setiap chunk. Mengembalikan jumlah baris dengan UY terisi yang bukan
+# tahun (mis. "UY2023"); UY baris tersebut menjadi kosong
+def coerce_uy(chunk):
+    if engine.UY_COL not in chunk.columns or pd.api.types.is_integer_dtype(chunk[engine.UY_COL]):
+        return 0
+    raw = chunk[engine.UY_COL]
+    values = pd.to_numeric(raw, errors='coerce')
+    values = values.where(values == np.trunc(values))
+    filled = raw.notna() & (raw.astype(str).str.strip() != '')
+    chunk[engine.UY_COL] = values.astype('Int64')
+    return int((filled & values.isna()).sum())
+
+
+def uy_warning(count):
+    return ("warning", f"{count:,} baris dengan `{engine.UY_COL}` bukan tahun (mis. 'UY2023') "
+                       f"dihitung tanpa UY.")
+
+
+# CSV (path / file) dibaca per chunk; selain itu portfolio dianggap sudah berupa iterable chunk
+# (mis. store.iter_chunks)
+def portfolio_chunks(portfolio, chunk_rows=DEFAULT_CHUNK_ROWS):
+    if isinstance(portfolio, (str, os.PathLike)) or hasattr(portfolio, "read"):
+        return iter_portfolio_chunks(portfolio, chunk_rows)
+    return portfolio
+
+
+# Samakan tipe kolom antar chunk sebelum ditulis (angka → float64, tanggal → datetime64, teks → string)
+def normalize_for_output(chunk):
+    chunk = chunk.copy(deep=False)
+    for col in chunk.columns:
+        series = chunk[col]
+        if col == engine.EXPIRY_COL:
+            chunk[col] = pd.to_datetime(series, errors='coerce')
+        elif col == engine.UY_COL:
+            continue
+        elif pd.api.types.is_bool_dtype(series):
+            continue
+        elif pd.api.types.is_numeric_dtype(series):
+            chunk[col] = series.astype('float64')
+        else:
+            chunk[col] = series.astype('string')
+    return chunk
+
+
+class ChunkWriter:
+    # Penulis hasil per chunk ke .parquet, .csv atau .csv.gz
+    def __init__(self, path):
+        self.path = path
+        self.ext = ".csv.gz" if path.lower().endswith(".csv.gz") else os.path.splitext(path)[1].lower()
+        if self.ext not in (".parquet", ".csv", ".csv.gz"):
+            raise engine.PipelineError(f"Format output streaming tidak dikenal: {path}")
+        self._parquet = None
+        self._schema = None
+        self._text = None
+
+    def write(self, chunk):
+        chunk = normalize_for_output(chunk)
+        if self.ext == ".parquet":
+            if self._parquet is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                self._schema = table.schema
+                self._parquet = pq.ParquetWriter(self.path, self._schema)
+            else:
+                table = pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False)
+            self._parquet.write_table(table)
+            return
+
+        header = self._text is None
+        if header:
+            opener = gzip.open if self.ext == ".csv.gz" else open
+            self._text = opener(self.path, "wt", newline="", encoding="utf-8")
+        chunk.to_csv(self._text, index=False, header=header)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._text is not None:
+            self._text.close()
+
+
+# Jalankan pipeline per chunk dan tulis hasil ke out (.parquet / .csv / .csv.gz)
+def run_streaming(portfolio, hazard_sources, out, chunk_rows=DEFAULT_CHUNK_ROWS, inforce_only=False,
+                  cutoff=engine.INFORCE_CUTOFF, cache=None, rate_table=None, grid_resolution=None,
+                  policy="max", workers=None, invalid_out=None, profiler=None, clip=None):
+    result = StreamingResult(rate_unmatched={})
+    issues = {}
+    aggregate = None
+    coerced_uy = 0
+
+    # Layer harus dibaca sekali saja untuk semua chunk, jadi selalu pakai cache
+    temp_dir = None
+    if cache is False:
+        temp_dir = tempfile.TemporaryDirectory()
+        cache = hazard_cache.HazardCache(temp_dir.name)
+    # ZIP di-hash sekali untuk semua chunk; tanpa ini setiap chunk membaca ulang seluruh ZIP
+    hazard_keys = hazard.source_keys(hazard_sources)
+
+    writer = ChunkWriter(out)
+    invalid_writer = ChunkWriter(invalid_out) if invalid_out else None
+    try:
+        for index, chunk in enumerate(portfolio_chunks(portfolio, chunk_rows)):
+            result.rows_in += len(chunk)
+            coerced_uy += coerce_uy(chunk)
+            if engine.parse_expiry(chunk):
+                if inforce_only:
+                    chunk = engine.filter_inforce(chunk, cutoff)
+            elif inforce_only:
+                issues[("warning", f"Kolom `{engine.EXPIRY_COL}` tidak ditemukan, "
+                                   f"tidak bisa filter data inforce.")] = None
+
+            with instrument.measure(profiler, "clean_coordinates", rows_in=len(chunk), chunk=index) as record:
+                chunk, invalid_rows = engine.clean_coordinates(chunk)
+                record.rows_out = len(chunk)
+            result.invalid_count += len(invalid_rows)
+            for reason, count in parsing.reject_counts(invalid_rows).items():
+                result.rejected[reason] = result.rejected.get(reason, 0) + count
+            if invalid_writer is not None and len(invalid_rows):
+                invalid_writer.write(invalid_rows)
+            if chunk.empty:
+                continue
+
+            with instrument.measure(profiler, "classify", rows_in=len(chunk), rows_out=len(chunk), chunk=index):
+                final, grid_col, chunk_issues = engine.classify(
+                    chunk, hazard_sources, cache=cache, grid_resolution=grid_resolution,
+                    policy=policy, workers=workers, profiler=profiler, prune=False, clip=clip,
+                    hazard_keys=hazard_keys,
+                )
+            issues.update(dict.fromkeys(chunk_issues))
+            result.grid_col = result.grid_col or grid_col
+
+            with instrument.measure(profiler, "rate_pml", rows_in=len(final), rows_out=len(final), chunk=index):
+                final, unmatched = engine.apply_rates(final, rate_table)
+                final = engine.compute_pml(final)
+            for reason, count in unmatched.items():
+                result.rate_unmatched[reason] = result.rate_unmatched.get(reason, 0) + count
+
+            with instrument.measure(profiler, "aggregate_write", rows_in=len(final), rows_out=len(final),
+                                    chunk=index):
+                partial = cube.build_cube(final)
+                aggregate = partial if aggregate is None else cube.merge_cubes([aggregate, partial])
+                writer.write(final)
+            result.rows_out += len(final)
+    finally:
+        writer.close()
+        if invalid_writer is not None:
+            invalid_writer.close()
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    if aggregate is not None:
+        result.summaries = cube.summaries_from_cube(aggregate)
+    if coerced_uy:
+        issues[uy_warning(coerced_uy)] = None
+    result.issues = list(issues)
+    return result
@@ -0,0 +1,137 @@
+"""Data sintetis untuk benchmark: portofolio CSV dan ZIP shapefile bahaya banjir.
+
+Portofolio memakai kolom yang sama dengan data produksi (Latitude, Longitude,
+EXPIRY DATE, Kategori Okupasi, Jumlah Lantai, TSI IDR, UY) termasuk koordinat
+kotor (koma desimal, tanda minus en dash, teks asing) dan TSI bertanda "Rp".
+Titik dikelompokkan di sekitar kota-kota besar; shapefile bahaya berisi
+MultiPolygon per gridcode di sekitar kota yang sama sehingga sebagian titik
+masuk ke zona banjir.
+"""
+import math
+import os
+import tempfile
+import zipfile
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from . import engine
+
+# (lon, lat, sebaran derajat) pusat portofolio
+CITIES = [
+    (106.82, -6.20, 0.25),   # Jakarta
+    (112.75, -7.25, 0.20),   # Surabaya
+    (107.61, -6.91, 0.15),   # Bandung
+    (110.42, -6.99, 0.15),   # Semarang
+    (98.67, 3.59, 0.15),     # Medan
+    (104.76, -2.98, 0.12),   # Palembang
+    (119.43, -5.14, 0.12),   # Makassar
+    (116.83, -1.24, 0.10),   # Balikpapan
+]
+OKUPASI = ['Residensial', 'Komersial', 'Industrial', 'Lainnya']
+OKUPASI_WEIGHTS = [0.55, 0.25, 0.15, 0.05]
+FLOORS = [0, 1, 2, 3, 4, np.nan]
+FLOOR_WEIGHTS = [0.05, 0.5, 0.25, 0.1, 0.05, 0.05]
+UY_RANGE = (2019, 2025)
+DIRTY_FRACTION = 0.05
+INVALID_FRACTION = 0.002
+DEFAULT_CHUNK_ROWS = 500_000
+
+
+def city_points(rng, n):
+    city = rng.integers(len(CITIES), size=n)
+    centers = np.array(CITIES)[city]
+    lon = centers[:, 0] + rng.normal(0, 1, n) * centers[:, 2]
+    lat = centers[:, 1] + rng.normal(0, 1, n) * centers[:, 2]
+    return lon, lat
+
+
+# Koordinat sebagai teks dengan variasi format kotor seperti pada data input
+def dirty_coordinates(rng, values):
+    text = pd.Series(np.round(values, 6)).astype(str)
+    n = len(text)
+    kind = rng.random(n)
+    dirty = kind < DIRTY_FRACTION
+    comma = dirty & (kind < DIRTY_FRACTION / 3)
+    dash = dirty & ~comma & (kind < DIRTY_FRACTION * 2 / 3)
+    padded = dirty & ~comma & ~dash
+    text[comma] = text[comma].str.replace(".", ",", regex=False)
+    text[dash] = text[dash].str.replace("-", "–", regex=False)
+    text[padded] = " " + text[padded] + "°"
+    text[rng.random(n) < INVALID_FRACTION] = "-"
+    return text
+
+
+# Satu potongan portofolio sintetis sebanyak n baris (seed: int atau np.random.SeedSequence)
+def portfolio_frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lon, lat = city_points(rng, n)
+    expiry = pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 4 * 365, n), unit="D")
+    tsi = rng.lognormal(np.log(8e8), 1.0, n).astype(np.int64)
+    tsi_text = pd.Series(tsi).astype(str)
+    formatted = rng.random(n) < 0.5
+    tsi_text[formatted] = "Rp " + pd.Series(tsi[formatted]).map("{:,}".format).str.replace(",", ".").to_numpy()
+
+    return pd.DataFrame({
+        engine.LAT_COL: dirty_coordinates(rng, lat),
+        engine.LON_COL: dirty_coordinates(rng, lon),
+        engine.EXPIRY_COL: expiry.strftime("%d/%m/%Y"),
+        engine.OKUPASI_COL: rng.choice(OKUPASI, n, p=OKUPASI_WEIGHTS),
+        engine.FLOOR_COL: rng.choice(FLOORS, n, p=FLOOR_WEIGHTS),
+        engine.TSI_COL: tsi_text,
+        engine.UY_COL: rng.integers(UY_RANGE[0], UY_RANGE[1] + 1, n),
+    })
+
+
+# Tulis portofolio sintetis ke CSV per potongan agar memori tetap kecil untuk jutaan baris.
+# Seed tiap potongan diturunkan dengan SeedSequence.spawn, sehingga potongan dari seed berbeda
+# (mis. seed=0 potongan ke-2 dan seed=1 potongan ke-1) tidak berisi data yang sama
+def write_portfolio(path, rows, seed=0, chunk_rows=DEFAULT_CHUNK_ROWS):
+    part_seeds = np.random.SeedSequence(seed).spawn(math.ceil(rows / chunk_rows))
+    for part, part_seed in enumerate(part_seeds):
+        n = min(chunk_rows, rows - part * chunk_rows)
+        portfolio_frame(n, seed=part_seed).to_csv(path, mode="a" if part else "w", header=part == 0, index=False)
+    return path
+
+
+# Layer bahaya sintetis: zona banjir konsentris (gridcode 1 terluar sampai 3 terdalam) di sekitar
+# setiap kota, digabung menjadi satu MultiPolygon per (kota, gridcode)
+def hazard_layer(zones_per_city=40, seed=0, quad_segs=16, crs=None):
+    rng = np.random.default_rng(seed)
+    records = []
+    for lon0, lat0, spread in CITIES:
+        lon = lon0 + rng.normal(0, 1, zones_per_city) * spread
+        lat = lat0 + rng.normal(0, 1, zones_per_city) * spread
+        radius = rng.uniform(0.01, 0.06, zones_per_city)
+        # Bentuk tidak beraturan: setiap zona adalah gabungan tiga lingkaran yang saling bergeser
+        offset = rng.normal(0, 0.5, (3, zones_per_city, 2)) * radius[:, None]
+        rings = {}
+        for code, scale in ((1, 1.0), (2, 0.6), (3, 0.3)):
+            rings[code] = np.concatenate([
+                shapely.buffer(shapely.points(lon + dx * scale, lat + dy * scale), radius * scale,
+                               quad_segs=quad_segs)
+                for dx, dy in offset.transpose(0, 2, 1)
+            ])
+        for code in (1, 2, 3):
+            zone = shapely.union_all(rings[code])
+            inner = shapely.union_all(rings[code + 1]) if code < 3 else None
+            if inner is not None:
+                zone = zone.difference(inner)
+            records.append({"gridcode": code, "geometry": shapely.MultiPolygon(
+                [g for g in getattr(zone, "geoms", [zone]) if g.geom_type == "Polygon"]
+            )})
+
+    layer = gpd.GeoDataFrame(records, geometry="geometry", crs="EPSG:4326")
+    return layer.to_crs(crs) if crs else layer
+
+
+# Simpan layer sebagai ZIP shapefile (.shp, .shx, .dbf, .prj, .cpg)
+def write_hazard_zip(path, layer, name="banjir_sintetis"):
+    with tempfile.TemporaryDirectory() as tmp:
+        layer.to_file(os.path.join(tmp, f"{name}.shp"))
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+            for file in os.listdir(tmp):
+                archive.write(os.path.join(tmp, file), file)
+    return path
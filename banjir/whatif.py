@@ -0,0 +1,263 @@
+"""Analisis what-if tabel rate: banyak varian rate dalam satu perhitungan.
+
+Varian adalah tensor rate (coverage x risiko x okupasi x lantai) turunan tabel
+rate dasar: rate diskalakan (seluruhnya atau sebagian coverage / risiko /
+okupasi), rate satu okupasi diganti rate okupasi lain, atau diambil dari tabel
+rate lain. Klasifikasi dan TSI hasil pipeline dipakai ulang tanpa spatial join.
+
+Hasil pipeline dipindai sekali (per chunk jika perlu) menjadi eksposur: TSI per
+coverage per (UY, Kategori Okupasi, Kategori Risiko, sel rate) yang digabung
+antar chunk seperti cube agregasi. PML semua varian lalu dihitung sebagai satu
+perkalian matriks (eksposur x sel rate) @ (sel rate x varian), sehingga ratusan
+varian hanya menambah kolom pada perkalian tersebut.
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from . import cube, engine, instrument, rates
+
+BASE_NAME = "Dasar"
+CELL_LEVEL = "sel_rate"
+SCALE_OPTIONS = [0.5, 0.75, 0.8, 0.9, 1.1, 1.2, 1.25, 1.5, 2.0]
+
+
+@dataclass
+class WhatIfResult:
+    cube: pd.DataFrame   # PML per (UY, Kategori Okupasi, Kategori Risiko), satu kolom per varian
+    names: list          # nama varian, BASE_NAME lebih dulu
+
+    # Total PML per kunci, varian berdampingan. relative=True: perubahan terhadap BASE_NAME (0.1 = +10%)
+    def table(self, keys=(engine.UY_COL, engine.RISK_COL), relative=False):
+        keys = [key for key in keys if key in self.cube.index.names]
+        table = cube.rollup(self.cube, keys, self.names) if keys else self.cube[self.names].sum().to_frame().T
+        if relative:
+            table = table.div(table[BASE_NAME].where(table[BASE_NAME] != 0), axis=0) - 1
+        return table
+
+    # Total PML portofolio per varian
+    def totals(self):
+        return self.cube[self.names].sum()
+
+
+# Mask (coverage x risiko x okupasi x lantai) untuk bagian tensor yang dipilih (None = semua)
+def selection(base, coverage=None, risk=None, okupasi=None):
+    mask = np.ones(base.tensor.shape, dtype=bool)
+    for axis, (value, levels, label) in enumerate((
+            (coverage, base.coverages, "Coverage"),
+            (risk, base.risk_levels, "Kategori Risiko"),
+            (okupasi, base.okupasi_levels, "Kategori Okupasi"))):
+        if value is None:
+            continue
+        values = [value] if isinstance(value, str) else list(value)
+        unknown = [item for item in values if item not in levels]
+        if unknown:
+            raise engine.PipelineError(f"{label} tidak ada di tabel rate: {', '.join(unknown)}")
+        shape = [1] * mask.ndim
+        shape[axis] = len(levels)
+        mask &= np.isin(levels, values).reshape(shape)
+    return mask
+
+
+# Rate dikali factor (sebagian tensor saja jika coverage / risk / okupasi diberikan)
+def scaled(base, factor, coverage=None, risk=None, okupasi=None, tensor=None):
+    tensor = base.tensor.copy() if tensor is None else tensor.copy()
+    mask = selection(base, coverage, risk, okupasi)
+    tensor[mask] *= factor
+    return tensor
+
+
+# Rate okupasi diganti rate okupasi source (dari tabel dasar) atau dari tabel rate lain
+def replaced(base, okupasi, source=None, table=None, tensor=None):
+    tensor = base.tensor.copy() if tensor is None else tensor.copy()
+    if okupasi not in base.okupasi_levels:
+        raise engine.PipelineError(f"Kategori Okupasi tidak ada di tabel rate: {okupasi}")
+    o = base.okupasi_levels.index(okupasi)
+    if table is None:
+        if source not in base.okupasi_levels:
+            raise engine.PipelineError(f"Kategori Okupasi tidak ada di tabel rate: {source}")
+        tensor[:, :, o, :] = base.tensor[:, :, base.okupasi_levels.index(source), :]
+        return tensor
+
+    table_tensor = aligned_tensor(base, table)
+    tensor[:, :, o, :] = table_tensor[:, :, o, :]
+    return tensor
+
+
+# Tensor tabel rate lain dengan urutan level tabel dasar (kombinasi yang tidak ada bernilai NaN)
+def aligned_tensor(base, table):
+    tensor = np.full(base.tensor.shape, np.nan)
+    for c, coverage in enumerate(base.coverages):
+        if coverage not in table.coverages:
+            continue
+        for r, risk in enumerate(base.risk_levels):
+            if risk not in table.risk_levels:
+                continue
+            for o, okupasi in enumerate(base.okupasi_levels):
+                if okupasi in table.okupasi_levels:
+                    tensor[c, r, o, :] = table.tensor[table.coverages.index(coverage),
+                                                      table.risk_levels.index(risk),
+                                                      table.okupasi_levels.index(okupasi), :]
+    return tensor
+
+
+def scope_label(value):
+    return value if isinstance(value, str) else "/".join(map(str, value))
+
+
+# Satu varian dari spesifikasi dict (mis. dari file JSON) → (nama, tensor):
+#   {"name": ..., "scale": 1.2, "coverage": ..., "risk": ..., "okupasi": ...}
+#   {"name": ..., "okupasi": "Industrial", "copy_from": "Komersial"}
+#   {"name": ..., "rate_table": "rate_baru.csv", "okupasi": "Industrial"}  (tanpa okupasi: seluruh tabel)
+# copy_from / rate_table diterapkan lebih dulu, lalu scale (dibatasi coverage / risk / okupasi jika ada)
+def variant_from_spec(base, spec, directory=None):
+    spec = dict(spec)
+    unknown = sorted(set(spec) - {"name", "scale", "coverage", "risk", "okupasi", "copy_from", "rate_table"})
+    if unknown:
+        raise engine.PipelineError(f"Field varian tidak dikenal: {', '.join(unknown)}")
+
+    tensor = base.tensor
+    parts = []
+    if spec.get("rate_table"):
+        path = spec["rate_table"]
+        if directory and not os.path.isabs(path):
+            path = os.path.join(directory, path)
+        try:
+            table = rates.RateTable.load(path)
+        except (OSError, ValueError) as e:
+            raise engine.PipelineError(f"Gagal membaca tabel rate varian {spec['rate_table']}: {e}")
+        if spec.get("okupasi"):
+            tensor = replaced(base, spec["okupasi"], table=table)
+            parts.append(f"{spec['okupasi']} dari {os.path.basename(path)}")
+        else:
+            tensor = aligned_tensor(base, table)
+            parts.append(os.path.basename(path))
+    elif spec.get("copy_from"):
+        if not spec.get("okupasi"):
+            raise engine.PipelineError("Varian dengan copy_from membutuhkan field okupasi.")
+        tensor = replaced(base, spec["okupasi"], source=spec["copy_from"])
+        parts.append(f"{spec['okupasi']} = {spec['copy_from']}")
+
+    # Bersama copy_from / rate_table, okupasi juga membatasi skala: hanya rate yang diganti yang dikali
+    if spec.get("scale") is not None:
+        tensor = scaled(base, float(spec["scale"]), spec.get("coverage"), spec.get("risk"), spec.get("okupasi"),
+                        tensor=tensor)
+        scope = [scope_label(spec[key]) for key in ("coverage", "risk", "okupasi") if spec.get(key)]
+        parts.append(f"x{float(spec['scale']):g}" + (f" ({', '.join(scope)})" if scope else ""))
+
+    if not parts:
+        raise engine.PipelineError("Varian harus berisi scale, copy_from atau rate_table.")
+    return spec.get("name") or " ".join(parts), tensor
+
+
+# File JSON berisi list spesifikasi varian (lihat variant_from_spec)
+def load_variants(base, path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            specs = json.load(f)
+    except (OSError, ValueError) as e:
+        raise engine.PipelineError(f"Gagal membaca file varian {path}: {e}")
+    if not isinstance(specs, list):
+        raise engine.PipelineError("File varian harus berisi list objek varian.")
+    directory = os.path.dirname(os.path.abspath(path))
+    return [variant_from_spec(base, spec, directory) for spec in specs]
+
+
+# Varian rate dikali setiap faktor
+def scale_variants(base, factors):
+    return [(f"x{factor:g}", scaled(base, factor)) for factor in factors]
+
+
+# Sidik jari varian untuk kunci memo
+def variants_fingerprint(variants):
+    digest = hashlib.sha256()
+    for name, tensor in variants:
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(tensor).tobytes())
+    return digest.hexdigest()
+
+
+# Hasil pipeline (setelah compute_pml) → TSI per coverage per (kunci cube, sel rate). Sel rate adalah
+# indeks datar (risiko, okupasi, lantai) di tensor rate; baris tanpa rate tidak punya PML dan dilewati
+def build_exposure(final, rate_table):
+    missing = [col for col in (engine.RISK_COL, engine.OKUPASI_COL, engine.FLOOR_COL) if col not in final.columns]
+    if missing:
+        raise engine.PipelineError(f"Kolom berikut tidak ditemukan dalam data: {', '.join(missing)}")
+
+    coverages = engine.coverage_columns(final.columns)
+    unknown = [cov for cov, *_ in coverages if cov not in rate_table.coverages]
+    if unknown:
+        raise engine.PipelineError(f"Coverage berikut tidak ada di tabel rate: {', '.join(unknown)}")
+    tsi_cols = [tsi_col for _, tsi_col, _, _ in coverages]
+    missing = [col for col in tsi_cols if col not in final.columns]
+    if missing:
+        raise engine.PipelineError(f"Kolom {' dan/atau '.join(missing)} tidak ditemukan dalam data.")
+
+    _, n_risk, n_okupasi, n_floor = rate_table.tensor.shape
+    risk = rates.encode(final[engine.RISK_COL], rate_table.risk_levels).astype('int64')
+    okupasi = rates.encode(final[engine.OKUPASI_COL], rate_table.okupasi_levels).astype('int64')
+    floors = pd.to_numeric(final[engine.FLOOR_COL], errors='coerce')
+    bucket = rates.floor_bucket(floors.mask(floors == 0, 1)).astype('int64')
+    cell = (risk * n_okupasi + okupasi) * n_floor + bucket
+    valid = (risk >= 0) & (okupasi >= 0) & (bucket >= 0)
+
+    keys = cube.cube_keys(final.columns)
+    frame = final.loc[valid, keys].copy()
+    frame[CELL_LEVEL] = cell[valid]
+    for cov, tsi_col, _, _ in coverages:
+        frame[cov] = np.nan_to_num(engine.clean_tsi_column(final[tsi_col]).to_numpy(dtype='float64')[valid])
+    return frame.groupby(keys + [CELL_LEVEL], dropna=False, observed=True)[[cov for cov, *_ in coverages]].sum()
+
+
+# PML per kunci cube untuk semua varian: (eksposur x coverage·sel) @ (coverage·sel x varian)
+def variant_pml(exposure, rate_table, variants):
+    names = [name for name, _ in variants]
+    cells = rate_table.tensor[0].size
+    coverage_index = [rate_table.coverages.index(cov) for cov in exposure.columns]
+
+    cell = exposure.index.get_level_values(CELL_LEVEL).to_numpy(dtype='int64')
+    tsi = exposure.to_numpy(dtype='float64')
+    matrix = np.zeros((len(exposure), len(coverage_index) * cells))
+    rows = np.arange(len(exposure))
+    for j in range(len(coverage_index)):
+        matrix[rows, j * cells + cell] = tsi[:, j]
+
+    # Kombinasi yang tidak ada di tabel rate bernilai NaN: baris tersebut tidak punya PML
+    stacked = np.stack([tensor for _, tensor in variants])
+    weights = np.nan_to_num(stacked[:, coverage_index].reshape(len(variants), -1).T)
+    pml = pd.DataFrame(matrix @ weights, index=exposure.index, columns=names)
+    keys = [name for name in exposure.index.names if name != CELL_LEVEL]
+    return pml.groupby(level=keys, dropna=False, observed=True).sum()
+
+
+# What-if untuk hasil pipeline (DataFrame atau iterable chunk, mis. file hasil dibaca per potongan).
+# Varian dasar (tabel rate apa adanya) selalu disertakan sebagai BASE_NAME
+def run_whatif(final, variants, rate_table=None, profiler=None):
+    rate_table = rate_table or rates.default_rate_table()
+    variants = [(BASE_NAME, rate_table.tensor)] + list(variants)
+    names = [name for name, _ in variants]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise engine.PipelineError(f"Nama varian harus unik: {', '.join(duplicates)}")
+    shapes = {tensor.shape for _, tensor in variants}
+    if len(shapes) > 1:
+        raise engine.PipelineError("Semua varian harus memakai level tabel rate dasar.")
+
+    chunks = [final] if isinstance(final, pd.DataFrame) else final
+    exposures = []
+    for index, chunk in enumerate(chunks):
+        with instrument.measure(profiler, "whatif_exposure", rows_in=len(chunk), chunk=index) as record:
+            exposures.append(build_exposure(chunk, rate_table))
+            record.rows_out = len(exposures[-1])
+    if not exposures:
+        raise engine.PipelineError("Data hasil kosong.")
+
+    exposure = cube.merge_cubes(exposures) if len(exposures) > 1 else exposures[0]
+    with instrument.measure(profiler, "whatif_pml", rows_in=len(exposure), variants=len(variants)) as record:
+        pml = variant_pml(exposure, rate_table, variants)
+        record.rows_out = len(pml)
+    return WhatIfResult(cube=pml, names=names)
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from banjir import synthetic
+
+
+# Dua layer bahaya sintetis: EPSG:4326 dan UTM (titik harus diproyeksikan); zona keduanya tumpang tindih
+@pytest.fixture(scope="session")
+def hazard_zips(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("hazard")
+    return [
+        synthetic.write_hazard_zip(str(directory / "banjir_a.zip"), synthetic.hazard_layer(zones_per_city=4, seed=1)),
+        synthetic.write_hazard_zip(str(directory / "banjir_b.zip"),
+                                   synthetic.hazard_layer(zones_per_city=4, seed=2, crs="EPSG:32748")),
+    ]
+
+
+@pytest.fixture(scope="session")
+def points():
+    return synthetic.city_points(np.random.default_rng(0), 3000)
+
+
+# Portofolio CSV sintetis kecil (koordinat kotor, TSI bertanda "Rp", beberapa baris tidak valid)
+@pytest.fixture(scope="session")
+def portfolio_csv(tmp_path_factory):
+    path = tmp_path_factory.mktemp("portfolio") / "portfolio.csv"
+    return synthetic.write_portfolio(str(path), 3000, seed=0)
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from banjir import accumulation, engine
+
+
+# Polis acak: satu klaster padat, sebaran tipis di sekitarnya, dan beberapa polis di koordinat yang sama
+def portfolio(seed, n=600):
+    rng = np.random.default_rng(seed)
+    lon = np.concatenate([rng.normal(106.82, 0.01, n // 2), rng.uniform(106.7, 107.0, n - n // 2)])
+    lat = np.concatenate([rng.normal(-6.2, 0.01, n // 2), rng.uniform(-6.4, -6.1, n - n // 2)])
+    lon[-20:], lat[-20:] = lon[:20], lat[:20]
+    return pd.DataFrame({
+        engine.LON_COL: lon,
+        engine.LAT_COL: lat,
+        engine.TSI_COL: rng.lognormal(np.log(1e9), 1.0, n),
+        engine.PML_COL: rng.lognormal(np.log(1e8), 1.0, n),
+    })
+
+
+MEASURE_COLS = {'tsi': 'Total TSI', 'pml': 'Total PML'}
+
+
+# Referensi O(n²): total setiap lingkaran dari jarak semua pasangan lokasi. Beberapa pusat bisa punya
+# total yang sama persis (menjangkau polis yang sama), sehingga hasil dicek sebagai greedy yang sah: setiap
+# peringkat adalah total terbesar di antara pusat yang berjarak minimal 2x radius dari pusat sebelumnya
+def assert_greedy_top_circles(final, result, radius_m, top_k, by):
+    loc = accumulation.locations(final)
+    x, y = accumulation.web_mercator(loc['lon'].to_numpy(), loc['lat'].to_numpy())
+    scale = np.cos(np.radians(loc['lat'].to_numpy()))
+    distance = np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :]) * scale[:, None]
+    totals = (distance <= radius_m) @ loc[['count', 'tsi', 'pml']].to_numpy()
+    values = totals[:, ['tsi', 'pml'].index(by) + 1]
+
+    assert result['Peringkat'].tolist() == list(range(1, len(result) + 1))
+    assert (result['Radius (m)'] == radius_m).all()
+    eligible = np.ones(len(loc), dtype=bool)
+    for row in result.itertuples(index=False):
+        center = np.flatnonzero((loc['lon'] == row[1]) & (loc['lat'] == row[2]))[0]
+        assert eligible[center]
+        assert values[center] == pytest.approx(values[eligible].max(), rel=1e-12)
+        np.testing.assert_allclose(row[4:], totals[center], rtol=1e-9)
+        eligible &= distance[:, center] >= 2 * radius_m
+    if len(result) < top_k:
+        assert not eligible.any()
+    return values
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("radius_m, top_k", [(200, 5), (1000, 10), (2000, 30)])
+@pytest.mark.parametrize("by", ["tsi", "pml"])
+def test_top_circles_match_brute_force(seed, radius_m, top_k, by):
+    final = portfolio(seed)
+    # pair_budget kecil memaksa beberapa batch dan penghentian dini berdasarkan batas atas
+    for pair_budget in (accumulation.PAIR_BUDGET, 500):
+        result = accumulation.top_circles(final, radius_m, top_k, by, pair_budget=pair_budget)
+        assert len(result) == top_k
+        values = assert_greedy_top_circles(final, result, radius_m, top_k, by)
+        assert result[MEASURE_COLS[by]].iat[0] == pytest.approx(values.max())
+
+    # Lingkaran hasil tidak tumpang tindih: setiap polis hanya dihitung di satu lingkaran
+    x, y = accumulation.web_mercator(result[engine.LON_COL].to_numpy(), result[engine.LAT_COL].to_numpy())
+    scale = np.cos(np.radians(result[engine.LAT_COL].to_numpy()))
+    distance = np.hypot(x[:, None] - x[None, :], y[:, None] - y[None, :]) * scale[:, None]
+    np.fill_diagonal(distance, np.inf)
+    assert (distance >= 2 * radius_m).all()
+    assert result['Jumlah Polis'].sum() <= len(final)
+
+
+# Polis sedikit dan radius besar: lingkaran yang tidak tumpang tindih habis sebelum top_k
+def test_top_circles_fewer_than_top_k():
+    final = portfolio(3, n=40)
+    result = accumulation.top_circles(final, 2000, 100)
+    assert 0 < len(result) < 100
+    assert_greedy_top_circles(final, result, 2000, 100, 'tsi')
+
+
+def test_top_circles_empty_and_invalid():
+    final = pd.DataFrame({engine.LON_COL: [np.nan, 200.0], engine.LAT_COL: [np.nan, 0.0], engine.TSI_COL: [1.0, 2.0]})
+    result = accumulation.top_circles(final)
+    assert result.empty and 'Total PML' in result.columns
+    with pytest.raises(engine.PipelineError, match="luas"):
+        accumulation.top_circles(portfolio(0), by="luas")
@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from banjir import cube, engine
+
+
+@pytest.fixture(scope="module")
+def final(hazard_zips, portfolio_csv):
+    return engine.run_pipeline(portfolio_csv, hazard_zips, cache=False).final
+
+
+def aggregate(frame, keys, count_col):
+    return frame.groupby(keys).agg(
+        count=(count_col, 'count'),
+        tsi=(engine.TSI_COL, 'sum'),
+        pml=(engine.PML_COL, 'sum'),
+    )
+
+
+# Tabel ringkasan seperti groupby / pivot_table di halaman Streamlit sebelum cube
+# (kolom kunci waktu itu masih bertipe nilai biasa, bukan category)
+def legacy_summaries(final):
+    final = final.copy()
+    for col in final.columns:
+        if isinstance(final[col].dtype, pd.CategoricalDtype):
+            final[col] = final[col].astype(final[col].cat.categories.dtype)
+
+    summaries = {}
+    summaries['distribusi_risiko'] = \
+        final[engine.RISK_COL].value_counts().rename_axis('Kategori').reset_index(name='Jumlah')
+    for name, key in (('uy', engine.UY_COL), ('okupasi', engine.OKUPASI_COL), ('risiko', engine.RISK_COL)):
+        table = aggregate(final, key, key).reset_index()
+        table.columns = [key, 'Jumlah Polis', 'Total TSI', 'Total PML']
+        summaries[name] = table
+
+    summary = aggregate(final, [engine.UY_COL, engine.RISK_COL], engine.RISK_COL).reset_index().rename(
+        columns={'count': 'Jumlah Polis', 'tsi': 'Total TSI', 'pml': 'PML'}
+    )
+    pivoted = summary.pivot(index=engine.UY_COL, columns=engine.RISK_COL).fillna(0)
+    pivoted.columns = [' '.join(col).strip() for col in pivoted.columns.values]
+    summaries['uy_risiko'] = pivoted
+
+    columns = [engine.OKUPASI_COL, engine.RISK_COL]
+    summaries['count_polis'] = final.pivot_table(index=engine.UY_COL, columns=columns, aggfunc='size') \
+        .fillna(0).astype(int)
+    summaries['sum_tsi'] = final.pivot_table(index=engine.UY_COL, columns=columns, values=engine.TSI_COL,
+                                             aggfunc='sum').fillna(0).astype(int)
+    summaries['pml'] = final.pivot_table(index=engine.UY_COL, columns=columns, values=engine.PML_COL,
+                                         aggfunc='sum').fillna(0).astype(int)
+    return summaries
+
+
+def assert_summaries_equal(result, expected):
+    assert sorted(result) == sorted(expected)
+    for name, table in expected.items():
+        pd.testing.assert_frame_equal(result[name], table, check_dtype=False, check_index_type=False,
+                                      check_column_type=False, check_names=False)
+
+
+def test_summaries_match_groupby(final):
+    assert_summaries_equal(cube.summaries_from_cube(cube.build_cube(final)), legacy_summaries(final))
+
+
+# Cube per chunk yang digabung sama dengan cube seluruh portofolio, berapa pun pembagiannya
+@pytest.mark.parametrize("parts", [1, 2, 7])
+def test_merged_chunk_cubes_match_single_cube(final, parts):
+    expected = cube.build_cube(final)
+    chunks = np.array_split(np.arange(len(final)), parts)
+    merged = cube.merge_cubes([cube.build_cube(final.iloc[idx]) for idx in chunks])
+    pd.testing.assert_frame_equal(merged.sort_index(), expected.sort_index(), check_dtype=False)
+    assert_summaries_equal(cube.summaries_from_cube(merged), cube.summaries_from_cube(expected))
+
+
+# Kolom opsional yang tidak ada (mis. tanpa UY) hanya menghilangkan tabel yang membutuhkannya
+def test_cube_without_uy(final):
+    summaries = cube.summaries_from_cube(cube.build_cube(final.drop(columns=engine.UY_COL)))
+    assert sorted(summaries) == ['distribusi_risiko', 'okupasi', 'risiko']
+    expected = legacy_summaries(final)
+    for name in summaries:
+        pd.testing.assert_frame_equal(summaries[name], expected[name], check_dtype=False)
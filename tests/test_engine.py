@@ -0,0 +1,67 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from banjir import engine, synthetic
+
+# Portofolio kecil yang hasilnya bisa dihitung dengan tangan: koordinat desimal, koma dan DMS, TSI bertanda
+# "Rp", 0 lantai (dihitung 1 lantai), satu koordinat rusak dan satu polis yang sudah expired
+PORTFOLIO = """\
+No Polis,Latitude,Longitude,Kategori Okupasi,Jumlah Lantai,TSI IDR,UY,EXPIRY DATE
+P1,-6.15,106.75,Residensial,1,Rp 1.000.000,2023,31/12/2025
+P2,"-6,25",106.85,Komersial,3,2000000,2024,30/06/2026
+P3,-6.5,107.5,Industrial,2,"Rp 3.000.000",2024,01/01/2026
+P4,abc,106.8,Residensial,1,500000,2023,31/12/2025
+P5,6°9'0\"S,106°45'0\"E,Komersial,0,4000000,2023,30/06/2024
+"""
+
+
+@pytest.fixture(scope="module")
+def inputs(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("e2e")
+    portfolio = directory / "portfolio.csv"
+    portfolio.write_text(PORTFOLIO)
+    # Dua zona yang tumpang tindih: gridcode terbesar berlaku di daerah irisan
+    layer = gpd.GeoDataFrame({"gridcode": [1, 3]}, geometry=[
+        shapely.box(106.7, -6.3, 106.9, -6.1),
+        shapely.box(106.8, -6.3, 106.9, -6.2),
+    ], crs="EPSG:4326")
+    return str(portfolio), [synthetic.write_hazard_zip(str(directory / "banjir.zip"), layer)]
+
+
+@pytest.mark.parametrize("grid_resolution", [None, 0.01])
+def test_run_pipeline(inputs, grid_resolution):
+    portfolio, hazard_sources = inputs
+    result = engine.run_pipeline(portfolio, hazard_sources, cache=False, grid_resolution=grid_resolution)
+    assert result.issues == []
+    assert result.invalid_rows["No Polis"].tolist() == ["P4"]
+
+    final = result.final
+    assert final["No Polis"].tolist() == ["P1", "P2", "P3", "P5"]
+    np.testing.assert_allclose(final[engine.LAT_COL], [-6.15, -6.25, -6.5, -6.15])
+    np.testing.assert_array_equal(final["gridcode"], [1, 3, np.nan, 1])
+    assert final[engine.RISK_COL].tolist() == ["Rendah", "Tinggi", "No Risk", "Rendah"]
+    np.testing.assert_allclose(final[engine.RATE_COL], [0.15, 0.40, 0.0, 0.20])
+    np.testing.assert_allclose(final[engine.TSI_COL], [1e6, 2e6, 3e6, 4e6])
+    np.testing.assert_allclose(final[engine.PML_COL], [150_000, 800_000, 0, 800_000])
+    assert result.rate_unmatched == {key: 0 for key in result.rate_unmatched}
+
+    risiko = result.summaries["risiko"].set_index(engine.RISK_COL)
+    assert risiko["Jumlah Polis"].to_dict() == {"No Risk": 1, "Rendah": 2, "Tinggi": 1}
+    assert risiko["Total PML"].to_dict() == {"No Risk": 0, "Rendah": 950_000, "Tinggi": 800_000}
+    assert result.summaries["uy"]["Total TSI"].tolist() == [5e6, 5e6]
+
+
+def test_run_pipeline_inforce_only(inputs):
+    portfolio, hazard_sources = inputs
+    result = engine.run_pipeline(portfolio, hazard_sources, inforce_only=True, cache=False)
+    assert result.final["No Polis"].tolist() == ["P1", "P2", "P3"]
+    assert result.final[engine.PML_COL].sum() == 950_000
+
+
+def test_run_pipeline_without_coordinates(tmp_path, inputs):
+    portfolio = tmp_path / "portfolio.csv"
+    portfolio.write_text("No Polis,TSI IDR\nP1,1000\n")
+    with pytest.raises(engine.PipelineError, match="Latitude"):
+        engine.run_pipeline(str(portfolio), inputs[1], cache=False)
@@ -0,0 +1,98 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from banjir import engine, export
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        "Kategori Risiko": pd.Categorical(["Tinggi", "Rendah", None]),
+        "TSI IDR": [1.5e9, 2e8, np.nan],
+        "EXPIRY DATE": pd.to_datetime(["2025-01-31", None, "2026-06-30"]),
+    })
+
+
+# Hitung berapa kali file benar-benar ditulis
+@pytest.fixture
+def writes(monkeypatch):
+    calls = []
+    write_export = export.write_export
+    monkeypatch.setattr(export, "write_export", lambda df, path, fmt: calls.append(fmt) or write_export(df, path, fmt))
+    return calls
+
+
+def read_back(path, fmt):
+    if fmt == "xlsx":
+        return pd.read_excel(path)
+    if fmt == "parquet":
+        return pd.read_parquet(path)
+    return pd.read_csv(path, parse_dates=["EXPIRY DATE"])
+
+
+# File dibuat hanya jika diminta; kunci dan format yang sama memakai file yang sudah ada
+@pytest.mark.parametrize("fmt", list(export.EXPORT_FORMATS))
+def test_build_is_lazy_and_reused(tmp_path, frame, writes, fmt):
+    exports = export.ExportCache(str(tmp_path / "exports"))
+    assert exports.status("hasil", fmt) == ("missing", None)
+    assert not os.path.exists(exports.directory)
+
+    path = exports.build(frame, "hasil", fmt)
+    assert path.endswith(export.EXPORT_FORMATS[fmt][0])
+    assert exports.status("hasil", fmt) == ("ready", path)
+    assert exports.build(frame, "hasil", fmt) == path
+    assert writes == [fmt]
+    assert os.listdir(exports.directory) == [os.path.basename(path)]
+
+    written = read_back(path, fmt)
+    assert written["Kategori Risiko"].tolist()[:2] == ["Tinggi", "Rendah"]
+    np.testing.assert_allclose(written["TSI IDR"], frame["TSI IDR"])
+    assert written["EXPIRY DATE"].isna().tolist() == [False, True, False]
+
+
+def test_submit_shares_future(tmp_path, frame, writes):
+    exports = export.ExportCache(str(tmp_path))
+    future = exports.submit(frame, "hasil", "parquet")
+    assert exports.submit(frame, "hasil", "parquet") is future
+    path = future.result()
+    assert exports.status("hasil", "parquet") == ("ready", path)
+    assert writes == ["parquet"]
+
+
+def test_failed_build(tmp_path, frame, monkeypatch):
+    monkeypatch.setattr(export, "XLSX_MAX_ROWS", 2)
+    exports = export.ExportCache(str(tmp_path))
+    with pytest.raises(engine.PipelineError, match="batas Excel"):
+        exports.submit(frame, "hasil", "xlsx").result()
+    state, message = exports.status("hasil", "xlsx")
+    assert state == "failed" and "batas Excel" in message
+    assert os.listdir(tmp_path) == []  # file sementara dihapus
+
+
+# Hanya max_files file yang paling baru dipakai yang disimpan; file yang dikeluarkan kembali "missing"
+# dan bisa dibuat ulang
+def test_lru_eviction(tmp_path, frame, writes):
+    exports = export.ExportCache(str(tmp_path), max_files=2)
+    first = exports.submit(frame, "a", "parquet").result()
+    time.sleep(0.01)
+    exports.build(frame, "b", "parquet")
+    time.sleep(0.01)
+    assert exports.status("a", "parquet") == ("ready", first)  # "a" baru dipakai, "b" yang paling lama
+    time.sleep(0.01)
+    exports.build(frame, "c", "csv.gz")
+
+    assert sorted(os.listdir(tmp_path)) == ["a.parquet", "c.csv.gz"]
+    assert exports.status("b", "parquet") == ("missing", None)
+
+    time.sleep(0.01)
+    exports.build(frame, "b", "parquet")
+    assert sorted(os.listdir(tmp_path)) == ["b.parquet", "c.csv.gz"]
+    # Future "a" yang sudah selesai tetapi file-nya dikeluarkan dianggap belum dibuat, lalu dibangun ulang
+    assert exports.status("a", "parquet") == ("missing", None)
+    assert exports.submit(frame, "a", "parquet").result() == first
+    assert os.path.exists(first)
+    assert writes == ["parquet", "parquet", "csv.gz", "parquet", "parquet"]
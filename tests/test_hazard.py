@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+from banjir import hazard, hazard_cache, pools
+
+
+def classify(points, hazard_zips, cache_dir, **kwargs):
+    lon, lat = points
+    cache = hazard_cache.HazardCache(str(cache_dir), point_cache=False)
+    gridcodes, grid_col, issues = hazard.classify_coordinates(lon, lat, hazard_zips, cache=cache, policy="columns",
+                                                              **kwargs)
+    assert issues == []
+    return gridcodes
+
+
+# Pool worker harus memberi hasil yang sama dengan proses ini, dan dipakai ulang antar panggilan
+@pytest.mark.parametrize("grid_resolution", [None, 0.01])
+def test_workers_give_same_result(tmp_path, monkeypatch, hazard_zips, points, grid_resolution):
+    monkeypatch.setattr(hazard, "PARALLEL_MIN_ROWS", 0)
+    serial = classify(points, hazard_zips, tmp_path / "serial", workers=1, chunk_size=500,
+                      grid_resolution=grid_resolution)
+    parallel = classify(points, hazard_zips, tmp_path / "parallel", workers=2, chunk_size=500,
+                        grid_resolution=grid_resolution)
+    pool = pools.get_pool(2)
+    again = classify(points, hazard_zips, tmp_path / "parallel", workers=2, chunk_size=700,
+                     grid_resolution=grid_resolution)
+
+    assert pools.get_pool(2) is pool
+    assert list(serial) == list(parallel) == list(again)
+    for col in serial:
+        np.testing.assert_array_equal(serial[col], parallel[col])
+        np.testing.assert_array_equal(serial[col], again[col])
+    assert np.isfinite(serial["gridcode"]).any()
+
+
+def test_small_portfolio_stays_in_process(tmp_path, monkeypatch, hazard_zips, points):
+    def no_pool(workers):
+        raise AssertionError("pool tidak boleh dipakai untuk portofolio kecil")
+
+    monkeypatch.setattr(pools, "get_pool", no_pool)
+    classify(points, hazard_zips, tmp_path, workers=4, chunk_size=500)
+
+
+# Titik 1 masuk dua poligon layer A (gridcode 2 dan 3); titik 1-3 juga masuk layer B; titik 4 tidak masuk apa pun
+LAYER_A = (np.array([0, 1, 1, 2]), np.array([1.0, 2.0, 3.0, 1.0]))
+LAYER_B = (np.array([3, 2, 1]), np.array([2.0, 3.0, 1.0]))
+
+
+@pytest.mark.parametrize("policy, layers, expected", [
+    ("max", [LAYER_A, LAYER_B], [1, 3, 3, 2, np.nan]),
+    ("max", [LAYER_B, LAYER_A], [1, 3, 3, 2, np.nan]),
+    ("priority", [LAYER_A, LAYER_B], [1, 3, 1, 2, np.nan]),
+    ("priority", [LAYER_B, LAYER_A], [1, 1, 3, 2, np.nan]),
+    ("columns", [LAYER_A, LAYER_B], [1, 3, 3, 2, np.nan]),
+])
+def test_resolve_gridcodes(policy, layers, expected):
+    resolved, per_layer = hazard.resolve_gridcodes(layers, 5, policy)
+    np.testing.assert_array_equal(resolved, expected)
+    # Poligon tumpang tindih dalam satu layer: gridcode terbesar, apa pun urutan hit-nya
+    by_layer = {id(LAYER_A): [1, 3, 1, np.nan, np.nan], id(LAYER_B): [np.nan, 1, 3, 2, np.nan]}
+    for layer, layer_codes in zip(layers, per_layer):
+        np.testing.assert_array_equal(layer_codes, by_layer[id(layer)])
+
+
+# max tidak bergantung pada urutan layer maupun urutan hit di dalam layer
+def test_max_is_order_independent():
+    rng = np.random.default_rng(0)
+    layers = [(rng.integers(0, 50, 200), rng.integers(0, 4, 200).astype("float64")) for _ in range(3)]
+    expected, _ = hazard.resolve_gridcodes(layers, 60, "max")
+    for _ in range(5):
+        shuffled = []
+        for row_id, codes in (layers[i] for i in rng.permutation(3)):
+            order = rng.permutation(len(row_id))
+            shuffled.append((row_id[order], codes[order]))
+        np.testing.assert_array_equal(hazard.resolve_gridcodes(shuffled, 60, "max")[0], expected)
+    assert np.isnan(expected[50:]).all()
+
+
+def test_unknown_policy():
+    with pytest.raises(ValueError):
+        hazard.resolve_gridcodes([LAYER_A], 5, "min")
+
+
+# Kolom per layer dinamai dari nama ZIP (dibuat unik); priority mengikuti urutan upload
+def test_layer_policies_on_shapefiles(hazard_zips, points):
+    lon, lat = points
+    gridcodes, grid_col, issues = hazard.classify_coordinates(lon, lat, hazard_zips + hazard_zips[:1],
+                                                              policy="columns")
+    assert issues == []
+    assert list(gridcodes) == ["gridcode", "gridcode_banjir_a", "gridcode_banjir_b", "gridcode_banjir_a_2"]
+    a, b = gridcodes["gridcode_banjir_a"], gridcodes["gridcode_banjir_b"]
+    np.testing.assert_array_equal(gridcodes["gridcode_banjir_a_2"], a)
+    np.testing.assert_array_equal(gridcodes[grid_col], np.fmax(a, b))
+    overlap = ~np.isnan(a) & ~np.isnan(b) & (a != b)
+    assert overlap.any()
+
+    for order in (hazard_zips, hazard_zips[::-1]):
+        resolved, _, _ = hazard.classify_coordinates(lon, lat, order, policy="max")
+        np.testing.assert_array_equal(resolved[grid_col], np.fmax(a, b))
+    first, _, _ = hazard.classify_coordinates(lon, lat, hazard_zips, policy="priority")
+    np.testing.assert_array_equal(first[grid_col], np.where(np.isnan(a), b, a))
+    first, _, _ = hazard.classify_coordinates(lon, lat, hazard_zips[::-1], policy="priority")
+    np.testing.assert_array_equal(first[grid_col], np.where(np.isnan(b), a, b))
@@ -0,0 +1,188 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from banjir import hazard, hazard_cache, instrument, synthetic
+
+
+def test_lookup_and_store_points(tmp_path):
+    cache = hazard_cache.HazardCache(str(tmp_path))
+    keys = np.array([5, 10, 15, 20, 30, 40])
+    codes, found = cache.lookup_points("layer", keys)
+    assert not found.any() and np.isnan(codes).all()
+
+    # Kunci tidak harus terurut; NaN berarti titik sudah diuji tetapi tidak masuk poligon mana pun
+    cache.store_points("layer", np.array([30, 10, 20]), np.array([1.0, np.nan, 3.0]))
+    codes, found = cache.lookup_points("layer", keys)
+    np.testing.assert_array_equal(found, [False, True, False, True, True, False])
+    np.testing.assert_array_equal(codes, [np.nan, np.nan, np.nan, 3.0, 1.0, np.nan])
+
+    # Hasil baru menggantikan gridcode yang tersimpan untuk kunci yang sama
+    cache.store_points("layer", np.array([20, 15]), np.array([2.0, np.nan]))
+    for reader in (cache, hazard_cache.HazardCache(str(tmp_path))):  # di memori dan dari file Parquet
+        codes, found = reader.lookup_points("layer", keys)
+        np.testing.assert_array_equal(found, [False, True, True, True, True, False])
+        np.testing.assert_array_equal(codes, [np.nan, np.nan, np.nan, 2.0, 1.0, np.nan])
+
+    codes, found = cache.lookup_points("layer_lain", keys)
+    assert not found.any()
+
+
+def classify(lon, lat, hazard_sources, cache=None):
+    profiler = instrument.Profiler()
+    gridcodes, _, issues = hazard.classify_coordinates(lon, lat, hazard_sources, cache=cache, policy="columns",
+                                                       workers=1, profiler=profiler)
+    assert issues == []
+    queried = sum(record["rows_in"] for record in profiler.records if record["stage"] == "hazard_query")
+    return gridcodes, queried
+
+
+def assert_same(gridcodes, expected):
+    assert list(gridcodes) == list(expected)
+    for col in expected:
+        np.testing.assert_array_equal(gridcodes[col], expected[col])
+
+
+def test_point_cache_runs(tmp_path, hazard_zips, points):
+    lon, lat = points
+    # Koordinat berulang dalam satu upload diuji sekali lalu disebarkan ke semua barisnya; koordinat di
+    # luar rentang tidak punya kunci cache dan selalu diuji
+    lon, lat = np.concatenate([lon, lon[:500], [181.0, 181.0]]), np.concatenate([lat, lat[:500], [0.0, 0.0]])
+    point_keys = hazard.quantize_points(lon, lat)
+    assert (point_keys == -1).sum() == 2
+    unique = len(np.unique(point_keys[point_keys >= 0])) + 2
+    cache = hazard_cache.HazardCache(str(tmp_path))
+
+    expected, _ = classify(lon, lat, hazard_zips)
+    cold, queried = classify(lon, lat, hazard_zips, cache)
+    assert_same(cold, expected)
+    assert queried == unique * len(hazard_zips)
+
+    warm, queried = classify(lon, lat, hazard_zips, cache)
+    assert_same(warm, expected)
+    assert queried == 2 * len(hazard_zips)
+
+    # Upload kedua yang sebagian sama: hanya koordinat baru yang diuji
+    new_lon, new_lat = synthetic.city_points(np.random.default_rng(1), 1000)
+    lon2, lat2 = np.concatenate([lon[::2], new_lon]), np.concatenate([lat[::2], new_lat])
+    expected2, _ = classify(lon2, lat2, hazard_zips)
+    partial, queried = classify(lon2, lat2, hazard_zips, hazard_cache.HazardCache(str(tmp_path)))
+    assert_same(partial, expected2)
+    assert queried == (len(np.unique(hazard.quantize_points(new_lon, new_lat))) + 1) * len(hazard_zips)
+
+
+# Cache titik dikunci hash isi layer: shapefile yang berubah tidak memakai gridcode lama
+def test_point_cache_changes_with_layer(tmp_path, hazard_zips, points):
+    lon, lat = points
+    cache = hazard_cache.HazardCache(str(tmp_path / "cache"))
+    classify(lon, lat, hazard_zips[:1], cache)
+
+    changed_layer = synthetic.hazard_layer(zones_per_city=4, seed=3)
+    changed = synthetic.write_hazard_zip(str(tmp_path / "banjir_a.zip"), changed_layer)
+    assert hazard.content_hash(changed) != hazard.content_hash(hazard_zips[0])
+    expected, _ = classify(lon, lat, [changed])
+    result, queried = classify(lon, lat, [changed], cache)
+    assert_same(result, expected)
+    assert queried == len(np.unique(hazard.quantize_points(lon, lat)))
+    assert not np.array_equal(result["gridcode"], classify(lon, lat, hazard_zips[:1], cache)[0]["gridcode"],
+                              equal_nan=True)
+
+
+BBOX = (106.5, -6.5, 107.0, -6.0)
+
+
+def assert_same_layer(result, expected):
+    assert len(result) > 0
+    pd.testing.assert_frame_equal(pd.DataFrame(result.drop(columns="geometry")),
+                                  pd.DataFrame(expected.drop(columns="geometry")))
+    assert result.geometry.geom_equals_exact(expected.geometry, 0).all()
+    assert result.crs == expected.crs
+
+
+# Setelah sumber yang diharapkan, semua sumber lain gagal: ZIP dan layer utuh di disk
+def only_from(monkeypatch, *allowed):
+    def forbidden(name):
+        def fail(*args, **kwargs):
+            raise AssertionError(f"{name} tidak boleh dibaca")
+        return fail
+    if "zip" not in allowed:
+        monkeypatch.setattr(hazard, "read_hazard_zip", forbidden("ZIP"))
+    if "full_parquet" not in allowed:
+        monkeypatch.setattr(hazard_cache, "read_clipped", forbidden("Layer utuh di disk"))
+
+
+# Setiap jalur load dengan bbox (ZIP, layer utuh di disk atau di memori, potongan di disk atau di memori)
+# memberi fitur yang sama dengan memotong layer utuh dari ZIP
+@pytest.mark.parametrize("layer", [0, 1])
+def test_load_bbox_paths(tmp_path, monkeypatch, hazard_zips, layer):
+    source = hazard_zips[layer]
+    key = hazard.content_hash(source)
+    expected = hazard.clip_to_bbox(hazard.read_hazard_zip(source), BBOX)
+    assert 0 < len(expected) < len(hazard.read_hazard_zip(source))
+
+    # ZIP: layer utuh dan potongannya disimpan di disk
+    cache = hazard_cache.HazardCache(str(tmp_path / "zip"))
+    assert_same_layer(cache.load(source, key, BBOX), expected)
+    assert os.path.exists(cache.path_for(key))
+    assert os.path.exists(cache.path_for(cache.layer_key(key, BBOX)))
+
+    with monkeypatch.context() as patch:
+        only_from(patch)
+        # Potongan di memori: objek yang sama
+        assert cache.load(source, key, BBOX) is cache.load(source, key, BBOX)
+        # Potongan di disk
+        assert_same_layer(hazard_cache.HazardCache(cache.directory).load(source, key, BBOX), expected)
+
+    # Layer utuh di disk (GeoParquet dengan kolom bbox per fitur): hanya potongannya dibaca
+    cache = hazard_cache.HazardCache(str(tmp_path / "full"))
+    cache.load(source, key)
+    with monkeypatch.context() as patch:
+        only_from(patch, "full_parquet")
+        assert_same_layer(hazard_cache.HazardCache(cache.directory).load(source, key, BBOX), expected)
+
+    # File cache lama tanpa kolom bbox dibaca utuh lalu dipotong
+    legacy = hazard_cache.HazardCache(str(tmp_path / "legacy"))
+    os.makedirs(legacy.directory)
+    hazard.read_hazard_zip(source).to_parquet(legacy.path_for(key))
+    with monkeypatch.context() as patch:
+        only_from(patch, "full_parquet")
+        assert_same_layer(legacy.load(source, key, BBOX), expected)
+
+    # Layer utuh di memori: dipotong tanpa membaca disk, walaupun file-nya sudah hilang
+    cache = hazard_cache.HazardCache(str(tmp_path / "memory"))
+    cache.load(source, key)
+    os.remove(cache.path_for(key))
+    with monkeypatch.context() as patch:
+        only_from(patch)
+        assert_same_layer(cache.load(source, key, BBOX), expected)
+
+
+# bbox yang sama dengan tipe / format angka berbeda memakai potongan yang sama; bbox yang berbeda
+# di digit keenam tidak boleh memakai potongan bbox lain
+def test_bbox_layer_keys(tmp_path, monkeypatch, hazard_zips):
+    source = hazard_zips[0]
+    key = hazard.content_hash(source)
+    cache = hazard_cache.HazardCache(str(tmp_path))
+    layer_key = cache.layer_key(key, BBOX)
+    for same in [(106.5, -6.5, 107, -6), [np.float64(106.5), np.float32(-6.5), 107.0, -6.0],
+                 (106.50, -6.500, 1.07e2, -6.0), np.array(BBOX)]:
+        assert cache.layer_key(key, same) == layer_key
+
+    clipped = cache.load(source, key, BBOX)
+    with monkeypatch.context() as patch:
+        only_from(patch)
+        assert cache.load(source, key, (106.5, -6.5, 107, -6)) is clipped
+
+    # Batas kanan tepat di kiri / kanan sisi kiri satu fitur: dengan format 6 digit ('{:g}') kedua bbox
+    # mendapat kunci yang sama, padahal isinya berbeda satu fitur
+    full = hazard.read_hazard_zip(source)
+    edge = hazard.clip_to_bbox(full, BBOX).bounds["minx"].max()
+    without, with_edge = (106.0, -6.5, edge - 1e-7, -6.0), (106.0, -6.5, edge + 1e-7, -6.0)
+    assert f"{without[2]:g}" == f"{with_edge[2]:g}"
+    assert cache.layer_key(key, without) != cache.layer_key(key, with_edge)
+    expected_without, expected_with = hazard.clip_to_bbox(full, without), hazard.clip_to_bbox(full, with_edge)
+    assert len(expected_with) == len(expected_without) + 1
+    assert_same_layer(cache.load(source, key, without), expected_without)
+    assert_same_layer(cache.load(source, key, with_edge), expected_with)
@@ -0,0 +1,138 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+import shapely
+
+from banjir import hazard, hazard_grid
+
+
+# Layer yang dipotong ke bbox portofolio bisa kosong jika portofolio di luar jangkauan layer
+@pytest.mark.parametrize("memmap", [False, True])
+def test_empty_layer(tmp_path, memmap):
+    layer = gpd.GeoDataFrame({"gridcode": np.array([], dtype="float64")},
+                             geometry=gpd.GeoSeries([], crs="EPSG:4326"))
+    path = str(tmp_path / "grid.npy") if memmap else None
+    grid = hazard_grid.HazardGrid.build(layer, "gridcode", 0.01, path=path)
+    if memmap:
+        grid = hazard_grid.HazardGrid.open(path, layer)
+    assert np.isnan(grid.classify([0.0, 0.001, 106.8], [0.0, -0.001, -6.2])).all()
+
+
+def test_portfolio_outside_layer_uses_grid_without_warning(hazard_zips):
+    lon, lat = np.array([130.0, 130.1]), np.array([-3.0, -3.1])
+    gridcodes, grid_col, issues = hazard.classify_coordinates(lon, lat, hazard_zips, grid_resolution=0.01)
+    assert issues == []
+    assert np.isnan(gridcodes[grid_col]).all()
+
+
+ORIGIN = (106.0, -7.0)  # di zona UTM 48S, sama seperti layer terproyeksi sungguhan di sekitar Jakarta
+
+
+# Layer kecil: dua kotak yang tumpang tindih (gridcode terbesar harus menang), segitiga, kotak berlubang
+# dan poligon gridcode 0 (tetap berbeda dari sel tanpa poligon)
+def synthetic_layer(crs="EPSG:4326"):
+    outer = shapely.box(1.2, 0.0, 1.8, 0.6)
+    layer = gpd.GeoDataFrame({"gridcode": [1, 3, 2, 2, 0]}, geometry=[
+        shapely.box(0.0, 0.0, 1.0, 1.0),
+        shapely.box(0.5, 0.5, 1.5, 1.5),
+        shapely.Polygon([(0.1, 1.2), (0.9, 1.2), (0.5, 1.9)]),
+        outer.difference(shapely.box(1.35, 0.15, 1.65, 0.45)),
+        shapely.box(-0.6, -0.6, -0.2, -0.2),
+    ], crs="EPSG:4326")
+    layer.geometry = layer.geometry.translate(*ORIGIN)
+    return layer.to_crs(crs)
+
+
+# Acak di sekitar layer, ditambah titik tepat di sisi / sudut poligon dan di garis antar sel
+def sample_points(resolution):
+    rng = np.random.default_rng(5)
+    lon, lat = rng.uniform(-0.8, 2.0, 4000), rng.uniform(-0.8, 2.1, 4000)
+    edge = np.linspace(-0.6, 1.9, 126)
+    lon = np.concatenate([lon, np.full_like(edge, 0.5), np.full_like(edge, 1.0), edge, edge, [0.0, 1.5, 1.35]])
+    lat = np.concatenate([lat, edge, edge, np.full_like(edge, 0.5), np.full_like(edge, 1.2), [0.0, 1.5, 0.45]])
+    cells = np.arange(-0.6, 1.9, resolution)
+    grid_lon, grid_lat = np.meshgrid(cells, cells)
+    return np.concatenate([lon, grid_lon.ravel()]) + ORIGIN[0], np.concatenate([lat, grid_lat.ravel()]) + ORIGIN[1]
+
+
+# Referensi: sjoin eksak ke semua poligon, gridcode terbesar jika titik masuk beberapa poligon
+def exact_gridcodes(layer, lon, lat):
+    points = gpd.GeoSeries.from_xy(lon, lat, crs="EPSG:4326").to_crs(layer.crs)
+    point_idx, layer_idx = layer.sindex.query(points.values, predicate="intersects")
+    result = np.full(len(lon), np.nan)
+    np.fmax.at(result, point_idx, layer["gridcode"].to_numpy(dtype="float64")[layer_idx])
+    return result
+
+
+@pytest.mark.parametrize("resolution", [0.1, 0.03])
+@pytest.mark.parametrize("crs", ["EPSG:4326", "EPSG:32748", "EPSG:3857"])
+def test_grid_matches_exact_sjoin(resolution, crs):
+    layer = synthetic_layer(crs)
+    lon, lat = sample_points(resolution)
+    grid = hazard_grid.HazardGrid.build(layer, "gridcode", resolution)
+    np.testing.assert_array_equal(grid.classify(lon, lat), exact_gridcodes(layer, lon, lat))
+
+
+def test_boundary_and_interior_cells():
+    resolution = 0.1
+    layer = synthetic_layer()
+    grid = hazard_grid.HazardGrid.build(layer, "gridcode", resolution)
+
+    # Setiap sel yang dilewati sisi poligon ditandai BOUNDARY
+    coords = shapely.get_coordinates(shapely.segmentize(layer.boundary.values, resolution / 10))
+    cols = np.floor((coords[:, 0] - grid.minx) / resolution).astype(int)
+    rows = np.floor((grid.maxy - coords[:, 1]) / resolution).astype(int)
+    assert (grid.cells[rows, cols] == hazard_grid.BOUNDARY).all()
+
+    # Sel lain menyimpan gridcode + 1 poligon yang memuat seluruh sel (terbesar jika tumpang tindih), 0 jika kosong
+    interior = grid.cells != hazard_grid.BOUNDARY
+    assert interior.any()
+    row_idx, col_idx = np.nonzero(interior)
+    cells = shapely.box(grid.minx + col_idx * resolution, grid.maxy - (row_idx + 1) * resolution,
+                        grid.minx + (col_idx + 1) * resolution, grid.maxy - row_idx * resolution)
+    expected = np.zeros(len(cells), dtype=np.uint8)
+    for geom, code in zip(layer.geometry, layer["gridcode"]):
+        inside = shapely.contains(geom, cells)
+        # Sel non-BOUNDARY tidak pernah dipotong sisi poligon: seluruhnya di dalam atau di luar
+        assert not shapely.overlaps(geom, cells).any()
+        expected = np.where(inside, np.maximum(expected, code + 1), expected)
+    np.testing.assert_array_equal(grid.cells[interior], expected)
+    assert set(np.unique(grid.cells)) == {0, 1, 2, 3, 4, hazard_grid.BOUNDARY}
+
+
+# Gridcode disimpan sebagai gridcode + 1 di uint8: 254 bertabrakan dengan BOUNDARY, bukan bilangan bulat
+# atau negatif juga tidak bisa diindeks
+@pytest.mark.parametrize("codes, supported", [
+    ([0, 1, 2, 3], True),
+    ([1, hazard_grid.MAX_GRIDCODE], True),
+    ([1, hazard_grid.MAX_GRIDCODE + 1], False),
+    ([1, hazard_grid.BOUNDARY], False),
+    ([1.5, 2], False),
+    ([-1, 2], False),
+    ([1, np.nan], True),
+])
+def test_supports_layer(codes, supported):
+    layer = gpd.GeoDataFrame({"gridcode": codes}, geometry=[shapely.box(i, 0, i + 1, 1) for i in range(len(codes))])
+    assert hazard_grid.supports_layer(layer, "gridcode") is supported
+    assert not hazard_grid.supports_layer(layer, "kode_grid")
+
+
+def test_max_gridcode_is_not_boundary():
+    layer = gpd.GeoDataFrame({"gridcode": [hazard_grid.MAX_GRIDCODE]}, geometry=[shapely.box(0, 0, 1, 1)],
+                             crs="EPSG:4326")
+    grid = hazard_grid.HazardGrid.build(layer, "gridcode", 0.1)
+    np.testing.assert_array_equal(grid.classify([0.5, 0.05, 2.0], [0.5, 0.95, 2.0]),
+                                  [hazard_grid.MAX_GRIDCODE, hazard_grid.MAX_GRIDCODE, np.nan])
+
+
+def test_memmap_round_trip(tmp_path):
+    layer = synthetic_layer("EPSG:32748")
+    path = str(tmp_path / "grid.npy")
+    built = hazard_grid.HazardGrid.build(layer, "gridcode", 0.05, path=path)
+    opened = hazard_grid.HazardGrid.open(path, layer)
+    assert isinstance(opened.cells, np.memmap)
+    np.testing.assert_array_equal(opened.cells, built.cells)
+    assert (opened.minx, opened.maxy, opened.resolution, opened.grid_col) == \
+        (built.minx, built.maxy, built.resolution, built.grid_col)
+    lon, lat = sample_points(0.05)
+    np.testing.assert_array_equal(opened.classify(lon, lat), built.classify(lon, lat))
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from banjir import parsing
+
+
+def coordinates(*texts):
+    return parsing.parse_coordinates(pd.Series(list(texts), dtype=object))
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("-6.2", -6.2),
+    ("-6,2", -6.2),
+    ("–6.2", -6.2),
+    ("106.8456", 106.8456),
+    ("6°12'S", -6.2),
+    ("6°10'30\"S", -(6 + 10 / 60 + 30 / 3600)),
+    ("106 49 12 BT", 106 + 49 / 60 + 12 / 3600),
+    ("LS 6 12", -6.2),
+    ("6.2 LS", -6.2),
+])
+def test_parse_coordinates(text, expected):
+    values, empty = coordinates(text)
+    assert values[0] == pytest.approx(expected)
+    assert not empty[0]
+
+
+# Teks ambigu tidak boleh ditebak sebagai DMS: harus ditolak sebagai tidak terbaca
+@pytest.mark.parametrize("text", ["106.49.12", "-6.12.30", "-6,123,456", "-6.200.000", "6°70'S"])
+def test_ambiguous_coordinates_are_unparseable(text):
+    values, empty = coordinates(text)
+    assert np.isnan(values[0])
+    assert not empty[0]
+    reasons = parsing.reject_reasons(values, np.array([106.8]), empty, np.array([False]))
+    assert reasons[0] == parsing.UNPARSEABLE
+
+
+@pytest.mark.parametrize("text", [None, "", "  ", "-"])
+def test_empty_coordinates(text):
+    values, empty = coordinates(text)
+    assert np.isnan(values[0])
+    assert empty[0]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1000000", 1_000_000),
+    ("1.000.000", 1_000_000),
+    ("1,000,000", 1_000_000),
+    ("1.234.567,89", 1_234_567.89),
+    ("1,234,567.89", 1_234_567.89),
+    ("Rp 1.000.000,-", 1_000_000),
+    ("Rp. 1.000.000", 1_000_000),
+    ("1.000.000 IDR", 1_000_000),
+    ("IDR 1.000.000", 1_000_000),
+    ("1.000.000 Rp", 1_000_000),
+    ("-1.000", -1_000),
+])
+def test_parse_amounts(text, expected):
+    assert parsing.parse_amounts(pd.Series([text], dtype=object))[0] == pytest.approx(expected)
+
+
+def test_unparseable_amount():
+    assert np.isnan(parsing.parse_amounts(pd.Series(["satu juta"], dtype=object))[0])
+
+
+def test_reject_reasons():
+    lat = np.array([-6.2, 106.8, 40.0, np.nan])
+    lon = np.array([106.8, -6.2, 106.8, 106.8])
+    no = np.zeros(4, dtype=bool)
+    reasons = parsing.reject_reasons(lat, lon, no, no)
+    assert list(reasons) == ['', parsing.SWAPPED, parsing.OUT_OF_BOUNDS, parsing.UNPARSEABLE]
@@ -0,0 +1,144 @@
+import http.client
+import json
+import threading
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from banjir import engine, parsing, quote, synthetic
+
+
+@pytest.fixture(scope="module")
+def quote_engine(tmp_path_factory):
+    layer = gpd.GeoDataFrame({"gridcode": [1, 3]}, geometry=[
+        shapely.box(106.7, -6.3, 106.9, -6.1),
+        shapely.box(106.8, -6.3, 106.9, -6.2),
+    ], crs="EPSG:4326")
+    path = synthetic.write_hazard_zip(str(tmp_path_factory.mktemp("quote") / "banjir.zip"), layer)
+    return quote.QuoteEngine([path], cache=False)
+
+
+@pytest.fixture
+def server(quote_engine):
+    server = quote.make_server(quote_engine, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def request(server, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=10)
+    try:
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        conn.close()
+
+
+LOCATION = {"lat": -6.25, "lon": 106.85, "okupasi": "Komersial", "floors": 3, "tsi": "Rp 2.000.000"}
+
+
+def test_health(server):
+    assert request(server, "GET", "/health") == (200, {"status": "ok", "layers": ["banjir.zip"]})
+    assert request(server, "GET", "/lain")[0] == 404
+
+
+def test_single_quote(server):
+    status, result = request(server, "POST", "/quote", LOCATION)
+    assert status == 200
+    assert result == {engine.LAT_COL: -6.25, engine.LON_COL: 106.85, "gridcode": 3.0, engine.RISK_COL: "Tinggi",
+                      engine.RATE_COL: 0.40, engine.TSI_COL: 2e6, engine.PML_COL: 800_000.0,
+                      parsing.REJECT_COL: None}
+
+
+def test_batch_quote(server):
+    batch = [LOCATION, dict(LOCATION, lat="6°9'0\"S", lon=106.75, floors=0, okupasi="Residensial"),
+             dict(LOCATION, lat=-7.5), dict(LOCATION, lat="abc")]
+    status, results = request(server, "POST", "/quote", batch)
+    assert status == 200
+    assert [result[engine.RISK_COL] for result in results] == ["Tinggi", "Rendah", "No Risk", None]
+    assert [result[engine.PML_COL] for result in results] == [800_000, 300_000, 0, None]
+    assert results[3][parsing.REJECT_COL] is not None
+
+
+@pytest.mark.parametrize("body, message", [
+    ("{bukan json", "Expecting"),
+    ({"lat": -6.2, "lon": 106.8}, "floors, okupasi, tsi"),
+    ([], "Batch"),
+    ([LOCATION] * (quote.MAX_BATCH + 1), "Batch"),
+    ("[1, 2]", ""),
+])
+def test_invalid_request(server, body, message):
+    status, result = request(server, "POST", "/quote", body)
+    assert status == 400
+    assert message in result["error"]
+
+
+@pytest.mark.parametrize("length", ["abc", "-5"])
+def test_invalid_content_length(server, length):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=10)
+    try:
+        conn.putrequest("POST", "/quote")
+        conn.putheader("Content-Length", length)
+        conn.endheaders()
+        response = conn.getresponse()
+        assert response.status == 400
+        assert "Content-Length" in json.loads(response.read())["error"]
+    finally:
+        conn.close()
+
+
+def test_oversized_body(server, monkeypatch):
+    monkeypatch.setattr(quote, "MAX_BODY_BYTES", 200)
+    status, result = request(server, "POST", "/quote", [LOCATION] * 3)
+    assert status == 413
+    assert "200" in result["error"]
+    assert request(server, "POST", "/quote", LOCATION)[0] == 200
+
+
+def test_internal_error(server, quote_engine, monkeypatch, caplog):
+    def fail(**kwargs):
+        raise RuntimeError("indeks rusak")
+    monkeypatch.setattr(quote_engine, "quote_columns", fail)
+    status, result = request(server, "POST", "/quote", LOCATION)
+    assert status == 500
+    assert "indeks rusak" not in result["error"]
+    assert "indeks rusak" in caplog.text
+
+
+# Satu koneksi keep-alive tetap bisa dipakai setelah respons 400
+def test_keep_alive_after_error(server):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=10)
+    try:
+        for body, expected in (("{bukan json", 400), (json.dumps(LOCATION), 200), (json.dumps(LOCATION), 200)):
+            conn.request("POST", "/quote", body=body)
+            response = conn.getresponse()
+            response.read()
+            assert response.status == expected
+    finally:
+        conn.close()
+
+
+# Quote sama dengan pipeline lengkap (gridcode, rate Building, PML) untuk portofolio yang sama
+@pytest.mark.parametrize("policy", ["max", "priority"])
+def test_quote_many_matches_pipeline(hazard_zips, portfolio_csv, policy):
+    quote_engine = quote.QuoteEngine(hazard_zips, cache=False, policy=policy)
+    expected = engine.run_pipeline(portfolio_csv, hazard_zips, cache=False, policy=policy)
+    df = pd.read_csv(portfolio_csv, dtype=str)
+    result = quote_engine.quote_many(df[engine.LAT_COL], df[engine.LON_COL], df[engine.OKUPASI_COL],
+                                     df[engine.FLOOR_COL], df[engine.TSI_COL])
+    valid = result[result[parsing.REJECT_COL].isna()]
+    assert len(valid) == len(expected.final)
+    assert len(result) - len(valid) == len(expected.invalid_rows)
+    for col in (engine.LAT_COL, engine.LON_COL, "gridcode", engine.RATE_COL, engine.TSI_COL, engine.PML_COL):
+        np.testing.assert_allclose(valid[col].to_numpy(dtype="float64"),
+                                   expected.final[col].to_numpy(dtype="float64"))
+    assert valid[engine.RISK_COL].tolist() == expected.final[engine.RISK_COL].astype(str).tolist()
@@ -0,0 +1,81 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from banjir import engine, pools, scenario
+
+
+@pytest.fixture(scope="module")
+def final():
+    rng = np.random.default_rng(4)
+    n = 400
+    return pd.DataFrame({
+        engine.LON_COL: rng.uniform(106.0, 108.0, n),
+        engine.LAT_COL: rng.uniform(-7.5, -6.0, n),
+        engine.RISK_COL: rng.choice(engine.RISK_LEVELS + [None], n),
+        engine.PML_COL: rng.lognormal(np.log(1e8), 1.0, n),
+        engine.UY_COL: rng.choice([2023, 2024], n),
+        engine.OKUPASI_COL: rng.choice(['Residensial', 'Komersial'], n),
+    })
+
+
+def assert_same_result(result, expected):
+    pd.testing.assert_frame_equal(result.groups, expected.groups)
+    np.testing.assert_array_equal(result.aggregate, expected.aggregate)
+    np.testing.assert_array_equal(result.occurrence, expected.occurrence)
+
+
+# Seed yang sama → hasil yang sama; memory_mb kecil memaksa banyak potongan
+def test_seeded_runs_are_reproducible(final):
+    result = scenario.run_scenarios(final, 500, seed=3, memory_mb=0.05, workers=1)
+    assert_same_result(scenario.run_scenarios(final, 500, seed=3, memory_mb=0.05, workers=1), result)
+    other = scenario.run_scenarios(final, 500, seed=4, memory_mb=0.05, workers=1)
+    assert not np.array_equal(other.aggregate, result.aggregate)
+    assert result.aggregate.shape == (500, len(result.groups))
+    assert (result.occurrence <= result.aggregate + 1e-6).all()
+
+
+def test_workers_give_same_result(final, monkeypatch):
+    monkeypatch.setattr(scenario, "PARALLEL_MIN_WORK", 0)
+    spec, _ = scenario.build_exposure(final)
+    assert scenario.scenarios_per_chunk(spec, 0.05) < 500  # lebih dari satu potongan untuk dibagi ke worker
+    expected = scenario.run_scenarios(final, 500, seed=3, memory_mb=0.05, workers=1)
+    result = scenario.run_scenarios(final, 500, seed=3, memory_mb=0.05, workers=2)
+    assert_same_result(result, expected)
+    # Pool bersama dipakai ulang oleh panggilan berikutnya
+    pool = pools.get_pool(2)
+    assert_same_result(scenario.run_scenarios(final, 500, seed=3, memory_mb=0.05, workers=2), expected)
+    assert pools.get_pool(2) is pool
+
+
+def test_small_simulation_runs_in_process(final, monkeypatch):
+    def no_pool(workers):
+        raise AssertionError("simulasi kecil tidak perlu pool proses")
+    monkeypatch.setattr(pools, "get_pool", no_pool)
+    scenario.run_scenarios(final, 500, seed=3, memory_mb=0.05, workers=4)
+
+
+# Rata-rata kerugian tahunan = E[jumlah kejadian] x Σ PML x peluang sel terkena (faktor kerusakan rata-rata 1)
+def test_mean_annual_loss(final):
+    event_rate, max_events = 1.5, 4
+    result = scenario.run_scenarios(final, 20_000, seed=0, event_rate=event_rate, max_events=max_events, workers=1)
+    poisson = [math.exp(-event_rate) * event_rate ** k / math.factorial(k) for k in range(max_events)]
+    expected_events = sum(k * p for k, p in enumerate(poisson)) + max_events * (1 - sum(poisson))
+
+    spec, groups = scenario.build_exposure(final)
+    expected = expected_events * spec['hit_prob'][spec['band']] @ spec['weights']
+    np.testing.assert_allclose(result.aggregate.mean(axis=0), expected, rtol=0.05)
+
+    total = (groups == scenario.TOTAL_LABEL).all(axis=1).to_numpy()
+    assert total.sum() == 1
+    np.testing.assert_allclose(spec['weights'][:, total].sum(), final[engine.PML_COL].sum())
+    table = result.ep_table()
+    assert list(table['Ukuran'].unique()) == ["AEP", "OEP"]
+    assert (table[[f"RP {rp}" for rp in scenario.RETURN_PERIODS]].diff(axis=1).iloc[:, 1:] >= 0).all().all()
+
+
+def test_missing_columns(final):
+    with pytest.raises(engine.PipelineError, match="PML"):
+        scenario.run_scenarios(final.drop(columns=engine.PML_COL), 10)
@@ -0,0 +1,108 @@
+import pandas as pd
+import pytest
+
+from banjir import instrument, rates, stages
+
+STAGES = ["ingest", "clean", "classify", "filter", "rate", "pml", "aggregate"]
+
+
+# Jalankan semua tahap seperti halaman Streamlit; kembalikan kunci setiap tahap dan tahap yang dihitung ulang
+def run(pipeline, portfolio, hazard_sources, policy="max", inforce_only=False, rate_table=None):
+    profiler = instrument.Profiler()
+    pipeline = pipeline.with_profiler(profiler)
+    ingested = pipeline.ingest(portfolio)
+    cleaned = pipeline.clean(ingested)
+    classified = pipeline.classify(cleaned, hazard_sources, policy=policy)
+    filtered = pipeline.filter(classified, inforce_only)
+    rated = pipeline.rate(filtered, rate_table)
+    computed = pipeline.pml(rated)
+    aggregated = pipeline.aggregate(computed)
+    keys = dict(zip(STAGES, (stage.key for stage in (ingested, cleaned, classified, filtered, rated, computed,
+                                                      aggregated))))
+    computed_stages = [record["stage"] for record in profiler.records
+                       if record["stage"] in STAGES and not record.get("cached")]
+    return keys, computed_stages
+
+
+@pytest.fixture
+def pipeline():
+    return stages.StagedPipeline(workers=1)
+
+
+def changed(keys, base):
+    return [stage for stage in STAGES if keys[stage] != base[stage]]
+
+
+# Filter tanpa Inforce Only hanya meneruskan hasil klasifikasi (kunci baru, tanpa perhitungan)
+def assert_recomputed(keys, computed, base, expected, inforce_only=False):
+    assert changed(keys, base) == expected
+    assert computed == [stage for stage in expected if inforce_only or stage != "filter"]
+
+
+def test_rerun_uses_memo(pipeline, portfolio_csv, hazard_zips):
+    base, computed = run(pipeline, portfolio_csv, hazard_zips)
+    assert computed == [stage for stage in STAGES if stage != "filter"]
+    keys, computed = run(pipeline, portfolio_csv, hazard_zips)
+    assert keys == base
+    assert computed == []
+
+
+# Tabel rate yang berubah hanya menghitung ulang tahap rate dan sesudahnya
+def test_rate_table_change_invalidates_rate_stages(pipeline, portfolio_csv, hazard_zips):
+    base, _ = run(pipeline, portfolio_csv, hazard_zips)
+    frame = rates.default_rate_table().frame.copy()
+    frame.loc[frame['Kategori Risiko'] == 'Tinggi', 'Komersial_1'] = 0.6
+    keys, computed = run(pipeline, portfolio_csv, hazard_zips, rate_table=rates.RateTable(frame))
+    assert_recomputed(keys, computed, base, ["rate", "pml", "aggregate"])
+
+    # Isi tabel yang sama (objek baru) tetap memakai memo
+    same = rates.RateTable(rates.default_rate_table().frame.copy())
+    keys, computed = run(pipeline, portfolio_csv, hazard_zips, rate_table=same)
+    assert keys == base
+    assert computed == []
+
+
+def test_policy_change_invalidates_classify(pipeline, portfolio_csv, hazard_zips):
+    base, _ = run(pipeline, portfolio_csv, hazard_zips)
+    keys, computed = run(pipeline, portfolio_csv, hazard_zips, policy="priority")
+    assert_recomputed(keys, computed, base, ["classify", "filter", "rate", "pml", "aggregate"])
+
+
+# Mengganti Full Data / Inforce Only menyaring hasil klasifikasi yang sudah ada di memo
+def test_inforce_change_keeps_classify(pipeline, portfolio_csv, hazard_zips):
+    base, _ = run(pipeline, portfolio_csv, hazard_zips)
+    keys, computed = run(pipeline, portfolio_csv, hazard_zips, inforce_only=True)
+    assert_recomputed(keys, computed, base, ["filter", "rate", "pml", "aggregate"], inforce_only=True)
+    keys, computed = run(pipeline, portfolio_csv, hazard_zips)
+    assert keys == base
+    assert computed == []
+
+
+def test_hazard_change_invalidates_classify(pipeline, portfolio_csv, hazard_zips):
+    base, _ = run(pipeline, portfolio_csv, hazard_zips)
+    keys, computed = run(pipeline, portfolio_csv, hazard_zips[:1])
+    assert_recomputed(keys, computed, base, ["classify", "filter", "rate", "pml", "aggregate"])
+
+
+def test_portfolio_change_invalidates_everything(pipeline, tmp_path, portfolio_csv, hazard_zips):
+    base, _ = run(pipeline, portfolio_csv, hazard_zips)
+    other = tmp_path / "portfolio.csv"
+    pd.read_csv(portfolio_csv).iloc[:-1].to_csv(other, index=False)
+    keys, computed = run(pipeline, str(other), hazard_zips)
+    assert_recomputed(keys, computed, base, STAGES)
+
+
+def test_memo_evicts_least_recently_used():
+    memo = stages.StageMemo(max_entries=2)
+    calls = []
+
+    def compute(value):
+        return lambda: calls.append(value) or value
+
+    assert memo.get_or_compute("a", compute(1)) == 1
+    assert memo.get_or_compute("b", compute(2)) == 2
+    assert memo.get_or_compute("a", compute(10)) == 1  # "a" baru dipakai, "b" yang dikeluarkan
+    assert memo.get_or_compute("c", compute(3)) == 3
+    assert memo.get_or_compute("b", compute(20)) == 20
+    assert memo.get_or_compute("c", compute(30)) == 3
+    assert calls == [1, 2, 3, 20]
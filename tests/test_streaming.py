@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from banjir import engine, hazard, parsing, streaming
+
+
+# Mode streaming harus memberi hasil yang sama dengan pipeline di memori, berapa pun ukuran chunk-nya.
+# UY streaming bertipe Int64 (sama di setiap chunk), di memori mengikuti read_csv
+@pytest.mark.parametrize("chunk_rows", [250, 1000, 5000])
+def test_streaming_matches_in_memory(tmp_path, monkeypatch, hazard_zips, portfolio_csv, chunk_rows):
+    expected = engine.run_pipeline(portfolio_csv, hazard_zips, cache=False)
+
+    hashed = []
+    content_hash = hazard.content_hash
+    monkeypatch.setattr(hazard, "content_hash", lambda source: hashed.append(source) or content_hash(source))
+    out = tmp_path / "hasil.parquet"
+    result = streaming.run_streaming(portfolio_csv, hazard_zips, str(out), chunk_rows=chunk_rows, cache=False)
+
+    # Setiap ZIP di-hash sekali per run, bukan sekali per chunk
+    assert sorted(hashed) == sorted(hazard_zips)
+    assert result.issues == expected.issues
+    assert result.rows_in == 3000
+    assert result.rows_out == len(expected.final)
+    assert result.invalid_count == len(expected.invalid_rows)
+    assert result.rejected == parsing.reject_counts(expected.invalid_rows)
+    assert result.rate_unmatched == expected.rate_unmatched
+    assert list(result.summaries) == list(expected.summaries)
+    # Jumlah per chunk digabung dengan urutan penjumlahan lain; tabel yang dibulatkan ke bawah ke int
+    # (sum_tsi, pml) bisa selisih 1 rupiah
+    for name, table in expected.summaries.items():
+        pd.testing.assert_frame_equal(result.summaries[name], table, check_dtype=False, check_index_type=False,
+                                      check_exact=False, rtol=1e-12, atol=1)
+
+    written = pd.read_parquet(out)
+    for col in (engine.LAT_COL, engine.LON_COL, "gridcode", engine.RATE_COL, engine.TSI_COL, engine.PML_COL):
+        np.testing.assert_allclose(written[col].to_numpy(dtype="float64"),
+                                   expected.final[col].to_numpy(dtype="float64"))
+    assert written[engine.RISK_COL].tolist() == expected.final[engine.RISK_COL].astype(str).tolist()
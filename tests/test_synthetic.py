@@ -0,0 +1,26 @@
+import pandas as pd
+
+from banjir import engine, synthetic
+
+
+def read(path):
+    return pd.read_csv(path, dtype=str)
+
+
+def test_write_portfolio_is_reproducible(tmp_path):
+    first = read(synthetic.write_portfolio(str(tmp_path / "a.csv"), 2500, seed=7, chunk_rows=1000))
+    second = read(synthetic.write_portfolio(str(tmp_path / "b.csv"), 2500, seed=7, chunk_rows=1000))
+    pd.testing.assert_frame_equal(first, second)
+    assert len(first) == 2500
+    assert list(first.columns) == [engine.LAT_COL, engine.LON_COL, engine.EXPIRY_COL, engine.OKUPASI_COL,
+                                   engine.FLOOR_COL, engine.TSI_COL, engine.UY_COL]
+
+
+# Dengan seed = seed + potongan, potongan ke-2 dari seed 0 sama dengan potongan ke-1 dari seed 1
+def test_write_portfolio_parts_do_not_repeat_across_seeds(tmp_path):
+    seed0 = read(synthetic.write_portfolio(str(tmp_path / "a.csv"), 2000, seed=0, chunk_rows=1000))
+    seed1 = read(synthetic.write_portfolio(str(tmp_path / "b.csv"), 2000, seed=1, chunk_rows=1000))
+    shared = pd.merge(seed0, seed1, on=[engine.LAT_COL, engine.LON_COL, engine.TSI_COL])
+    assert len(shared) == 0
+    # Potongan dalam satu file juga berbeda satu sama lain
+    assert not seed0.iloc[:1000].reset_index(drop=True).equals(seed0.iloc[1000:].reset_index(drop=True))
@@ -0,0 +1,128 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from banjir import engine, rates, whatif
+
+KEYS = [engine.UY_COL, engine.OKUPASI_COL, engine.RISK_COL]
+
+
+@pytest.fixture(scope="module")
+def final(hazard_zips, portfolio_csv):
+    return engine.run_pipeline(portfolio_csv, hazard_zips, cache=False).final
+
+
+# PML pipeline lengkap (apply_rates + compute_pml) per kunci cube dengan tabel rate tertentu
+def pipeline_pml(final, table):
+    rated, _ = engine.apply_rates(final.drop(columns=[engine.RATE_COL, engine.PML_COL]), table)
+    computed = engine.compute_pml(rated)
+    return computed.groupby(KEYS, observed=True)[engine.PML_COL].sum()
+
+
+def variant_pml(result, name):
+    return result.cube[name].groupby(level=KEYS, observed=True).sum()
+
+
+# Kunci yang seluruh barisnya tanpa rate (mis. okupasi Lainnya) tidak ada di cube what-if dan ber-PML 0
+def assert_pml_equal(result, expected):
+    assert (expected.drop(result.index) == 0).all()
+    pd.testing.assert_series_equal(result, expected.loc[result.index], check_names=False, check_exact=False,
+                                   rtol=1e-12)
+
+
+def by_okupasi(series):
+    return series.groupby(level=engine.OKUPASI_COL, observed=True).sum()
+
+
+def write_specs(directory, specs):
+    path = directory / "varian.json"
+    path.write_text(json.dumps(specs))
+    return str(path)
+
+
+# Tabel rate dengan level tabel dasar dan rate dari tensor varian
+def table_with(base, tensor):
+    table = rates.RateTable(base.frame)
+    table.tensor = tensor
+    return table
+
+
+def test_base_variant_matches_pipeline(final):
+    result = whatif.run_whatif(final, [])
+    assert result.names == [whatif.BASE_NAME]
+    assert_pml_equal(variant_pml(result, whatif.BASE_NAME), final.groupby(KEYS, observed=True)[engine.PML_COL].sum())
+    assert result.totals()[whatif.BASE_NAME] == pytest.approx(final[engine.PML_COL].sum(), rel=1e-12)
+
+
+def test_scale_variants(final):
+    base = rates.default_rate_table()
+    result = whatif.run_whatif(final, whatif.scale_variants(base, [0.5, 1.2]))
+    totals = result.totals()
+    assert totals["x0.5"] == pytest.approx(0.5 * totals[whatif.BASE_NAME])
+    assert totals["x1.2"] == pytest.approx(1.2 * totals[whatif.BASE_NAME])
+    relative = result.table(relative=True)
+    np.testing.assert_allclose(relative["x1.2"].dropna(), 0.2)
+
+
+# Varian hanya mengubah PML bagian yang dipilih, dan sama dengan pipeline lengkap memakai tabel rate varian
+@pytest.mark.parametrize("spec, okupasi", [
+    ({"okupasi": "Industrial", "copy_from": "Komersial"}, "Industrial"),
+    # Skala bersama copy_from hanya mengalikan rate okupasi yang diganti
+    ({"okupasi": "Industrial", "copy_from": "Komersial", "scale": 1.1}, "Industrial"),
+    ({"scale": 1.5, "okupasi": "Residensial"}, "Residensial"),
+])
+def test_variant_changes_only_target_okupasi(final, spec, okupasi):
+    base = rates.default_rate_table()
+    name, tensor = whatif.variant_from_spec(base, spec)
+    result = whatif.run_whatif(final, [(name, tensor)])
+
+    base_pml, variant = variant_pml(result, whatif.BASE_NAME), variant_pml(result, name)
+    changed = by_okupasi(variant) != by_okupasi(base_pml)
+    assert changed[changed].index.tolist() == [okupasi]
+    assert_pml_equal(variant, pipeline_pml(final, table_with(base, tensor)))
+
+
+def test_rate_table_variant(tmp_path, final):
+    base = rates.default_rate_table()
+    frame = base.frame.copy()
+    rate_cols = [col for col in frame.columns if col.startswith(("Komersial_", "Industrial_"))]
+    frame[rate_cols] = frame[rate_cols].astype(float) * 2
+    path = tmp_path / "rate_baru.csv"
+    frame.to_csv(path, index=False)
+
+    variants = whatif.load_variants(base, write_specs(tmp_path, [
+        {"rate_table": "rate_baru.csv", "okupasi": "Komersial", "scale": 0.9},
+        {"name": "Tabel baru", "rate_table": "rate_baru.csv"},
+    ]))
+    assert [name for name, _ in variants] == ["Komersial dari rate_baru.csv x0.9 (Komersial)", "Tabel baru"]
+    result = whatif.run_whatif(final, variants)
+
+    base_okupasi = by_okupasi(variant_pml(result, whatif.BASE_NAME))
+    komersial = by_okupasi(variant_pml(result, variants[0][0]))
+    np.testing.assert_allclose(komersial["Komersial"], 1.8 * base_okupasi["Komersial"])
+    pd.testing.assert_series_equal(komersial.drop("Komersial"), base_okupasi.drop("Komersial"), check_names=False)
+
+    whole = variant_pml(result, "Tabel baru")
+    assert_pml_equal(whole, pipeline_pml(final, rates.RateTable.load(str(path))))
+    np.testing.assert_allclose(by_okupasi(whole)["Residensial"], base_okupasi["Residensial"])
+
+
+# Eksposur dari beberapa chunk digabung sama dengan satu frame
+def test_chunked_whatif(final):
+    variants = whatif.scale_variants(rates.default_rate_table(), [0.8, 1.25])
+    expected = whatif.run_whatif(final, variants)
+    result = whatif.run_whatif((final.iloc[start:start + 700] for start in range(0, len(final), 700)), variants)
+    pd.testing.assert_frame_equal(result.cube.sort_index(), expected.cube.sort_index(), check_exact=False,
+                                  rtol=1e-12)
+
+
+def test_invalid_variants(final):
+    base = rates.default_rate_table()
+    with pytest.raises(engine.PipelineError, match="okupasi"):
+        whatif.variant_from_spec(base, {"copy_from": "Komersial"})
+    with pytest.raises(engine.PipelineError, match="Gudang"):
+        whatif.variant_from_spec(base, {"scale": 1.1, "okupasi": "Gudang"})
+    with pytest.raises(engine.PipelineError, match="unik"):
+        whatif.run_whatif(final, whatif.scale_variants(base, [1.1, 1.1]))